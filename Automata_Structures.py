@@ -7,10 +7,19 @@ Defines the structures use to represent each automata
 An automata has a label, initial state, end state, states, transitions, and a notation.
 The states are stored as a list.
 The transitions are stored in a dictionary with the key being the state for which they are outward.
+
+For large networks there is also a compact form, CompactAutomata. State labels and channel/message names are interned
+to integer ids, and the transitions are kept in flat arrays grouped by start state (compressed sparse rows), so each
+state's outward transitions are a contiguous slice. It offers the same fields as Automata (state_list,
+transition_dictionary, ...) as read-only views, so code written against the namedtuples can use it unchanged.
+iter_state_transitions goes over the states with outward transitions of either form, for CompactAutomata straight off
+the arrays with no lookup by label, which is how the generator traverses them.
 TODO:change end_state to end_states once implemented
 """
 
+from array import array
 from collections import namedtuple
+from collections.abc import Mapping
 
 Automata = namedtuple('Automata', ['label','initial_state', 'end_state', 'state_list', 'transition_dictionary','text'])
 # transition dictionary: given a state label, returns a list of transitions it can make
@@ -21,4 +30,251 @@ Transition = namedtuple('Transition', ['start_state','communication_all','commun
 # start state
 # communication. details are : 'communication_type','communication_content','communication_other'
 # condition
-# end state
\ No newline at end of file
+# end state
+
+
+# yields (state, its outward transitions) for each state with outward transitions, in state list order
+# for Automata and CompactAutomata alike, the compact form builds each state's transitions once
+def iter_state_transitions(a):
+    if isinstance(a, CompactAutomata):
+        yield from a.iter_state_transitions()
+        return
+    _transition_dictionary = a.transition_dictionary
+    for _state in a.state_list:
+        _state_transitions = _transition_dictionary.get(_state)
+        if _state_transitions:
+            yield _state, _state_transitions
+
+
+# gives each distinct label a small integer id, in order of first appearance
+class InternTable:
+    __slots__ = ('_ids', '_labels')
+
+    def __init__(self, _labels=()):
+        self._ids = {}
+        self._labels = []
+        for _label in _labels:
+            self.intern(_label)
+
+    # returns the id of the label, adding it if it is new
+    def intern(self, _label):
+        _id = self._ids.get(_label)
+        if _id is None:
+            _id = len(self._labels)
+            self._ids[_label] = _id
+            self._labels.append(_label)
+        return _id
+
+    # returns the id of a label already in the table, raises KeyError otherwise
+    def id_of(self, _label):
+        return self._ids[_label]
+
+    def label(self, _id):
+        return self._labels[_id]
+
+    def labels(self):
+        return self._labels
+
+    def __contains__(self, _label):
+        return _label in self._ids
+
+    def __len__(self):
+        return len(self._labels)
+
+    def __iter__(self):
+        return iter(self._labels)
+
+
+_communication_types = ('send', 'receive')
+
+
+# an automaton stored as interned ids and flat arrays
+# the outward transitions of state s are the indexes offsets[s] to offsets[s+1] of the transition arrays
+class CompactAutomata:
+    __slots__ = ('label', 'initial_state', 'text', 'states', 'symbols', 'conditions',
+                 'offsets', 'targets', 'kinds', 'contents', 'others', 'guards', 'resets', '_communications')
+
+    def __init__(self, _label, _initial_state, _text, _states, _symbols, _conditions,
+                 _offsets, _targets, _kinds, _contents, _others, _guards, _resets):
+        self.label = _label
+        self.initial_state = _initial_state
+        self.text = _text
+        self.states = _states
+        self.symbols = _symbols
+        self.conditions = _conditions
+        self.offsets = _offsets
+        self.targets = _targets
+        self.kinds = _kinds
+        self.contents = _contents
+        self.others = _others
+        self.guards = _guards
+        self.resets = _resets
+        # (communication_all, communication_details) by (kind, content, other), so the strings are built once
+        self._communications = {}
+
+    # builds from transitions in the order they were written, the order within each state is kept
+    # symbols (channel/message names) can be shared between the automata of a network
+    # states can be given to fix the order of the state list, otherwise it is the order they are first met
+    @classmethod
+    def from_transitions(cls, _label, _initial_state, _transitions, _text='', _symbols=None, _states=None):
+        _states = InternTable() if _states is None else _states
+        _symbols = InternTable() if _symbols is None else _symbols
+        _conditions = InternTable()
+        # gathered in written order first
+        _sources = array('i')
+        _targets = array('i')
+        _kinds = array('b')
+        _contents = array('i')
+        _others = array('i')
+        _guards = array('i')
+        _resets = array('b')
+        for _transition in _transitions:
+            _sources.append(_states.intern(_transition.start_state))
+            _targets.append(_states.intern(_transition.end_state))
+            _kinds.append(_communication_types.index(_transition.communication_details[0]))
+            _contents.append(_symbols.intern(_transition.communication_details[1]))
+            _others.append(_symbols.intern(_transition.communication_details[2]))
+            _guards.append(_conditions.intern(_transition.condition))
+            _resets.append(_transition.reset_x)
+
+        # counting sort by start state, stable so each state keeps its written order
+        _offsets = array('i', bytes(4 * (len(_states) + 1)))
+        for _source in _sources:
+            _offsets[_source + 1] += 1
+        for _state in range(len(_states)):
+            _offsets[_state + 1] += _offsets[_state]
+        _next = array('i', _offsets)
+        _order = array('i', bytes(4 * len(_sources)))
+        for _index, _source in enumerate(_sources):
+            _order[_next[_source]] = _index
+            _next[_source] += 1
+
+        return cls(_label, _initial_state, _text, _states, _symbols, _conditions, _offsets,
+                   array('i', (_targets[i] for i in _order)),
+                   array('b', (_kinds[i] for i in _order)),
+                   array('i', (_contents[i] for i in _order)),
+                   array('i', (_others[i] for i in _order)),
+                   array('i', (_guards[i] for i in _order)),
+                   array('b', (_resets[i] for i in _order)))
+
+    @classmethod
+    def from_automata(cls, _automata, _symbols=None):
+        _transitions = (_transition
+                        for _state in _automata.state_list
+                        for _transition in _automata.transition_dictionary.get(_state, ()))
+        return cls.from_transitions(_automata.label, _automata.initial_state, _transitions, _automata.text, _symbols,
+                                    InternTable(_automata.state_list))
+
+    # O(1) lookup of a state's id
+    def state_id(self, _state):
+        return self.states.id_of(_state)
+
+    def state_count(self):
+        return len(self.states)
+
+    def transition_count(self):
+        return len(self.targets)
+
+    # indexes of the outward transitions of a state id, for the flat arrays
+    def edges(self, _state_id):
+        return range(self.offsets[_state_id], self.offsets[_state_id + 1])
+
+    def out_degree(self, _state_id):
+        return self.offsets[_state_id + 1] - self.offsets[_state_id]
+
+    # the namedtuple of one transition, by its index in the flat arrays
+    def transition(self, _edge, _start_state=None):
+        if _start_state is None:
+            _start_state = self.states.label(self._source_of(_edge))
+        _key = (self.kinds[_edge], self.contents[_edge], self.others[_edge])
+        _communication = self._communications.get(_key)
+        if _communication is None:
+            _type = _communication_types[_key[0]]
+            _content = self.symbols.label(_key[1])
+            _other = self.symbols.label(_key[2])
+            _communication = self._communications[_key] = (_type + _content + _other, (_type, _content, _other))
+        return Transition(_start_state,
+                          _communication[0],
+                          _communication[1],
+                          self.conditions.label(self.guards[_edge]),
+                          bool(self.resets[_edge]),
+                          self.states.label(self.targets[_edge]))
+
+    # as iter_state_transitions, by state id off the offsets
+    def iter_state_transitions(self):
+        _offsets = self.offsets
+        for _state_id, _state in enumerate(self.states.labels()):
+            if _offsets[_state_id] < _offsets[_state_id + 1]:
+                yield _state, [self.transition(_edge, _state) for _edge in range(_offsets[_state_id],
+                                                                                 _offsets[_state_id + 1])]
+
+    def max_out_degree(self):
+        _offsets = self.offsets
+        return max([_offsets[i + 1] - _offsets[i] for i in range(len(self.states))] or [0])
+
+    def _source_of(self, _edge):
+        # binary search on the offsets
+        _low, _high = 0, len(self.states) - 1
+        while _low < _high:
+            _middle = (_low + _high + 1) // 2
+            if self.offsets[_middle] <= _edge:
+                _low = _middle
+            else:
+                _high = _middle - 1
+        return _low
+
+    # --- the same fields as Automata ---
+
+    @property
+    def end_state(self):
+        _end_state = ''
+        for _state_id in range(len(self.states)):
+            if self.offsets[_state_id] == self.offsets[_state_id + 1]:
+                _end_state = self.states.label(_state_id)
+        return _end_state
+
+    @property
+    def state_list(self):
+        return self.states.labels()
+
+    @property
+    def transition_dictionary(self):
+        return TransitionView(self)
+
+    def to_automata(self):
+        return Automata(self.label, self.initial_state, self.end_state, list(self.state_list),
+                        dict(self.transition_dictionary), self.text)
+
+    def __repr__(self):
+        return ('CompactAutomata(label=' + repr(self.label) + ', states=' + str(len(self.states))
+                + ', transitions=' + str(len(self.targets)) + ')')
+
+
+# read-only dictionary of state label to its list of outward transitions, built on access
+# like the transition dictionary of Automata, only states with outward transitions are keys
+class TransitionView(Mapping):
+    __slots__ = ('_automata',)
+
+    def __init__(self, _automata):
+        self._automata = _automata
+
+    def __getitem__(self, _state):
+        _automata = self._automata
+        _edges = _automata.edges(_automata.state_id(_state))
+        if not _edges:
+            raise KeyError(_state)
+        return [_automata.transition(_edge, _state) for _edge in _edges]
+
+    def __contains__(self, _state):
+        _automata = self._automata
+        return _state in _automata.states and _automata.out_degree(_automata.state_id(_state)) > 0
+
+    def __iter__(self):
+        _automata = self._automata
+        for _state_id in range(len(_automata.states)):
+            if _automata.out_degree(_state_id) > 0:
+                yield _automata.states.label(_state_id)
+
+    def __len__(self):
+        _automata = self._automata
+        return sum(1 for _state_id in range(len(_automata.states)) if _automata.out_degree(_state_id) > 0)
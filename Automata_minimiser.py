@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+"""Automata minimiser
+
+Shrinks each automaton before the Go is generated, so the program has one case per state that behaves differently.
+
+minimise_automata goes over a list of automata and for every one:
+- removes the states that cannot be reached from the initial state, with their transitions,
+- merges the states that are timed bisimilar: they have the same outgoing communications, with the same guards (read
+  as normalised windows, see Guard_parser, or as text when they cannot be), the same resets and successors that are
+  merged themselves,
+- keeps the first state of each merged class in state list order (the initial state for its class) and points the
+  transitions at it, a transition that became a copy of another of its state is dropped.
+The end state is only merged with itself, as the program stops in it, and the other states without transitions are
+merged into one. With an integer clock the guards are compared as whole numbers, as compile_guards does.
+
+The classes are found by partition refinement in the style of Hopcroft's algorithm, extended to nondeterministic
+automata (as in Paige and Tarjan, and Valmari). The transitions are split into cords, each with one label and its
+targets in one class. When a class splits only the transitions into the smaller part are looked at, and when a cord
+that the classes were already split by splits, counts of each state's transitions in it tell the states with
+transitions in both parts from those in one. Each transition is looked at O(log n) times, so O(m log n) in all.
+"""
+
+from collections import namedtuple, deque
+
+from log import log, INFO
+from instrument import phase_start, phase_end, count
+from Automata_Structures import *
+from Guard_compiler import guard_windows
+
+MinimiseReport = namedtuple('MinimiseReport', ['label', 'states', 'transitions', 'unreachable', 'merged',
+                                               'removed_transitions'])
+# states, transitions: how many there were
+# unreachable: the states removed as they cannot be reached, merged: the states merged into another
+# removed_transitions: how many transitions were removed, from unreachable or merged states or as copies
+
+
+# returns the minimised automata and a MinimiseReport for each
+def minimise_automata(_automata, _integer_clock=False):
+    _reports = []
+    return list(iter_minimise_automata(_automata, _integer_clock, _reports)), _reports
+
+# yields each minimised automaton as it comes, for automata read as a stream
+# the MinimiseReports are added to _reports when it is given, what was removed is logged unless _quiet
+def iter_minimise_automata(_automata, _integer_clock=False, _reports=None, _quiet=False):
+    for a in _automata:
+        _minimised_automata, _report = minimise_single_automata(a, _integer_clock)
+        if not _quiet:
+            log_minimise_report(_report)
+        if _reports is not None:
+            _reports.append(_report)
+        yield _minimised_automata
+
+# logs what a MinimiseReport removed, if anything
+def log_minimise_report(_report):
+    if _report.unreachable or _report.merged or _report.removed_transitions:
+        log(lambda: str(_report.label) + ': ' + str(len(_report.unreachable) + len(_report.merged)) + ' states ('
+            + str(len(_report.unreachable)) + ' unreachable, ' + str(len(_report.merged)) + ' merged) and '
+            + str(_report.removed_transitions) + ' transitions removed', 0, INFO)
+
+
+def minimise_single_automata(a, _integer_clock=False):
+    _timer = phase_start()
+    _transition_dictionary = a.transition_dictionary
+    _transition_count = sum(len(_state_transitions) for _state_transitions in _transition_dictionary.values())
+    _reachable = reachable_states(a)
+    _states = [state for state in a.state_list if state in _reachable]
+    _unreachable = [state for state in a.state_list if state not in _reachable]
+    _state_ids = {state: i for i, state in enumerate(_states)}
+
+    # the transitions of the reachable states as (source, label, target) ids
+    _labels = {}
+    _guards = {}
+    _sources = []
+    _label_ids = []
+    _targets = []
+    for i, state in enumerate(_states):
+        for c in _transition_dictionary.get(state, ()):
+            _sources.append(i)
+            _label_ids.append(_labels.setdefault(transition_label(c, _integer_clock, _guards), len(_labels)))
+            _targets.append(_state_ids[c.end_state])
+    _classes = bisimulation_classes(len(_states), _sources, _label_ids, _targets,
+                                    [1 if state == a.end_state else 0 for state in _states])
+
+    # the first state of each class stands for it, the initial state for its own class
+    _representatives = {}
+    if a.initial_state in _state_ids:
+        _representatives[_classes[_state_ids[a.initial_state]]] = a.initial_state
+    for i, state in enumerate(_states):
+        _representatives.setdefault(_classes[i], state)
+    _representative_of = {state: _representatives[_classes[i]] for i, state in enumerate(_states)}
+
+    _state_list = []
+    _merged = []
+    _minimised_dictionary = {}
+    _kept = 0
+    for i, state in enumerate(_states):
+        if _representative_of[state] != state:
+            _merged.append(state)
+            continue
+        _state_list.append(state)
+        if state not in _transition_dictionary:
+            continue
+        _seen = set()
+        _state_transitions = []
+        for c in _transition_dictionary[state]:
+            _end_state = _representative_of[c.end_state]
+            _key = (_labels[transition_label(c, _integer_clock, _guards)], _end_state)
+            if _key in _seen:
+                continue
+            _seen.add(_key)
+            _state_transitions.append(c if _end_state == c.end_state else c._replace(end_state=_end_state))
+        _minimised_dictionary[state] = _state_transitions
+        _kept += len(_state_transitions)
+
+    # an end state that cannot be reached is never stopped in
+    _end_state = a.end_state if a.end_state in _reachable else ''
+    count('states removed', len(_unreachable) + len(_merged))
+    count('transitions removed', _transition_count - _kept)
+    phase_end('minimise', _timer, a.label)
+    return (Automata(a.label, a.initial_state, _end_state, _state_list, _minimised_dictionary, a.text),
+            MinimiseReport(a.label, len(a.state_list), _transition_count, _unreachable, _merged,
+                           _transition_count - _kept))
+
+
+# the states that can be reached from the initial state
+def reachable_states(a):
+    _transition_dictionary = a.transition_dictionary
+    _reachable = {a.initial_state}
+    _waiting = [a.initial_state]
+    while _waiting:
+        for c in _transition_dictionary.get(_waiting.pop(), ()):
+            if c.end_state not in _reachable:
+                _reachable.add(c.end_state)
+                _waiting.append(c.end_state)
+    return _reachable
+
+
+# what a transition does apart from where it goes, transitions with the same label behave the same
+# _guards keeps the guards already read, by condition
+def transition_label(c, _integer_clock=False, _guards=None):
+    _guard = _guards.get(c.condition) if _guards is not None else None
+    if _guard is None:
+        _windows = guard_windows(c.condition, _integer_clock)
+        _guard = c.condition if _windows is None else _windows
+        if _guards is not None:
+            _guards[c.condition] = _guard
+    return c.communication_details, _guard, c.reset_x
+
+
+# the coarsest bisimulation of a labelled transition system, as a class id for each state
+# _sources, _labels and _targets give each transition, _initial_classes the classes to start from
+def bisimulation_classes(_state_count, _sources, _labels, _targets, _initial_classes):
+    if _state_count == 0:
+        return []
+    _blocks = _RefinablePartition.from_keys(_initial_classes, _smaller_new=True)
+    _cords = _RefinablePartition.from_keys(_labels, _smaller_new=False)
+    _incoming = [[] for _ in range(_state_count)]
+    for t, _target in enumerate(_targets):
+        _incoming[_target].append(t)
+
+    # a counter for each state and cord it has transitions in, shared by those transitions
+    _counter_of = [0] * len(_sources)
+    _counts = []
+    _counters = {}
+    for t, _source in enumerate(_sources):
+        _counter = _counters.setdefault((_source, _cords.set_of[t]), len(_counts))
+        if _counter == len(_counts):
+            _counts.append(0)
+        _counts[_counter] += 1
+        _counter_of[t] = _counter
+
+    # the cords the blocks are split by, and the blocks whose incoming transitions are still to split the cords by
+    # to start with, the cords split by the blocks but the first
+    _split_by = [False] * _cords.set_count
+    _unsplit_cords = deque(range(_cords.set_count))
+    _new_blocks = list(range(1, _blocks.set_count))
+    while _new_blocks or _unsplit_cords:
+        if _new_blocks:
+            for _state in _blocks.elements_of(_new_blocks.pop()):
+                for t in _incoming[_state]:
+                    _cords.mark(t)
+            for _old_cord, _new_cord in _cords.split():
+                # the transitions into the new block get counters of their own
+                _moved = {}
+                for t in _cords.elements_of(_new_cord):
+                    _old_counter = _counter_of[t]
+                    _counts[_old_counter] -= 1
+                    _source = _sources[t]
+                    if _source not in _moved:
+                        _moved[_source] = (_old_counter, len(_counts))
+                        _counts.append(0)
+                    _counter = _moved[_source][1]
+                    _counts[_counter] += 1
+                    _counter_of[t] = _counter
+                _split_by.append(_split_by[_old_cord])
+                if not _split_by[_old_cord]:
+                    _unsplit_cords.append(_new_cord)
+                    continue
+                # every state of a block had transitions in the old cord or none did, so the blocks split three ways:
+                # transitions only in the old part, only in the new part, and in both
+                for _source in _moved:
+                    _blocks.mark(_source)
+                _new_blocks.extend(_new_block for _old_block, _new_block in _blocks.split())
+                for _source, (_old_counter, _counter) in _moved.items():
+                    if _counts[_old_counter]:
+                        _blocks.mark(_source)
+                _new_blocks.extend(_new_block for _old_block, _new_block in _blocks.split())
+        else:
+            _cord = _unsplit_cords.popleft()
+            _split_by[_cord] = True
+            for t in _cords.elements_of(_cord):
+                _blocks.mark(_sources[t])
+            _new_blocks.extend(_new_block for _old_block, _new_block in _blocks.split())
+    return list(_blocks.set_of)
+
+
+# a partition of 0 to n-1 into sets that can be split, each set is a slice of the elements array
+# marked elements are moved to the front of their set, and split makes them a set of their own, or with _smaller_new
+# whichever of the marked and unmarked parts is smaller, so the new sets are the ones to look at
+class _RefinablePartition:
+    __slots__ = ('elements', 'location', 'set_of', 'first', 'past', 'marked', 'touched', 'smaller_new')
+
+    def __init__(self, _size, _smaller_new):
+        self.elements = list(range(_size))
+        self.location = list(range(_size))
+        self.set_of = [0] * _size
+        self.first = [0]
+        self.past = [_size]
+        self.marked = [0]
+        self.touched = []
+        self.smaller_new = _smaller_new
+
+    # the sets of elements with the same key, the set of the most elements first
+    @classmethod
+    def from_keys(cls, _keys, _smaller_new):
+        _partition = cls(len(_keys), _smaller_new)
+        _groups = {}
+        for i, _key in enumerate(_keys):
+            _groups.setdefault(_key, []).append(i)
+        _groups = sorted(_groups.values(), key=len, reverse=True)
+        _partition.elements = [i for _group in _groups for i in _group]
+        _partition.first = []
+        _partition.past = []
+        for _set, _group in enumerate(_groups):
+            _partition.first.append(_partition.past[-1] if _partition.past else 0)
+            _partition.past.append(_partition.first[-1] + len(_group))
+            for i in _group:
+                _partition.set_of[i] = _set
+        _partition.location = [0] * len(_keys)
+        for _position, i in enumerate(_partition.elements):
+            _partition.location[i] = _position
+        _partition.marked = [0] * len(_groups)
+        return _partition
+
+    @property
+    def set_count(self):
+        return len(self.first)
+
+    def elements_of(self, _set):
+        return self.elements[self.first[_set]:self.past[_set]]
+
+    # marking an element again does nothing
+    def mark(self, _element):
+        _set = self.set_of[_element]
+        _location = self.location[_element]
+        _boundary = self.first[_set] + self.marked[_set]
+        if _location < _boundary:
+            return
+        _other = self.elements[_boundary]
+        self.elements[_location] = _other
+        self.location[_other] = _location
+        self.elements[_boundary] = _element
+        self.location[_element] = _boundary
+        if self.marked[_set] == 0:
+            self.touched.append(_set)
+        self.marked[_set] += 1
+
+    # splits each set with marked elements, returns (old set, new set) for each split
+    def split(self):
+        _splits = []
+        while self.touched:
+            _set = self.touched.pop()
+            _boundary = self.first[_set] + self.marked[_set]
+            self.marked[_set] = 0
+            if _boundary == self.past[_set]:
+                continue
+            _new = len(self.first)
+            if not self.smaller_new or _boundary - self.first[_set] <= self.past[_set] - _boundary:
+                # the marked part is the new set
+                self.first.append(self.first[_set])
+                self.past.append(_boundary)
+                self.first[_set] = _boundary
+            else:
+                self.first.append(_boundary)
+                self.past.append(self.past[_set])
+                self.past[_set] = _boundary
+            self.marked.append(0)
+            for _position in range(self.first[_new], self.past[_new]):
+                self.set_of[self.elements[_position]] = _new
+            _splits.append((_set, _new))
+        return _splits
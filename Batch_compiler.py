@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+
+"""Batch compiler
+
+Compiles many CTA systems in one go, each from its own spec file, and writes a Go program for each.
+A spec file holds the notation of one system (any number of automata, whitespace and newlines are fine).
+
+The specs can be given as files, as directories (every *.cta file below them, in name order) or in a manifest.
+A manifest lists one spec per line, optionally followed by the path to write its program to, relative paths are from
+the manifest's directory; blank lines and lines starting with # are skipped.
+Without an output in the manifest the program goes to the --output template, where {dir} is the spec's directory and
+{name} its file name without the extension.
+
+The specs are compiled in a process pool, each spec is one task, and a spec that fails (unreadable, bad notation, ...)
+is reported in the summary without stopping the others. The compile cache is shared by the workers.
+
+Usage: python Batch_compiler.py [specs and directories] [--manifest FILE] [--workers N] [--output TEMPLATE] ...
+The exit status is 1 when any spec failed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from log import configure_log
+from File_writer import write_golang
+from Compile_cache import CompileCache, compile_notation
+
+SpecResult = namedtuple('SpecResult', ['spec', 'output', 'automata', 'transitions', 'characters', 'seconds', 'error'])
+# spec, output: the paths read and written
+# automata, transitions, characters: what was compiled and the size of the program written
+# seconds: wall time to read, compile and write the spec
+# error: None, or why the spec failed
+
+_default_pattern = '.cta'
+_default_output = '{dir}/{name}.go'
+
+
+# the specs of a manifest as (spec, output), output is None when the line has none
+def read_manifest(_manifest):
+    _directory = os.path.dirname(_manifest)
+    _specs = []
+    with open(_manifest) as _file:
+        for _line in _file:
+            _line = _line.strip()
+            if not _line or _line.startswith('#'):
+                continue
+            _fields = _line.split()
+            if len(_fields) > 2:
+                raise ValueError(_manifest + ': expected a spec and at most one output, got: ' + _line)
+            _spec = os.path.join(_directory, _fields[0])
+            _output = os.path.join(_directory, _fields[1]) if len(_fields) == 2 else None
+            _specs.append((_spec, _output))
+    return _specs
+
+
+# the spec files below a directory, in name order
+def find_specs(_directory, _pattern=_default_pattern):
+    _specs = []
+    for _root, _directories, _files in os.walk(_directory):
+        _directories.sort()
+        for _name in sorted(_files):
+            if _name.endswith(_pattern):
+                _specs.append(os.path.join(_root, _name))
+    return _specs
+
+
+def output_path(_spec, _template=_default_output):
+    _directory, _file = os.path.split(_spec)
+    return _template.format(dir=_directory or '.', name=os.path.splitext(_file)[0])
+
+
+# reads, compiles and writes one spec, failures are returned in the result rather than raised
+def compile_spec(_spec, _output, _timing='poll', _int_states=False, _compile_guards=False, _cache_directory=None,
+                 _metrics=False, _minimise=False):
+    _start = time.perf_counter()
+    _automata = []
+    _characters = 0
+    try:
+        with open(_spec) as _file:
+            _notation = _file.read()
+        # the cache is bounded once by the batch when it is done, not after every spec
+        _cache = CompileCache(_cache_directory, None) if _cache_directory is not None else None
+        _automata, _pieces = compile_notation([_notation], _timing, _int_states, _compile_guards, _cache, 1, _metrics,
+                                              _minimise)
+        if not _automata:
+            raise ValueError('no automata in the spec')
+        _directory = os.path.dirname(_output)
+        if _directory:
+            os.makedirs(_directory, exist_ok=True)
+        _characters = write_golang(_pieces, _output)
+        _error = None
+    except Exception as _exception:
+        _error = type(_exception).__name__ + ': ' + str(_exception)
+    _transitions = sum(len(_state_transitions) for a in _automata for _state_transitions in a.transition_dictionary.values())
+    return SpecResult(_spec, _output, len(_automata), _transitions, _characters, time.perf_counter() - _start, _error)
+
+
+# compiles each (spec, output) and returns the results in the same order
+# _workers above 1 compiles them in that many processes, 0 or None uses every core
+# _progress is called with each result as it finishes
+def compile_batch(_specs, _timing='poll', _int_states=False, _compile_guards=False, _cache_directory=None,
+                  _workers=1, _log_level='warning', _progress=None, _metrics=False, _minimise=False):
+    _results = [None] * len(_specs)
+    _tasks = []
+    _claimed = {}
+    for i, (_spec, _output) in enumerate(_specs):
+        # two specs writing the same file would leave only one of them, so the later one fails
+        _key = os.path.abspath(_output)
+        if _key in _claimed:
+            _results[i] = SpecResult(_spec, _output, 0, 0, 0, 0.0, 'ValueError: output also written by ' + _claimed[_key])
+            if _progress is not None:
+                _progress(_results[i])
+        else:
+            _claimed[_key] = _spec
+            _tasks.append(i)
+    _arguments = (_timing, _int_states, _compile_guards, _cache_directory, _metrics, _minimise)
+
+    if _workers is None or _workers == 0:
+        _workers = os.cpu_count() or 1
+    if min(_workers, len(_tasks)) <= 1:
+        for i in _tasks:
+            _results[i] = compile_spec(*_specs[i], *_arguments)
+            if _progress is not None:
+                _progress(_results[i])
+    else:
+        with ProcessPoolExecutor(min(_workers, len(_tasks)), initializer=configure_log, initargs=(_log_level,)) as _pool:
+            _futures = {_pool.submit(compile_spec, *_specs[i], *_arguments): i for i in _tasks}
+            for _future in as_completed(_futures):
+                i = _futures[_future]
+                try:
+                    _results[i] = _future.result()
+                except Exception as _exception:
+                    # the worker itself went down, e.g. killed for running out of memory
+                    _results[i] = SpecResult(*_specs[i], 0, 0, 0, 0.0, type(_exception).__name__ + ': ' + str(_exception))
+                if _progress is not None:
+                    _progress(_results[i])
+    return _results
+
+
+def format_result(_result):
+    if _result.error is not None:
+        return 'FAIL ' + format(_result.seconds, '8.3f') + 's  ' + _result.spec + ': ' + _result.error
+    return ('ok   ' + format(_result.seconds, '8.3f') + 's  ' + _result.spec + ' -> ' + _result.output + ' ('
+            + str(_result.automata) + ' automata, ' + str(_result.transitions) + ' transitions)')
+
+
+# the totals of a batch, also the body of the --summary file
+def summarise(_results, _wall):
+    _failed = [_result for _result in _results if _result.error is not None]
+    _seconds = [_result.seconds for _result in _results]
+    return {'specs': len(_results),
+            'compiled': len(_results) - len(_failed),
+            'failed': len(_failed),
+            'automata': sum(_result.automata for _result in _results),
+            'transitions': sum(_result.transitions for _result in _results),
+            'characters': sum(_result.characters for _result in _results),
+            'wall_seconds': _wall,
+            'spec_seconds': sum(_seconds),
+            'slowest': max(_results, key=lambda _result: _result.seconds)._asdict() if _results else None,
+            'results': [_result._asdict() for _result in _results]}
+
+
+def print_summary(_summary):
+    print('\n' + str(_summary['compiled']) + ' of ' + str(_summary['specs']) + ' specs compiled, '
+          + str(_summary['failed']) + ' failed')
+    print(str(_summary['automata']) + ' automata, ' + str(_summary['transitions']) + ' transitions, '
+          + str(_summary['characters']) + ' characters of Go')
+    print('wall ' + format(_summary['wall_seconds'], '.3f') + 's, summed over specs '
+          + format(_summary['spec_seconds'], '.3f') + 's')
+    if _summary['slowest'] is not None:
+        print('slowest: ' + _summary['slowest']['spec'] + ' (' + format(_summary['slowest']['seconds'], '.3f') + 's)')
+    for _result in _summary['results']:
+        if _result['error'] is not None:
+            print('failed: ' + _result['spec'] + ': ' + _result['error'])
+
+
+def main(_argv=None):
+    _parser = argparse.ArgumentParser(description='Compiles many CTA systems, one Go program per spec file.')
+    _parser.add_argument('specs', nargs='*', help='spec files, or directories to search for them')
+    _parser.add_argument('--manifest', action='append', default=[],
+                         help='file listing one spec per line, optionally followed by its output path')
+    _parser.add_argument('--pattern', default=_default_pattern, help='ending of the spec files found in directories')
+    _parser.add_argument('--output', default=_default_output,
+                         help='where each program is written, {dir} is the spec directory and {name} its name')
+    _parser.add_argument('--workers', type=int, default=0, help='processes to compile in, 0 for one per core')
+    _parser.add_argument('--timing', default='poll', choices=['poll', 'event'])
+    _parser.add_argument('--int-states', action='store_true')
+    _parser.add_argument('--compile-guards', action='store_true')
+    _parser.add_argument('--minimise', action='store_true', help='merge equivalent states and drop unreachable ones')
+    _parser.add_argument('--metrics', action='store_true', help='per transition metrics in the programs (event timing)')
+    _parser.add_argument('--no-cache', action='store_true', help='parse and generate every automaton again')
+    _parser.add_argument('--cache-dir', default='.cta_cache', help='where the compile cache is kept')
+    _parser.add_argument('--cache-size', type=int, default=64, help='size limit of the compile cache in MB')
+    _parser.add_argument('--log-level', default='warning', help='debug, info, warning, error or off')
+    _parser.add_argument('--summary', default=None, help='also write the summary to this file as JSON')
+    _parser.add_argument('--quiet', action='store_true', help='only print the summary')
+    _arguments = _parser.parse_args(_argv)
+    if _arguments.workers < 0:
+        _parser.error('--workers cannot be negative')
+    if _arguments.metrics and _arguments.timing != 'event':
+        _parser.error('--metrics needs --timing event')
+    configure_log(_arguments.log_level)
+
+    _specs = []
+    for _path in _arguments.specs:
+        if os.path.isdir(_path):
+            _specs.extend((_spec, None) for _spec in find_specs(_path, _arguments.pattern))
+        else:
+            # a missing file is left for compile_spec to report with the other failures
+            _specs.append((_path, None))
+    for _manifest in _arguments.manifest:
+        try:
+            _specs.extend(read_manifest(_manifest))
+        except (OSError, ValueError) as _exception:
+            _parser.error('cannot read manifest: ' + str(_exception))
+    if not _specs:
+        _parser.error('no specs given')
+    _specs = [(_spec, _output if _output is not None else output_path(_spec, _arguments.output))
+              for _spec, _output in _specs]
+
+    _cache_directory = None if _arguments.no_cache else _arguments.cache_dir
+    _start = time.perf_counter()
+    _results = compile_batch(_specs, _arguments.timing, _arguments.int_states, _arguments.compile_guards,
+                             _cache_directory, _arguments.workers, _arguments.log_level,
+                             None if _arguments.quiet else lambda _result: print(format_result(_result)),
+                             _arguments.metrics, _arguments.minimise)
+    _wall = time.perf_counter() - _start
+    if _cache_directory is not None:
+        CompileCache(_cache_directory, _arguments.cache_size * 1024 * 1024).evict()
+
+    _summary = summarise(_results, _wall)
+    print_summary(_summary)
+    if _arguments.summary is not None:
+        with open(_arguments.summary, 'w') as _file:
+            json.dump(_summary, _file, indent=1)
+    return 1 if _summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
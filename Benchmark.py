@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+
+"""Benchmark
+
+Times the loader on generated notation of increasing size, to check that parsing scales linearly.
+Each size doubles the number of transitions, so the time per transition should stay roughly flat.
+
+The suite goes further: synthetic_network generates a network of communicating automata with a given number of
+automata, states, outgoing transitions per state, comparisons per guard, share of transitions resetting x and
+partners each automaton talks to. For each network in the suite load_automata, generate_go_lang and write_golang are
+timed separately (best of a few runs) and run once more under tracemalloc for their peak memory.
+The results are saved as JSON, and compared against a stored baseline any phase that got slower or bigger by more than
+the threshold is reported as a regression.
+
+Usage:
+    python Benchmark.py [automata] [largest transitions per automaton]
+    python Benchmark.py suite [--quick] [--output results.json] [--baseline baseline.json] [--threshold 0.2]
+    python Benchmark.py compare results.json baseline.json [--threshold 0.2]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import Cta_Loader
+import Golang_generator
+import File_writer
+from log import configure_log, OFF
+
+
+# builds the notation for _automata automata, each a chain of _transitions transitions
+def synthetic_notation(_automata, _transitions):
+    _notation = []
+    for a in range(_automata):
+        _notation.append('Cta A' + str(a) + ' = Init s0;')
+        for t in range(_transitions):
+            _notation.append('s' + str(t) + ' A' + str((a + 1) % _automata) + '!m' + str(t % 7)
+                             + '(x >= ' + str(t % 5) + ' && x < ' + str(t % 5 + 10) + ',{x}) s' + str(t + 1) + ';')
+    return ''.join(_notation)
+
+
+# builds the notation of a network of _automata automata with _states states each
+# every state but the last has _out_degree outgoing transitions, the first to the next state so every state is
+# reachable and the last is the end state, the rest to random states
+# each guard has _guard_terms comparisons on x (0 is 'true'), paired into windows joined with ||
+# _reset_rate of the transitions reset x
+# each automaton talks to the _fan_out automata after it, a transition sends or receives one of _messages messages to
+# one of them at random, with no partners (_fan_out 0) the transitions have no communication
+def synthetic_network(_automata=4, _states=16, _out_degree=2, _guard_terms=2, _reset_rate=0.5, _fan_out=1,
+                      _messages=4, _seed=0):
+    _random = random.Random(_seed)
+    _fan_out = min(_fan_out, _automata - 1)
+    _notation = []
+    for a in range(_automata):
+        _partners = ['A' + str((a + j) % _automata) for j in range(1, _fan_out + 1)]
+        _notation.append('Cta A' + str(a) + ' = Init s0;')
+        for s in range(_states - 1):
+            for d in range(_out_degree):
+                _target = s + 1 if d == 0 else _random.randrange(_states - 1)
+                if _partners:
+                    _communication = (_random.choice(_partners) + _random.choice('!?') + 'm'
+                                      + str(_random.randrange(_messages)))
+                else:
+                    _communication = ''
+                _reset = ',{x}' if _random.random() < _reset_rate else ''
+                _notation.append('s' + str(s) + ' ' + _communication + '(' + _synthetic_guard(_random, _guard_terms)
+                                 + _reset + ') s' + str(_target) + ';')
+    return ''.join(_notation)
+
+
+def _synthetic_guard(_random, _terms):
+    if _terms <= 0:
+        return 'true'
+    _windows = []
+    for _ in range(_terms // 2):
+        _low = _random.randrange(20)
+        _windows.append('x >= ' + str(_low) + ' && x < ' + str(_low + _random.randrange(1, 10)))
+    if _terms % 2:
+        _windows.append('x ' + _random.choice(('<', '<=', '>', '>=')) + ' ' + str(_random.randrange(20)))
+    return ' || '.join(_windows)
+
+
+# best of _repeat runs, the log output is thrown away so only the parsing is timed
+def time_loader(_notation, _repeat=3):
+    _best = None
+    for _ in range(_repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            _start = time.perf_counter()
+            Cta_Loader.load_automata(_notation)
+            _elapsed = time.perf_counter() - _start
+        if _best is None or _elapsed < _best:
+            _best = _elapsed
+    return _best
+
+
+def bench_loader(_automata=10, _largest=2000):
+    print('transitions\tcharacters\tseconds\tus/transition')
+    _transitions = _largest // 16 or 1
+    while _transitions <= _largest:
+        _notation = synthetic_notation(_automata, _transitions)
+        _elapsed = time_loader(_notation)
+        _total = _automata * _transitions
+        print(str(_total) + '\t' + str(len(_notation)) + '\t' + format(_elapsed, '.4f') + '\t'
+              + format(_elapsed / _total * 1e6, '.2f'))
+        _transitions *= 2
+
+
+# the networks of the suite, as synthetic_network parameters
+# each row scales one parameter from a common middle, so each gives one scaling curve
+_middle = {'_automata': 8, '_states': 32, '_out_degree': 2, '_guard_terms': 2, '_reset_rate': 0.5, '_fan_out': 2}
+_suite_scales = [('_automata', (2, 8, 32, 128)),
+                 ('_states', (8, 32, 128, 512)),
+                 ('_out_degree', (1, 2, 4, 8)),
+                 ('_guard_terms', (0, 2, 4, 8)),
+                 ('_reset_rate', (0.0, 0.5, 1.0)),
+                 ('_fan_out', (0, 1, 2, 7))]
+_quick_scales = [('_automata', (2, 8)), ('_states', (8, 32))]
+
+
+# the parameters of each network in the suite, without repeats, with a name for each
+def suite_networks(_quick=False):
+    _networks = {}
+    for _parameter, _values in (_quick_scales if _quick else _suite_scales):
+        for _value in _values:
+            _parameters = dict(_middle, **{_parameter: _value})
+            _name = '_'.join(_key.strip('_') + '=' + str(_parameters[_key]) for _key in sorted(_parameters))
+            _networks[_name] = _parameters
+    return _networks
+
+
+# times each phase of the pipeline on the notation, best of _repeat runs, then runs each once under tracemalloc
+# returns {'load': {'seconds': ..., 'peak_bytes': ...}, 'generate': {...}, 'write': {...}}
+def bench_phases(_notation, _repeat=3):
+    _descriptor, _output = tempfile.mkstemp(suffix='.go')
+    os.close(_descriptor)
+    _phases = {}
+    try:
+        _automata = Cta_Loader.load_automata(_notation)
+        _lines = Golang_generator.generate_go_lang(_automata, [_notation])
+        _runs = {'load': lambda: Cta_Loader.load_automata(_notation),
+                 'generate': lambda: Golang_generator.generate_go_lang(_automata, [_notation]),
+                 'write': lambda: File_writer.write_golang(_lines, _output)}
+        for _phase, _run in _runs.items():
+            _best = None
+            for _ in range(_repeat):
+                _start = time.perf_counter()
+                _run()
+                _elapsed = time.perf_counter() - _start
+                if _best is None or _elapsed < _best:
+                    _best = _elapsed
+            # tracemalloc slows everything down, so memory is measured on a run of its own
+            tracemalloc.start()
+            _run()
+            _peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            _phases[_phase] = {'seconds': _best, 'peak_bytes': _peak}
+        _phases['write']['characters'] = sum(len(_line) for _line in _lines)
+    finally:
+        os.remove(_output)
+    return _phases
+
+
+def run_suite(_quick=False, _repeat=3, _progress=print):
+    # the log would be timed along with the pipeline
+    configure_log(OFF)
+    _results = []
+    for _name, _parameters in suite_networks(_quick).items():
+        _notation = synthetic_network(**_parameters)
+        _transitions = _parameters['_automata'] * (_parameters['_states'] - 1) * _parameters['_out_degree']
+        _phases = bench_phases(_notation, _repeat)
+        _results.append({'name': _name,
+                         'parameters': {_key.strip('_'): _value for _key, _value in _parameters.items()},
+                         'characters': len(_notation),
+                         'transitions': _transitions,
+                         'phases': _phases})
+        if _progress is not None:
+            _progress(format_result(_results[-1]))
+    return {'python': platform.python_version(),
+            'machine': platform.machine(),
+            'time': time.time(),
+            'results': _results}
+
+
+def format_result(_result):
+    return (_result['name'] + ': ' + ', '.join(
+        _phase + ' ' + format(_values['seconds'] * 1e6 / max(_result['transitions'], 1), '.2f') + ' us/transition '
+        + format(_values['peak_bytes'] / 1024, '.0f') + ' KB' for _phase, _values in _result['phases'].items()))
+
+
+# growth below these is noise on the small networks and never a regression
+_noise = {'seconds': 0.001, 'peak_bytes': 4096}
+
+
+# compares two suite results, returns (name, phase, measure, baseline, new) for each measure that grew by more
+# than _threshold (0.2 is 20%), networks or phases missing from either are skipped
+def compare_results(_new, _baseline, _threshold=0.2):
+    _baseline_results = {_result['name']: _result for _result in _baseline['results']}
+    _regressions = []
+    for _result in _new['results']:
+        _old = _baseline_results.get(_result['name'])
+        if _old is None:
+            continue
+        for _phase, _values in _result['phases'].items():
+            for _measure in ('seconds', 'peak_bytes'):
+                _before = _old['phases'].get(_phase, {}).get(_measure)
+                if (_before and _values[_measure] > _before * (1 + _threshold)
+                        and _values[_measure] - _before > _noise[_measure]):
+                    _regressions.append((_result['name'], _phase, _measure, _before, _values[_measure]))
+    return _regressions
+
+
+def print_regressions(_regressions, _threshold):
+    if not _regressions:
+        print('no regressions over ' + format(_threshold, '.0%'))
+        return
+    print(str(len(_regressions)) + ' regressions over ' + format(_threshold, '.0%') + ':')
+    for _name, _phase, _measure, _before, _after in _regressions:
+        print('  ' + _name + ' ' + _phase + ' ' + _measure + ': ' + format(_before, '.6g') + ' -> '
+              + format(_after, '.6g') + ' (' + format(_after / _before - 1, '+.0%') + ')')
+
+
+def main(_argv):
+    # the loader benchmark keeps its old command line
+    if not _argv or _argv[0] not in ('suite', 'compare'):
+        bench_loader(*[int(_arg) for _arg in _argv[0:2]])
+        return 0
+    _parser = argparse.ArgumentParser(description='Benchmarks the load, generate and write phases.')
+    _commands = _parser.add_subparsers(dest='command')
+    _suite = _commands.add_parser('suite', help='run the suite of synthetic networks')
+    _suite.add_argument('--quick', action='store_true', help='only a few small networks')
+    _suite.add_argument('--repeat', type=int, default=3, help='runs of each phase, the best is kept')
+    _suite.add_argument('--output', default='benchmark_results.json', help='where the results are saved')
+    _suite.add_argument('--baseline', default=None, help='results to compare against')
+    _suite.add_argument('--threshold', type=float, default=0.2, help='growth reported as a regression, 0.2 is 20%%')
+    _compare = _commands.add_parser('compare', help='compare saved results against a baseline')
+    _compare.add_argument('results')
+    _compare.add_argument('baseline')
+    _compare.add_argument('--threshold', type=float, default=0.2, help='growth reported as a regression, 0.2 is 20%%')
+    _arguments = _parser.parse_args(_argv)
+
+    if _arguments.command == 'suite':
+        _results = run_suite(_arguments.quick, _arguments.repeat)
+        with open(_arguments.output, 'w') as _file:
+            json.dump(_results, _file, indent=1)
+        print('results saved to ' + _arguments.output)
+        if _arguments.baseline is None:
+            return 0
+        _baseline_file = _arguments.baseline
+    else:
+        with open(_arguments.results) as _file:
+            _results = json.load(_file)
+        _baseline_file = _arguments.baseline
+    with open(_baseline_file) as _file:
+        _baseline = json.load(_file)
+    _regressions = compare_results(_results, _baseline, _arguments.threshold)
+    print_regressions(_regressions, _arguments.threshold)
+    return 1 if _regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
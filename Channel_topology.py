@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+
+"""Channel topology
+
+Pairs the sends and receives of the automata into channels and works out how many places each channel's buffer needs.
+
+A send by automaton A to other B with content m and a receive by B from other A with content m are one link, and use
+one channel, channel_A_B_m, of type m (struct{} when there is no content), as in the Simulator. The name only depends
+on the transition and the label of its own automaton, so the function of an automaton is still generated on its own.
+When a label or the content has a _ or a character Go does not allow, the name gets a hash of the three, as A_B to C
+and A to B_C would otherwise share channel_A_B_C.
+Transitions without content or other are internal and get no channel.
+
+automata_channel_uses goes over one automaton and gives a ChannelUse for each channel it sends or receives on, with
+what the buffer size is worked out from:
+- bound: the most times the automaton uses the channel on any run, from the longest path through the strongly
+  connected components of its states, or None when a transition on the channel is on a cycle,
+- period: on the send side, the least time between two sends. A send that resets x is followed by the next send no
+  sooner than the lower ends of the guards of the resetting transitions on the way and of the next send, the shortest
+  such path is found with Dijkstra's algorithm. A send that does not reset x gives 0,
+- guards: on the receive side, the guards of the receives. The opening, the latest clock value at which one of their
+  windows opens, is how long the receiver may leave a message waiting once it is back in a receiving state. It is only
+  read from them when the sender has no bound, as reading every guard costs about as much as generating.
+channel_topology then indexes the uses of every automaton by channel name in one pass and gives a Channel for each,
+in the order they are first met. The capacity is:
+- 0 when nothing is ever sent, there is nothing to hold,
+- the bound of the sender when it is finite, so every message sent fits and the sender never waits,
+- 1 when nothing receives, the sender stalls once it is full however large it is,
+- period and opening: as many messages as can be sent while the receiver holds off, opening // period + 1,
+- default_capacity when the timing gives no bound,
+and at most max_capacity. Links whose other is not an automaton, or with a send and no receive or the other way round,
+are logged as warnings, their channel is still declared so the program builds.
+"""
+
+import heapq
+import math
+import re
+import zlib
+
+from collections import namedtuple
+
+from log import log, WARNING
+from instrument import phase_start, phase_end
+from Automata_Structures import *
+from Guard_compiler import guard_windows
+
+default_capacity = 2
+max_capacity = 1024
+# a part of a channel name that needs no hash, letters and digits
+_plain_pattern = re.compile(r'[^\W_]+')
+_not_identifier_pattern = re.compile(r'\W')
+
+ChannelUse = namedtuple('ChannelUse', ['name', 'sender', 'receiver', 'type', 'side', 'bound', 'period', 'guards'])
+# side: 'send' or 'receive', the automaton using the channel is its sender or its receiver
+# bound: the most uses on any run, None for no bound; period: least time between sends, on the send side when unbound
+# guards: the distinct guards of the receives, on the receive side
+
+Channel = namedtuple('Channel', ['name', 'sender', 'receiver', 'type', 'capacity', 'reason'])
+# reason: why the buffer has that many places, for the comment in the Go
+
+
+# transitions without communication do not need a channel
+def is_internal(c):
+    return c.communication_details[1] == '' and c.communication_details[2] == ''
+
+# (sender, receiver, content) of the link a transition of the automaton uses
+def channel_link(_automata, _transition):
+    _type, _content, _other = _transition.communication_details
+    if 'send' in _type:
+        return _automata, _other, _content
+    return _other, _automata, _content
+
+# the name of the channel a transition of the automaton uses, the same for both ends of the link
+def channel_name(_automata, _transition):
+    _sender, _receiver, _content = channel_link(_automata, _transition)
+    _parts = [_sender, _receiver] + ([_content] if _content else [])
+    _name = 'channel_' + '_'.join(_parts)
+    if all(_plain_pattern.fullmatch(_part) for _part in _parts):
+        return _name
+    return _not_identifier_pattern.sub('_', _name) + '_' + format(zlib.crc32('\0'.join(_parts).encode()), '08x')
+
+# the go type of the messages on the channel of a transition
+def channel_type(_transition):
+    return _transition.communication_details[1] or 'struct{}'
+
+# (channel name, side) of a transition with communication, an automaton can be both ends of a channel to itself
+def _use_key(_automata, _transition):
+    return channel_name(_automata, _transition), 'send' if 'send' in _transition.communication_details[0] else 'receive'
+
+
+# a ChannelUse for each channel the automaton uses, in the order its states and transitions are met
+# with an integer clock the guards are read as whole numbers, as compile_guards does
+def automata_channel_uses(a, _integer_clock=False):
+    # the outgoing transitions of each state with their use key, None for internal ones
+    _edges = {}
+    _keys = {}
+    _transitions = {}
+    for state, _state_transitions in iter_state_transitions(a):
+        _state_edges = _edges[state] = []
+        for c in _state_transitions:
+            _key = None
+            if not is_internal(c):
+                _key = _keys.get(c.communication_details)
+                if _key is None:
+                    _key = _keys[c.communication_details] = _use_key(a.label, c)
+                _transitions.setdefault(_key, []).append(c)
+            _state_edges.append((c, _key))
+    if not _transitions:
+        return []
+    _bounds = _use_bounds(a, _edges)
+    _lows = {}
+    _uses = []
+    for _key, _channel_transitions in _transitions.items():
+        c = _channel_transitions[0]
+        _sender, _receiver, _content = channel_link(a.label, c)
+        _bound = _bounds.get(_key, 0)
+        _period = _guards = None
+        if _key[1] == 'receive':
+            _guards = tuple(dict.fromkeys(c.condition for c in _channel_transitions))
+        elif _bound is None:
+            # a finite bound is the capacity, the period is only needed without one
+            _period = _send_period(_edges, _key, _channel_transitions, _integer_clock, _lows)
+        _uses.append(ChannelUse(_key[0], _sender, _receiver, channel_type(c), _key[1], _bound, _period, _guards))
+    return _uses
+
+
+# indexes the uses of every automaton by channel, returns a dictionary of channel name to Channel
+# _labels are the labels of the automata, to tell a link to an automaton that never uses it from one to no automaton
+# with an integer clock the guards are read as whole numbers, as for automata_channel_uses
+def channel_topology(_use_lists, _labels=None, _integer_clock=False):
+    _timer = phase_start()
+    _ends = {}
+    for _uses in _use_lists:
+        for _use in _uses:
+            _ends.setdefault(_use.name, {})[_use.side] = _use
+    _labels = set(_labels) if _labels is not None else None
+    _channels = {}
+    for _name, _sides in _ends.items():
+        _send = _sides.get('send')
+        _receive = _sides.get('receive')
+        _use = _send or _receive
+        _capacity, _reason = channel_capacity(_send, _receive, _integer_clock)
+        _channels[_name] = Channel(_name, _use.sender, _use.receiver, _use.type, _capacity, _reason)
+        if _send is None or _receive is None:
+            _peer = _use.receiver if _receive is None else _use.sender
+            if _labels is not None and _peer not in _labels:
+                log(lambda: _name + ': ' + _peer + ' is not an automaton', 0, WARNING)
+            elif _receive is None:
+                log(lambda: _name + ': ' + _use.sender + ' sends ' + _use.type + ' to ' + _peer
+                    + ', which never receives it', 0, WARNING)
+            else:
+                log(lambda: _name + ': ' + _use.receiver + ' receives ' + _use.type + ' from ' + _peer
+                    + ', which never sends it', 0, WARNING)
+    phase_end('channels', _timer)
+    return _channels
+
+
+# the places the buffer of a channel needs and why, from the ChannelUse of each end (None when there is none)
+def channel_capacity(_send, _receive, _integer_clock=False):
+    if _send is None or _send.bound == 0:
+        return 0, 'nothing is sent'
+    if _send.bound is not None:
+        _capacity, _reason = _send.bound, 'at most ' + str(_send.bound) + ' sent'
+    elif _receive is None:
+        return 1, 'nothing receives'
+    else:
+        _opening = receive_opening(_receive.guards, _integer_clock) if _send.period else None
+        if _opening is None:
+            return default_capacity, 'the timing gives no bound, the default'
+        _capacity = int(_opening // _send.period) + 1
+        _reason = 'a send every ' + _number(_send.period) + ' or more, received within ' + _number(_opening)
+    if _capacity > max_capacity:
+        return max_capacity, _reason + ', capped'
+    return _capacity, _reason
+
+
+# the most uses of each channel and side on any run from the initial state, None for those used on a cycle
+def _use_bounds(a, _edges):
+    _components = _state_components(a)
+    _members = {}
+    for state, _component in _components.items():
+        _members.setdefault(_component, []).append(state)
+    _cyclic = set()
+    _best = {}
+    # the components are numbered sinks first, so those a component leads to are done before it
+    for _component in range(len(_members)):
+        _most = {}
+        for state in _members[_component]:
+            for c, _on in _edges.get(state, ()):
+                _target = _components[c.end_state]
+                if _target == _component:
+                    if _on is not None:
+                        _cyclic.add(_on)
+                    continue
+                for _key, _uses in _best[_target].items():
+                    if _uses > _most.get(_key, 0):
+                        _most[_key] = _uses
+                if _on is not None:
+                    _most[_on] = max(_most.get(_on, 0), _best[_target].get(_on, 0) + 1)
+        _best[_component] = _most
+    _bounds = dict(_best[_components[a.initial_state]]) if a.initial_state in _components else {}
+    for _key in _cyclic:
+        _bounds[_key] = None
+    return _bounds
+
+# the strongly connected component of each state reachable from the initial state, by Tarjan's algorithm
+# without recursion, the components are numbered in the order they are completed, so sinks first
+def _state_components(a):
+    _transition_dictionary = a.transition_dictionary
+    _index = {}
+    _low = {}
+    _components = {}
+    _stack = []
+    _component = 0
+    _index[a.initial_state] = _low[a.initial_state] = 0
+    _stack.append(a.initial_state)
+    _work = [(a.initial_state, iter(_transition_dictionary.get(a.initial_state, ())))]
+    while _work:
+        state, _edges = _work[-1]
+        for c in _edges:
+            _target = c.end_state
+            if _target not in _index:
+                _index[_target] = _low[_target] = len(_index)
+                _stack.append(_target)
+                _work.append((_target, iter(_transition_dictionary.get(_target, ()))))
+                break
+            if _target not in _components:
+                _low[state] = min(_low[state], _index[_target])
+        else:
+            _work.pop()
+            if _work:
+                _parent = _work[-1][0]
+                _low[_parent] = min(_low[_parent], _low[state])
+            if _low[state] == _index[state]:
+                while True:
+                    _member = _stack.pop()
+                    _components[_member] = _component
+                    if _member == state:
+                        break
+                _component += 1
+    return _components
+
+
+# the least time between two sends on the channel, 0 when a send does not reset x
+# _edges are the outgoing transitions of each state with their use key, _lows keeps the guards already read
+def _send_period(_edges, _key, _sends, _integer_clock, _lows):
+    if not all(c.reset_x for c in _sends):
+        return 0
+    # the time since the last send, the clock was reset by it and by the resetting transitions after it
+    _distances = {}
+    _queue = [(0, c.end_state) for c in _sends]
+    heapq.heapify(_queue)
+    _period = math.inf
+    while _queue:
+        _distance, state = heapq.heappop(_queue)
+        if state in _distances:
+            continue
+        _distances[state] = _distance
+        if _distance >= _period:
+            break
+        for c, _on in _edges.get(state, ()):
+            if c.condition not in _lows:
+                _lows[c.condition] = _guard_low(c.condition, _integer_clock)
+            _low = _lows[c.condition]
+            if _low is None:
+                continue
+            if _on == _key:
+                _period = min(_period, _distance + _low)
+            elif c.end_state not in _distances:
+                heapq.heappush(_queue, (_distance + _low if c.reset_x else _distance, c.end_state))
+    # with no second send the bound is finite and the period is not used
+    return 0 if _period == math.inf else _period
+
+# the latest clock value at which one of the receive guards is first enabled, None if a guard cannot be read
+def receive_opening(_guards, _integer_clock=False):
+    _opening = 0
+    for _guard in _guards:
+        _windows = guard_windows(_guard, _integer_clock)
+        if _windows is None:
+            return None
+        if _windows:
+            _opening = max(_opening, _windows[0].low)
+    return _opening
+
+# the earliest clock value the guard holds at, 0 when it cannot be read and None when it never holds
+def _guard_low(_condition, _integer_clock):
+    _windows = guard_windows(_condition, _integer_clock)
+    if _windows is None:
+        return 0
+    if not _windows:
+        return None
+    return max(_windows[0].low, 0)
+
+def _number(_value):
+    return str(int(_value)) if _value == int(_value) else repr(_value)
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+"""Compile cache
+
+Keeps the parsed automaton and its generated Go function on disk, so a recompile only parses and generates the
+automata whose notation changed.
+
+Each automaton's entry is keyed by a hash of its notation text (Automata.text), the generation options and the
+generator version. The version is a hash of the source of the modules that parse and generate, so any change to them
+leaves old entries unused. An entry holds the Automata, the channels it uses, its Go function, and the GuardReport of
+--compile-guards and MinimiseReport of --minimise, which are logged again on a hit. The channel declarations and main
+are cheap and always rebuilt, from the channels of the entries, as a channel's buffer size depends on both of its ends
+(see Channel_topology).
+Unlike iter_go_lang, which holds one function at a time, the entries of every automaton are held until the program is
+written, so a spec too large for memory is compiled with run.py --file.
+
+Entries are files in the cache directory. A hit touches the file, and when the directory grows past its size limit
+the least recently used entries are removed.
+MemoryCache keeps the entries in memory instead, for a process that compiles many times (see Compile_daemon).
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+from log import log, INFO
+from instrument import count
+import Golang_generator
+from Cta_Loader import split_automata, parse_single_automata
+from Guard_compiler import compile_automata_guards, log_guard_report
+from Automata_minimiser import minimise_single_automata, log_minimise_report
+from Channel_topology import automata_channel_uses, channel_topology
+
+_default_directory = '.cta_cache'
+_default_size = 64 * 1024 * 1024
+
+# the modules whose source decides the cached output
+_versioned_modules = ('Automata_Structures.py', 'Cta_Loader.py', 'Golang_generator.py', 'Guard_parser.py',
+                      'Guard_compiler.py', 'Automata_minimiser.py', 'Channel_topology.py', 'Compile_cache.py')
+_generator_version = None
+
+
+def generator_version():
+    global _generator_version
+    if _generator_version is None:
+        _hash = hashlib.sha256()
+        _directory = os.path.dirname(os.path.abspath(__file__))
+        for _module in _versioned_modules:
+            with open(os.path.join(_directory, _module), 'rb') as _source:
+                _hash.update(_source.read())
+        _generator_version = _hash.hexdigest()[:16]
+    return _generator_version
+
+
+def automata_key(_automata_text, _options):
+    _hash = hashlib.sha256()
+    _hash.update(generator_version().encode())
+    _hash.update(repr(_options).encode())
+    _hash.update(_automata_text.encode())
+    return _hash.hexdigest()
+
+
+class CompileCache:
+
+    def __init__(self, _directory=_default_directory, _max_bytes=_default_size):
+        self.directory = _directory
+        self.max_bytes = _max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(_directory, exist_ok=True)
+
+    def _path(self, _key):
+        return os.path.join(self.directory, _key + '.entry')
+
+    # returns the entry, or None if it is not cached or cannot be read
+    def get(self, _key):
+        _path = self._path(_key)
+        try:
+            with open(_path, 'rb') as _file:
+                _entry = pickle.load(_file)
+            os.utime(_path)
+        except (OSError, pickle.PickleError, EOFError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _entry
+
+    def put(self, _key, _entry):
+        # written to a temporary file first so a reader never sees half an entry
+        _descriptor, _temporary = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(_descriptor, 'wb') as _file:
+            pickle.dump(_entry, _file, pickle.HIGHEST_PROTOCOL)
+        os.replace(_temporary, self._path(_key))
+
+    # removes the least recently used entries until the cache fits in its size, a size of None never evicts
+    def evict(self):
+        if self.max_bytes is None:
+            return 0
+        _entries = []
+        _total = 0
+        for _name in os.listdir(self.directory):
+            if _name.endswith('.entry'):
+                try:
+                    _stat = os.stat(os.path.join(self.directory, _name))
+                except OSError:
+                    # removed by another process sharing the cache
+                    continue
+                _entries.append((_stat.st_mtime, _stat.st_size, _name))
+                _total += _stat.st_size
+        _entries.sort()
+        _removed = 0
+        while _total > self.max_bytes and _entries:
+            _time, _size, _name = _entries.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, _name))
+            except OSError:
+                pass
+            _total -= _size
+            _removed += 1
+        if _removed:
+            log(lambda: 'compile cache: evicted ' + str(_removed) + ' entries')
+        return _removed
+
+
+# the same as CompileCache, in memory and bounded by the number of entries
+# safe to share between threads
+class MemoryCache:
+
+    def __init__(self, _max_entries=4096):
+        self.max_entries = _max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, _key):
+        with self._lock:
+            _entry = self._entries.get(_key)
+            if _entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(_key)
+            self.hits += 1
+            return _entry
+
+    def put(self, _key, _entry):
+        with self._lock:
+            self._entries[_key] = _entry
+            self._entries.move_to_end(_key)
+
+    # removes the least recently used entries until there are at most max_entries
+    def evict(self):
+        _removed = 0
+        with self._lock:
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                _removed += 1
+        return _removed
+
+
+# loads and generates the notation like load_automata and iter_go_lang, reusing the cached automata
+# returns the list of automata and the list of pieces of the program
+# the missing functions are generated with _workers processes, see Golang_generator.go_functions
+def compile_notation(_automata_text, _timing='poll', _int_states=False, _compile_guards=False, _cache=None, _workers=1,
+                     _metrics=False, _minimise=False):
+    _entries = _compile_entries(_automata_text, _timing, _int_states, _compile_guards, _cache, _workers, _metrics,
+                                _minimise)
+    # channels in automata order, as the generator would pair them
+    _automata = [_entry['automata'] for _entry in _entries]
+    _channels = channel_topology((_entry['channels'] for _entry in _entries), [a.label for a in _automata],
+                                 _timing == 'poll')
+    _pieces = Golang_generator.go_head(_automata_text, _timing, _metrics)
+    _pieces.append(Golang_generator.go_main(_automata, _timing, _channels, _metrics))
+    _pieces.extend(_entry['function'] for _entry in _entries)
+    return _automata, _pieces
+
+# as compile_notation, returns the list of automata and the list of their functions, for Golang_generator.iter_go_files
+def compile_functions(_automata_text, _timing='poll', _int_states=False, _compile_guards=False, _cache=None, _workers=1,
+                      _metrics=False, _minimise=False):
+    _entries = _compile_entries(_automata_text, _timing, _int_states, _compile_guards, _cache, _workers, _metrics,
+                                _minimise)
+    return [_entry['automata'] for _entry in _entries], [_entry['function'] for _entry in _entries]
+
+# the cache entry of each automaton of the notation, the missing ones parsed and generated
+def _compile_entries(_automata_text, _timing, _int_states, _compile_guards, _cache, _workers, _metrics, _minimise):
+    Golang_generator.check_options(_timing, _metrics)
+    _options = (_timing, _int_states, _compile_guards, _metrics, _minimise)
+    log('compiling automata', 1, INFO)
+    _entries = []
+    _missing = []
+    for _text, _position in split_automata(''.join(_automata_text)):
+        _key = automata_key(_text, _options)
+        _entry = _cache.get(_key) if _cache is not None else None
+        if _entry is None:
+            _au = parse_single_automata(_text, _position)
+            _guard_report = _minimise_report = None
+            if _compile_guards:
+                # the poll timing counts whole seconds
+                _au, _guard_report = compile_automata_guards(_au, _timing == 'poll')
+            if _minimise:
+                _au, _minimise_report = minimise_single_automata(_au, _timing == 'poll')
+            _entry = {'automata': _au, 'channels': automata_channel_uses(_au, _timing == 'poll'), 'function': None,
+                      'guard_report': _guard_report, 'minimise_report': _minimise_report}
+            _missing.append((_key, _entry))
+        if _entry['guard_report'] is not None:
+            log_guard_report(_entry['guard_report'])
+        if _entry['minimise_report'] is not None:
+            log_minimise_report(_entry['minimise_report'])
+        _entries.append(_entry)
+
+    _functions = Golang_generator.go_functions([_entry['automata'] for _key, _entry in _missing], _timing, _int_states,
+                                               _workers, _metrics)
+    for (_key, _entry), _function in zip(_missing, _functions):
+        _entry['function'] = _function
+        if _cache is not None:
+            _cache.put(_key, _entry)
+    if _cache is not None:
+        _cache.evict()
+
+    count('automata from the cache', len(_entries) - len(_missing))
+    count('automata compiled', len(_missing))
+    log(lambda: str(len(_entries) - len(_missing)) + ' automata from the cache, ' + str(len(_missing))
+        + ' compiled', -1, INFO)
+    return _entries
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""Compile client
+
+A thin client for the compile daemon (see Compile_daemon), it takes the same command line as run.py:
+    python Compile_client.py [notation] [--timing event] [--int-states] [--go-benchmark] [--compile-guards] [--metrics]
+                             [--minimise]
+and writes the same golang_automata.go (and golang_automata_test.go), only the compile happens in the daemon where the
+automata are already parsed and generated.
+It only imports the standard library, so starting it costs little more than starting python.
+
+The daemon is found at --daemon or the CTA_DAEMON environment variable, a Unix socket path or host:port (a bare port
+is on 127.0.0.1), by default the socket cta_daemon.sock in the temporary directory.
+When no daemon answers, or the command line uses something only run.py does (the default examples, --file, --profile,
+...), run.py is run in this process instead, so the client can always stand in for it.
+
+The protocol is one JSON object per line each way. A request is
+    {"notation": [...], "timing": "poll", "int_states": false, "compile_guards": false, "metrics": false,
+     "go_benchmark": false, "minimise": false}
+or {"command": "stats"}, and the answer is {"go": ..., "benchmark": ..., "automata": n, "seconds": s} or
+{"error": "..."}.
+"""
+
+import argparse
+import json
+import os
+import runpy
+import socket
+import sys
+import tempfile
+
+_default_output = 'golang_automata.go'
+_default_benchmark_output = 'golang_automata_test.go'
+_default_address = os.path.join(tempfile.gettempdir(), 'cta_daemon.sock')
+
+
+def default_address():
+    return os.environ.get('CTA_DAEMON', _default_address)
+
+
+# a Unix socket path as a string, or (host, port)
+def parse_address(_address):
+    if _address.isdigit():
+        return '127.0.0.1', int(_address)
+    _host, _separator, _port = _address.rpartition(':')
+    if _separator and _port.isdigit() and os.sep not in _address:
+        return _host or '127.0.0.1', int(_port)
+    return _address
+
+
+def connect(_address, _timeout=None):
+    _address = parse_address(_address)
+    if isinstance(_address, str):
+        _socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        _socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    _socket.settimeout(_timeout)
+    try:
+        _socket.connect(_address)
+    except OSError:
+        _socket.close()
+        raise
+    return _socket
+
+
+# sends one request and returns the answer, raises OSError when the daemon cannot be reached
+def request(_address, _request, _timeout=None):
+    with connect(_address, _timeout) as _socket:
+        _socket.sendall(json.dumps(_request).encode() + b'\n')
+        _socket.shutdown(socket.SHUT_WR)
+        with _socket.makefile('rb') as _answer:
+            _line = _answer.readline()
+    if not _line:
+        raise ConnectionError('the daemon closed the connection without answering')
+    return json.loads(_line)
+
+
+def compile_request(_notation, _timing='poll', _int_states=False, _compile_guards=False, _metrics=False,
+                    _go_benchmark=False, _minimise=False):
+    return {'notation': list(_notation), 'timing': _timing, 'int_states': _int_states,
+            'compile_guards': _compile_guards, 'metrics': _metrics, 'go_benchmark': _go_benchmark,
+            'minimise': _minimise}
+
+
+# the options of run.py the daemon can do, anything else is left to run.py
+def _parser():
+    _parser = argparse.ArgumentParser(description='Generates Go from CTA notation in the compile daemon.',
+                                      add_help=False)
+    _parser.add_argument('notation', nargs='*')
+    _parser.add_argument('--daemon', default=None)
+    _parser.add_argument('--log-level', default='info')
+    _parser.add_argument('--timing', default='poll', choices=['poll', 'event'])
+    _parser.add_argument('--int-states', action='store_true')
+    _parser.add_argument('--go-benchmark', action='store_true')
+    _parser.add_argument('--metrics', action='store_true')
+    _parser.add_argument('--compile-guards', action='store_true')
+    _parser.add_argument('--minimise', action='store_true')
+    return _parser
+
+
+def run_locally(_argv):
+    _run = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'run.py')
+    sys.argv = [_run] + list(_argv)
+    sys.path.insert(0, os.path.dirname(_run))
+    runpy.run_path(_run, run_name='__main__')
+    return 0
+
+
+def main(_argv):
+    _arguments, _unknown = _parser().parse_known_args(_argv)
+    # --daemon is the client's own, run.py does not know it
+    _run_argv = [_arg for i, _arg in enumerate(_argv)
+                 if _arg != '--daemon' and not _arg.startswith('--daemon=') and (i == 0 or _argv[i - 1] != '--daemon')]
+    if _unknown or not _arguments.notation or '-h' in _argv or '--help' in _argv:
+        return run_locally(_run_argv)
+    # run.py checks these, so leave them to it to report
+    if (_arguments.metrics and _arguments.timing != 'event') or (_arguments.go_benchmark and not _arguments.int_states):
+        return run_locally(_run_argv)
+
+    _address = _arguments.daemon or default_address()
+    _request = compile_request(_arguments.notation, _arguments.timing, _arguments.int_states,
+                               _arguments.compile_guards, _arguments.metrics, _arguments.go_benchmark,
+                               _arguments.minimise)
+    try:
+        _answer = request(_address, _request)
+    except OSError as _exception:
+        if _arguments.log_level != 'off':
+            print('no compile daemon at ' + _address + ' (' + str(_exception) + '), running run.py')
+        _answer = None
+    if _answer is None:
+        return run_locally(_run_argv)
+    if 'error' in _answer:
+        print(_answer['error'], file=sys.stderr)
+        return 1
+
+    with open(_default_output, 'w') as _file:
+        _file.write(_answer['go'])
+    if _answer.get('benchmark') is not None:
+        with open(_default_benchmark_output, 'w') as _file:
+            _file.write(_answer['benchmark'])
+    if _arguments.log_level not in ('warning', 'error', 'off'):
+        print('file is written @ /' + _default_output + ' (' + str(len(_answer['go'])) + ' characters, '
+              + str(_answer['automata']) + ' automata compiled by the daemon in '
+              + format(_answer['seconds'], '.3f') + 's)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+"""Compile daemon
+
+Keeps the compiler running, so a compile does not pay for starting python, importing the modules or parsing and
+generating automata it has seen before. It listens on a Unix socket or a local TCP port and answers each request
+with the Go program (see Compile_client for the protocol and a client that stands in for run.py).
+
+The automata are compiled with Compile_cache.compile_notation against a MemoryCache, the parsed automaton, its
+channels and its Go function are kept per automaton and the least recently used are dropped past --cache-entries.
+Requests are handled concurrently: each connection is served by asyncio and the compiles run in a pool of threads,
+so a large compile does not hold up the answers that come straight from the cache.
+
+Usage: python Compile_daemon.py [--daemon ADDRESS] [--threads N] [--cache-entries N] [--log-level warning]
+ADDRESS is a Unix socket path or host:port (a bare port is on 127.0.0.1), by default as for Compile_client.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from log import configure_log, log, INFO
+from Golang_generator import generate_go_benchmark
+from Compile_cache import MemoryCache, compile_notation
+from Compile_client import default_address, parse_address, request
+
+# the longest request line, the notation of a whole system is sent on one line
+_line_limit = 1 << 28
+_default_entries = 4096
+
+
+# compiles one compile request, or answers a command, errors are returned in the answer rather than raised
+def handle_request(_request, _cache, _statistics=None):
+    if _request.get('command') == 'stats':
+        _answer = dict(_statistics or {})
+        _answer.update({'entries': len(_cache), 'hits': _cache.hits, 'misses': _cache.misses})
+        return _answer
+    _start = time.perf_counter()
+    try:
+        _notation = _request.get('notation')
+        if not _notation or not isinstance(_notation, list):
+            raise ValueError('the request has no notation')
+        _timing = _request.get('timing', 'poll')
+        _int_states = bool(_request.get('int_states', False))
+        _automata, _pieces = compile_notation(_notation, _timing, _int_states,
+                                              bool(_request.get('compile_guards', False)), _cache, 1,
+                                              bool(_request.get('metrics', False)),
+                                              bool(_request.get('minimise', False)))
+        _benchmark = None
+        if _request.get('go_benchmark'):
+            if not _int_states:
+                raise ValueError('go_benchmark needs int_states')
+            _benchmark = generate_go_benchmark(_automata, _timing)
+    except Exception as _exception:
+        return {'error': type(_exception).__name__ + ': ' + str(_exception)}
+    return {'go': ''.join(_pieces), 'benchmark': _benchmark, 'automata': len(_automata),
+            'seconds': time.perf_counter() - _start}
+
+
+async def _serve_connection(_reader, _writer, _cache, _executor, _statistics):
+    _loop = asyncio.get_running_loop()
+    try:
+        while True:
+            try:
+                _line = await _reader.readline()
+            except ValueError:
+                _writer.write(json.dumps({'error': 'ValueError: request longer than ' + str(_line_limit)
+                                          + ' bytes'}).encode() + b'\n')
+                break
+            if not _line:
+                break
+            _statistics['requests'] += 1
+            try:
+                _request = json.loads(_line)
+                if not isinstance(_request, dict):
+                    raise ValueError('the request is not a JSON object')
+            except ValueError as _exception:
+                _answer = {'error': 'ValueError: ' + str(_exception)}
+            else:
+                _answer = await _loop.run_in_executor(_executor, handle_request, _request, _cache, _statistics)
+            _writer.write(json.dumps(_answer).encode() + b'\n')
+            await _writer.drain()
+    except ConnectionError:
+        # the client went away, there is no one to answer
+        pass
+    finally:
+        _writer.close()
+
+
+# serves until stopped by SIGINT or SIGTERM
+async def serve(_address, _cache, _threads=None):
+    _statistics = {'requests': 0, 'started': time.time()}
+    _executor = ThreadPoolExecutor(_threads)
+
+    def _handler(_reader, _writer):
+        return _serve_connection(_reader, _writer, _cache, _executor, _statistics)
+
+    _parsed = parse_address(_address)
+    if isinstance(_parsed, str):
+        _remove_stale_socket(_parsed)
+        _server = await asyncio.start_unix_server(_handler, _parsed, limit=_line_limit)
+    else:
+        _server = await asyncio.start_server(_handler, _parsed[0], _parsed[1], limit=_line_limit)
+    _stop = asyncio.Event()
+    _loop = asyncio.get_running_loop()
+    for _signal in (signal.SIGINT, signal.SIGTERM):
+        try:
+            _loop.add_signal_handler(_signal, _stop.set)
+        except (NotImplementedError, RuntimeError):
+            # not on windows, where ctrl-c still ends the process
+            pass
+    log('compile daemon listening on ' + _address, 0, INFO)
+    try:
+        async with _server:
+            await _stop.wait()
+    finally:
+        _executor.shutdown(wait=False)
+        if isinstance(_parsed, str):
+            try:
+                os.remove(_parsed)
+            except OSError:
+                pass
+    log('compile daemon stopped after ' + str(_statistics['requests']) + ' requests', 0, INFO)
+
+
+# a socket file left by a daemon that did not stop cleanly is removed, one still answering is not
+def _remove_stale_socket(_path):
+    if not os.path.exists(_path):
+        return
+    try:
+        request(_path, {'command': 'stats'}, 1)
+    except (OSError, ValueError):
+        os.remove(_path)
+        return
+    raise OSError('a compile daemon is already listening on ' + _path)
+
+
+def main(_argv=None):
+    _parser = argparse.ArgumentParser(description='Serves compiles of CTA notation to Go, see Compile_client.')
+    _parser.add_argument('--daemon', default=None, help='Unix socket path or host:port to listen on')
+    _parser.add_argument('--threads', type=int, default=0, help='compiles run at once, 0 for the default')
+    _parser.add_argument('--cache-entries', type=int, default=_default_entries,
+                         help='automata kept parsed and generated in memory')
+    _parser.add_argument('--log-level', default='info', help='debug, info, warning, error or off')
+    _arguments = _parser.parse_args(_argv)
+    if _arguments.threads < 0:
+        _parser.error('--threads cannot be negative')
+    if _arguments.cache_entries < 1:
+        _parser.error('--cache-entries must be at least 1')
+    configure_log(_arguments.log_level)
+    _cache = MemoryCache(_arguments.cache_entries)
+    try:
+        asyncio.run(serve(_arguments.daemon or default_address(), _cache, _arguments.threads or None))
+    except OSError as _exception:
+        print('cannot start the compile daemon: ' + str(_exception), file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,171 +3,356 @@
 """CTA Loader
 
 Given a list of automata notations, loads them in the data structures defined in Automata_Structures.
+load_automata gives Automata namedtuples, load_compact_automata gives the interned CompactAutomata for large networks.
+iter_automata_file reads a spec file in chunks and yields each Automata as soon as its notation is complete, so only
+one automaton's notation is held at a time however large the file is.
+
+The notation is read in a single pass. A tokenizer walks the string by offset (no substrings are cut off the input
+apart from the token values themselves) and a small recursive descent parser consumes the tokens following the grammar:
+
+    spec        := automaton*
+    automaton   := 'Cta' label '=' 'Init' state ';' transition*
+    transition  := state [other] ('!' | '?') [content] '(' condition [',{x}'] ')' state ';'
+                 | state '(' condition [',{x}'] ')' state ';'
+
+Any input that does not follow the grammar raises a CtaSyntaxError with the line and column of the offending token.
 TODO:keep track of multiple outward transitions
 """
 
-from log import log
+import re
+
+from collections import namedtuple
+
+from log import log, INFO
+from instrument import phase_start, phase_end, count
 from Automata_Structures import *
 
-_automata_list = []
+Token = namedtuple('Token', ['kind', 'value', 'offset'])
+# kind: 'word', 'condition' or the symbol itself ('=', ';', '!', '?')
+# value: text of the token, for a condition this is the text between the brackets
+# offset: index of the first character of the token in the notation
 
-# loads a string automata (multiple)
-def load_automata(_automata_string):
-    log('loading automata', 1)
-    # iterate through string to look for 'Init '
-    log('find automata indexes', 1)
-    log(_automata_string)
-    _automata_indexes = []
-    i = 0
-    while i + 4 < len(_automata_string):
-        _init_scan = _automata_string[i:i+4]
-        # if its indicator
-        if _init_scan == 'Cta ':
-            # _automata_label = _automata_string[i+7:]
-            _automata_indexes.append(i)
-            log(' ' * i + '^:' + str(i))
-        i += 1
-    log(str(len(_automata_indexes)) + ' automata found', -1)
-
-    # parse each automata
-    log('parse each automata', 1)
-    # _automata_list = []
-    _index = 0
-    while _index < len(_automata_indexes):
-        # for each automata
-        _automata_index         = _automata_indexes[_index]
-
-        # separate automata from string
-        if _index == len(_automata_indexes)-1:
-            _current_automata       = _automata_string[_automata_index:]
+# how much of a spec file is read at a time
+_chunk_size = 1 << 20
+
+# the condition is kept as raw text as it is pasted verbatim into the generated code
+_token_pattern = re.compile(r'(?P<space>\s+)'
+                            r'|(?P<word>[^\s=;!?()]+)'
+                            r'|(?P<symbol>[=;!?])'
+                            r'|\((?P<condition>[^()]*)\)')
+
+_reset_x_marker = ',{x}'
+
+# brackets, and 'Cta' on its own as a word, in the file these are all the streaming loader needs to find automata
+_automata_start_pattern = re.compile(r'[()]|(?<![^\s=;!?()])Cta(?![^\s=;!?()])')
+
+
+class CtaSyntaxError(SyntaxError):
+
+    # the message already gives the line and column, SyntaxError would add them again
+    def __str__(self):
+        return self.msg
+
+
+# builds the error for the given offset, line and column are only worked out when something is wrong
+# _position is the line and column _string starts at, when it is a piece of a larger spec
+def syntax_error(_string, _offset, _message, _position=(1, 1)):
+    _line_start = _string.rfind('\n', 0, _offset) + 1
+    _line_end = _string.find('\n', _offset)
+    if _line_end == -1:
+        _line_end = len(_string)
+    _line = _string.count('\n', 0, _offset) + _position[0]
+    _column = _offset - _line_start + (_position[1] if _line_start == 0 else 1)
+    return CtaSyntaxError(_message + ' (line ' + str(_line) + ', column ' + str(_column) + ')',
+                          ('<cta>', _line, _column, _string[_line_start:_line_end]))
+
+
+# yields the tokens of the notation, followed by a single 'end' token
+def tokenize_cta(_string, _position=(1, 1)):
+    _offset = 0
+    _length = len(_string)
+    _match = _token_pattern.match
+    while _offset < _length:
+        _found = _match(_string, _offset)
+        if _found is None:
+            if _string[_offset] == '(':
+                raise syntax_error(_string, _offset, 'unterminated condition', _position)
+            raise syntax_error(_string, _offset, 'unexpected character ' + repr(_string[_offset]), _position)
+        _kind = _found.lastgroup
+        if _kind == 'symbol':
+            yield Token(_found.group(), _found.group(), _offset)
+        elif _kind != 'space':
+            yield Token(_kind, _found.group(_kind), _offset)
+        _offset = _found.end()
+    yield Token('end', '', _length)
+
+
+class CtaParser:
+
+    def __init__(self, _string, _position=(1, 1)):
+        self._string = _string
+        self._position = _position
+        self._tokens = tokenize_cta(_string, _position)
+        self._token = next(self._tokens)
+
+    def _advance(self):
+        _token = self._token
+        self._token = next(self._tokens)
+        return _token
+
+    def _expect(self, _kind, _description):
+        if self._token.kind != _kind:
+            raise self._error('expected ' + _description)
+        return self._advance()
+
+    def _expect_keyword(self, _keyword):
+        if self._token.kind != 'word' or self._token.value != _keyword:
+            raise self._error("expected '" + _keyword + "'")
+        return self._advance()
+
+    def _error(self, _message):
+        if self._token.kind == 'end':
+            _found = 'end of input'
         else:
-            _current_automata       = _automata_string[_automata_index:_automata_indexes[_index+1]]
-
-        _end_clause             = seek_seq(_current_automata,'=')
-        _automata_label         = _current_automata[4:_end_clause-1]
-        _end_clause             = seek_seq(_current_automata,';')
-        _initial_state          = _current_automata[13:_end_clause]
-        _state_list             = []
-        _transition_dictionary  = {}
-        # move along index
-        _automata_index = _end_clause
-
-        # find all transitions in this automata
-        log('for all transitions in automata' + str(_index+1), 1)
-        _start_clause           = _end_clause+1
-        _transition_index       = _end_clause + seek_seq(_current_automata[_end_clause+1:],';')+1
-        while _transition_index < len(_current_automata):
-            _current_transition = _current_automata[_start_clause:_transition_index+1]
-            log('current transition: ' + _current_transition, 1)
-            # log(str(_transition_index) + ' < ' + str(len(_current_automata)))
-
-            # transition consists of:
-            # - start state
-            # - send/recieve
-            # - condition
-            # - end state
-            # check these are present
-            if '!' or '?' not in _current_transition:
-                log('Fault in: ' + _current_transition)
-                log('Does not include send/receive of data.')
-            if '(' and ')' not in _current_transition:
-                log('Fault in ' + _current_automata)
-                log('Make sure to include a condition in ().')
-
-            _start_clause = seek_seq(_current_transition, ' ')
-            _current_transition_start_state = _current_transition[:_start_clause]
-            _start_clause += 1
-            log("start state: " + _current_transition_start_state)
-
-            _current_transition_communication_content = _current_transition[_start_clause:seek_seq(_current_transition, '(')]
-            if '?' in _current_transition_communication_content:
-                _current_transition_communication_type = 'receive'
-            else:
-                _current_transition_communication_type = 'send'
-            log("communication type: " + _current_transition_communication_type)
+            _found = repr(self._token.value)
+        return syntax_error(self._string, self._token.offset, _message + ', found ' + _found, self._position)
 
-            # patch communication content and split
-            if _current_transition_communication_type == 'receive':
-                _current_transition_communication_other = _current_transition_communication_content[:seek_seq(_current_transition_communication_content,'?')]
-            else:
-                _current_transition_communication_other = _current_transition_communication_content[:seek_seq(_current_transition_communication_content,'!')]
-            _current_transition_communication_content = _current_transition_communication_content[(len(_current_transition_communication_other)+1):]
-
-            _start_clause = seek_seq(_current_transition, '(')+1
-            log("communication content: " + _current_transition_communication_content)
-            log("communication other: " + _current_transition_communication_other)
-
-            _current_transition_condition = _current_transition[_start_clause:seek_seq(_current_transition, ')')]
-            _start_clause = seek_seq(_current_transition, ')')+2
-            # check if there is a reset x
-            if ',{x}' in _current_transition_condition:
-                _current_transition_reset_x = True
-                _current_transition_condition = _current_transition_condition[:-4]
-            else:
-                _current_transition_reset_x = False
-            log("condition: " + _current_transition_condition)
-
-            _current_transition_end_state = _current_transition[_start_clause:seek_seq(_current_transition, ';')]
-            log('end state: ' + _current_transition_end_state)
-
-            # build data tuple
-            # namedtuple('Transition', ['start_state', 'communication_type', 'communication_content', 'communication_other','condition', 'reset_x', 'end_state'])
-            _current_transition = Transition(_current_transition_start_state,
-                                             _current_transition_communication_type + _current_transition_communication_content + _current_transition_communication_other,
-                                             (_current_transition_communication_type,
-                                                 _current_transition_communication_content,
-                                                 _current_transition_communication_other),
-                                             _current_transition_condition,
-                                             _current_transition_reset_x,
-                                             _current_transition_end_state)
-            # add state to list
-            if _current_transition_start_state not in _state_list:
-                log('added new state to list')
-                _state_list.append(_current_transition_start_state)
-            # make sure end state is added to state list
-            if _current_transition_end_state not in _state_list:
-                log('added new state to list')
-                _state_list.append(_current_transition_end_state)
-            # update dictionary
-            if _current_transition_start_state not in _transition_dictionary.keys():
-                log('adding ' + str(_current_transition_start_state) + ' to dictionary')
-                _transition_dictionary[_current_transition_start_state] = [_current_transition]
-            else:
-                log('already exists ' + str(_current_transition_start_state) + ' in transition dictionary') #  + str(_transition_dictionary[_current_transition_start_state])
-                _transition_dictionary[_current_transition_start_state].append(_current_transition)
-            log('new ' + str(_current_transition_start_state) + ' transition dictionary: ' + str(_transition_dictionary[_current_transition_start_state]))
+    def _at_automaton(self):
+        return self._token.kind == 'word' and self._token.value == 'Cta'
+
+    # yields each automaton once its last transition has been parsed
+    def parse(self):
+        while self._token.kind != 'end':
+            yield self.parse_automaton()
 
+    # as parse, but yields CompactAutomata sharing one table of channel/message names
+    def parse_compact(self, _symbols=None):
+        _symbols = InternTable() if _symbols is None else _symbols
+        while self._token.kind != 'end':
+            yield self.parse_compact_automaton(_symbols)
 
-            _start_clause       = _transition_index+1
-            _transition_index   += seek_seq(_current_automata[_transition_index+1:],';')+1
-            log('', -1)
-            # time.sleep(1)
-        log('finished transitions in automata ' + str(_index), -1)
+    def parse_automaton(self):
+        _timer = phase_start()
+        _start, _automata_label, _initial_state = self.parse_header()
+
+        _state_list = []
+        _known_states = set()
+        _transition_dictionary = {}
+        for _transition in self.iter_transitions():
+            # make sure both states are in the state list
+            for _state in (_transition.start_state, _transition.end_state):
+                if _state not in _known_states:
+                    _known_states.add(_state)
+                    _state_list.append(_state)
+            # update dictionary
+            if _transition.start_state in _transition_dictionary:
+                _transition_dictionary[_transition.start_state].append(_transition)
+            else:
+                _transition_dictionary[_transition.start_state] = [_transition]
 
         _end_state = ''
         for _state in _state_list:
             if _state not in _transition_dictionary:
-                log(str(_state) + 'must be end state, no outward transitions')
                 _end_state = _state
 
-        _au = Automata(_automata_label, _initial_state, _end_state, _state_list, _transition_dictionary, _current_automata)
-        _automata_list.append(_au)
+        if _timer is not None:
+            count('automata parsed')
+            count('transitions parsed', sum(map(len, _transition_dictionary.values())))
+            phase_end('parse', _timer, _automata_label)
+        return Automata(_automata_label, _initial_state, _end_state, _state_list, _transition_dictionary,
+                        self.text_from(_start))
+
+    def parse_compact_automaton(self, _symbols=None):
+        _timer = phase_start()
+        _start, _automata_label, _initial_state = self.parse_header()
+        _compact = CompactAutomata.from_transitions(_automata_label, _initial_state, self.iter_transitions(), '',
+                                                    _symbols)
+        _compact.text = self.text_from(_start)
+        if _timer is not None:
+            count('automata parsed')
+            count('transitions parsed', _compact.transition_count())
+            phase_end('parse', _timer, _automata_label)
+        return _compact
+
+    # Cta label = Init state;
+    # returns the offset the automaton starts at, its label and initial state
+    def parse_header(self):
+        _start = self._expect_keyword('Cta').offset
+        _automata_label = self._expect('word', 'automata label').value
+        self._expect('=', "'='")
+        self._expect_keyword('Init')
+        _initial_state = self._expect('word', 'initial state').value
+        self._expect(';', "';'")
+        return _start, _automata_label, _initial_state
+
+    # yields transitions up to the next automaton or the end of the notation
+    def iter_transitions(self):
+        while self._token.kind != 'end' and not self._at_automaton():
+            yield self.parse_transition()
+
+    # the text runs up to the next automaton, or the end of the notation
+    def text_from(self, _start):
+        return self._string[_start:self._token.offset]
+
+    def parse_transition(self):
+        _start_state = self._expect('word', 'start state').value
 
-        log('finished creating automata:')
-        log(str(_au))
-        _index += 1
+        # communication is optional, other and content may each be left out
+        _communication_type = 'send'
+        _communication_content = ''
+        _communication_other = ''
+        if self._token.kind == 'word':
+            _communication_other = self._advance().value
+            if self._token.kind not in ('!', '?'):
+                raise self._error("expected '!' or '?'")
+        if self._token.kind in ('!', '?'):
+            if self._advance().kind == '?':
+                _communication_type = 'receive'
+            if self._token.kind == 'word':
+                _communication_content = self._advance().value
 
-    log('finished parsing', -1)
-    log('finished loading all ' + str(len(_automata_indexes)) + ' automata', -1)
+        _condition = self._expect('condition', 'condition in ()').value
+        # check if there is a reset x
+        _reset_x = _condition.endswith(_reset_x_marker)
+        if _reset_x:
+            _condition = _condition[:-len(_reset_x_marker)]
+
+        _end_state = self._expect('word', 'end state').value
+        self._expect(';', "';'")
+
+        return Transition(_start_state,
+                          _communication_type + _communication_content + _communication_other,
+                          (_communication_type, _communication_content, _communication_other),
+                          _condition,
+                          _reset_x,
+                          _end_state)
+
+
+# loads a string automata (multiple)
+def load_automata(_automata_string):
+    log('loading automata', 1, INFO)
+    _automata_list = []
+    for _au in CtaParser(_automata_string).parse():
+        _automata_list.append(_au)
+        log(lambda: 'finished creating automata: ' + str(_au.label))
+    log(lambda: 'finished loading all ' + str(len(_automata_list)) + ' automata', -1, INFO)
 
     return _automata_list
 
-# finds the first instance of character
-def seek_seq(_string, _seq):
-    # log('seeking end: ' + _string)
-    index = 0
-    while index < len(_string) and _string[index:index+len(_seq)] != _seq:
-        # log(' stuck | ' + str(index) + ' | ' + _string[index:] + ' | ' + _string)
-        index += 1
-    # log('found: |' + _string[index:index+1] + '|')
-    return index
\ No newline at end of file
+
+# loads a string automata (multiple) into the compact form, sharing one table of channel/message names
+def load_compact_automata(_automata_string, _symbols=None):
+    log('loading compact automata', 1, INFO)
+    _compact_list = []
+    for _au in CtaParser(_automata_string).parse_compact(_symbols):
+        _compact_list.append(_au)
+        log(lambda: 'finished creating automata: ' + repr(_au))
+    log(lambda: 'finished loading all ' + str(len(_compact_list)) + ' automata', -1, INFO)
+
+    return _compact_list
+
+
+# splits the notation into the text of each automaton with the line and column it starts at, like iter_automata_text
+# each runs from its 'Cta' to the next one, only the tokenizer runs so nothing is parsed
+# only whitespace may come before the first automaton, anything else is reported as the parser would
+def split_automata(_automata_string):
+    _starts = [_token.offset for _token in tokenize_cta(_automata_string)
+               if _token.kind == 'word' and _token.value == 'Cta']
+    _starts.append(len(_automata_string))
+    if _automata_string[:_starts[0]].strip():
+        list(CtaParser(_automata_string[:_starts[0]]).parse())
+    _position = _advance_position((1, 1), _automata_string[:_starts[0]])
+    _pieces = []
+    for i in range(len(_starts) - 1):
+        _text = _automata_string[_starts[i]:_starts[i + 1]]
+        _pieces.append((_text, _position))
+        _position = _advance_position(_position, _text)
+    return _pieces
+
+
+# parses the notation of exactly one automaton, _position is where it starts in its spec
+# with _symbols it is a CompactAutomata, its channel/message names interned in that table
+def parse_single_automata(_automata_text, _position=(1, 1), _symbols=None):
+    _parser = CtaParser(_automata_text, _position)
+    _au = _parser.parse_automaton() if _symbols is None else _parser.parse_compact_automaton(_symbols)
+    if _parser._token.kind != 'end':
+        raise _parser._error('expected end of automaton')
+    return _au
+
+
+# yields the automata of a spec file one at a time, each as soon as the file has been read past its notation
+# _file is a path or a file opened for reading text, with _compact the automata are CompactAutomata
+def iter_automata_file(_file, _chunk_size=_chunk_size, _compact=False):
+    if isinstance(_file, str):
+        with open(_file) as _spec:
+            yield from iter_automata_file(_spec, _chunk_size, _compact)
+        return
+    _symbols = InternTable() if _compact else None
+    log(lambda: 'streaming automata from ' + str(getattr(_file, 'name', _file)), 1, INFO)
+    _count = 0
+    for _text, _position in iter_automata_text(_file, _chunk_size):
+        _au = parse_single_automata(_text, _position, _symbols)
+        log(lambda: 'finished creating automata: ' + str(_au.label))
+        _count += 1
+        yield _au
+    log(lambda: 'finished loading all ' + str(_count) + ' automata', -1, INFO)
+
+
+# yields the notation of each automaton in the file with the line and column it starts at, like split_automata
+# the file is read _chunk_size characters at a time and only the notation of the automaton being read is kept
+def iter_automata_text(_file, _chunk_size=_chunk_size):
+    _buffer = ''
+    # start of the automaton being read in the buffer, None before the first one
+    _start = None
+    # line and column of _start, or of the start of the buffer before the first automaton
+    _position = (1, 1)
+    # the buffer up to _scanned has been searched, and whether that ends inside a condition
+    _scanned = 0
+    _in_condition = False
+    while True:
+        _chunk = _file.read(_chunk_size)
+        _buffer += _chunk
+        # the last characters may be the start of a word that goes on in the next chunk, they are searched again then
+        _limit = max(len(_buffer) - len('Cta'), _scanned) if _chunk else len(_buffer)
+        _starts = []
+        for _found in _automata_start_pattern.finditer(_buffer, _scanned):
+            if _found.start() >= _limit:
+                break
+            _kind = _found.group()
+            if _kind == '(':
+                _in_condition = True
+            elif _kind == ')':
+                _in_condition = False
+            elif not _in_condition:
+                _starts.append(_found.start())
+        _scanned = _limit
+
+        for _next in _starts:
+            if _start is None:
+                # only whitespace may come before the first automaton, anything else is reported as the parser would
+                if _buffer[:_next].strip():
+                    list(CtaParser(_buffer[:_next], _position).parse())
+            else:
+                yield _buffer[_start:_next], _position
+            _position = _advance_position(_position, _buffer[0 if _start is None else _start:_next])
+            _start = _next
+        if not _chunk:
+            break
+        # drop the text of the automata already given
+        if _start:
+            _buffer = _buffer[_start:]
+            _scanned -= _start
+            _start = 0
+
+    if _start is not None:
+        yield _buffer[_start:], _position
+    elif _buffer.strip():
+        list(CtaParser(_buffer, _position).parse())
+
+
+# the line and column reached after reading _text from _position
+def _advance_position(_position, _text):
+    _lines = _text.count('\n')
+    if _lines == 0:
+        return _position[0], _position[1] + len(_text)
+    return _position[0] + _lines, len(_text) - _text.rfind('\n')
@@ -3,13 +3,166 @@
 """File writer
 
 Takes a list of strings and writes them to a file.
-TODO:let the user define the file name to output them to
+The strings can come from a generator (see Golang_generator.iter_go_lang), each one is written as soon as it is produced
+so the whole program never has to be held in memory.
+The output can be a file name or any file-like object with a write method.
+
+write_go_files writes a program split into files (see Golang_generator.iter_go_files) into a directory, and only
+writes a file when its content changed, so its modification time is kept and the Go build cache and other tools see it
+as unchanged. The sha256 of each file it wrote, with the file's size and modification time, is kept in a manifest
+(.cta_files.json) in the directory. A file whose size and time still match its entry is compared by hash alone,
+otherwise its content is read and compared. Files in the manifest that the program no longer has are removed, other
+files in the directory are never touched.
 """
 
-from log import log
+import hashlib
+import json
+import os
+
+from log import log, INFO
+from instrument import instrument_enabled, phase_start, phase_end, count
+
+_default_output = 'golang_automata.go'
+_manifest_name = '.cta_files.json'
+_go_version = '1.19'
+# write buffer, pieces are gathered until this many characters before reaching the file
+_buffer_size = 1 << 16
+
+def write_golang(_lines, _output=_default_output):
+    if isinstance(_output, str):
+        _timer = phase_start()
+        _finished_golang = open(_output, 'w', buffering=_buffer_size)
+        phase_end('write', _timer)
+        with _finished_golang:
+            _written = write_lines(_lines, _finished_golang)
+            # what is left in the buffer goes to the file on closing
+            _timer = phase_start()
+        phase_end('write', _timer)
+        if instrument_enabled():
+            count('bytes written', os.path.getsize(_output))
+        log(lambda: 'file is written @ /' + _output + ' (' + str(_written) + ' characters)', 0, INFO)
+    else:
+        _written = write_lines(_lines, _output)
+        log(lambda: 'golang is written to ' + str(getattr(_output, 'name', _output)) + ' (' + str(_written) + ' characters)', 0, INFO)
+    return _written
+
+# writes each piece as it comes, returns the number of characters written
+def write_lines(_lines, _sink):
+    _written = 0
+    _write = _sink.write
+    if instrument_enabled():
+        return _timed_write_lines(_lines, _write)
+    for _line in _lines:
+        _write(_line)
+        _written += len(_line)
+    return _written
+
+# as write_lines, only the writing is timed as the pieces may be generated as they are asked for
+def _timed_write_lines(_lines, _write):
+    _written = 0
+    for _line in _lines:
+        _timer = phase_start()
+        _write(_line)
+        phase_end('write', _timer)
+        _written += len(_line)
+    count('characters written', _written)
+    return _written
+
+# writes the (path, text) pairs into the directory, paths are relative and use /
+# a file is only written when its text changed, returns (files written, files unchanged, files removed)
+def write_go_files(_files, _directory):
+    os.makedirs(_directory, exist_ok=True)
+    _previous = _read_manifest(_directory)
+    _manifest = {}
+    _written = 0
+    _unchanged = 0
+    for _path, _text in _files:
+        _timer = phase_start()
+        _data = _text.encode()
+        _hash = hashlib.sha256(_data).hexdigest()
+        _full_path = os.path.join(_directory, *_path.split('/'))
+        if _same_file(_full_path, _data, _hash, _previous.get(_path)):
+            _unchanged += 1
+        else:
+            os.makedirs(os.path.dirname(_full_path), exist_ok=True)
+            # written to a temporary file first so a build never sees half a file
+            _temporary = _full_path + '.tmp'
+            with open(_temporary, 'wb') as _file:
+                _file.write(_data)
+            os.replace(_temporary, _full_path)
+            _written += 1
+            count('bytes written', len(_data))
+        _stat = os.stat(_full_path)
+        _manifest[_path] = [_hash, _stat.st_size, _stat.st_mtime_ns]
+        phase_end('write', _timer)
+
+    # files of an earlier program that this one does not have
+    _removed = 0
+    for _path in _previous:
+        if _path not in _manifest:
+            _full_path = os.path.join(_directory, *_path.split('/'))
+            try:
+                os.remove(_full_path)
+                _removed += 1
+            except OSError:
+                continue
+            try:
+                # the package directory goes with its last file
+                os.removedirs(os.path.dirname(_full_path))
+            except OSError:
+                pass
+    _write_manifest(_directory, _manifest)
+    count('files written', _written)
+    count('files unchanged', _unchanged)
+    log(lambda: 'files are written @ /' + _directory + ' (' + str(_written) + ' written, ' + str(_unchanged)
+        + ' unchanged, ' + str(_removed) + ' removed)', 0, INFO)
+    return _written, _unchanged, _removed
+
+# whether the file already holds _data, by the manifest entry (hash, size, modification time) when the file still
+# matches it, otherwise by reading it
+def _same_file(_full_path, _data, _hash, _entry):
+    try:
+        _stat = os.stat(_full_path)
+    except OSError:
+        return False
+    if _stat.st_size != len(_data):
+        return False
+    if _entry is not None and _entry[1] == _stat.st_size and _entry[2] == _stat.st_mtime_ns:
+        return _entry[0] == _hash
+    try:
+        with open(_full_path, 'rb') as _file:
+            return _file.read() == _data
+    except OSError:
+        return False
+
+def _read_manifest(_directory):
+    try:
+        with open(os.path.join(_directory, _manifest_name)) as _file:
+            _manifest = json.load(_file)
+    except (OSError, ValueError):
+        return {}
+    return _manifest if isinstance(_manifest, dict) else {}
+
+def _write_manifest(_directory, _manifest):
+    _path = os.path.join(_directory, _manifest_name)
+    with open(_path + '.tmp', 'w') as _file:
+        json.dump(_manifest, _file, indent=0, sort_keys=True)
+    os.replace(_path + '.tmp', _path)
 
-def write_golang(_lines):
-    _finished_golang = open('golang_automata.go', 'w+')
-    _finished_golang.writelines(_lines)
-    _finished_golang.close()
-    log('file is written @ /golang_automata.go')
\ No newline at end of file
+# the go module of the directory and the go.mod to write, for functions split over packages
+# a go.mod that was not written here is kept and its module used, the text is then None
+# otherwise the module is _default, or the one already in the go.mod written before
+def go_module(_directory, _default):
+    _module = None
+    try:
+        with open(os.path.join(_directory, 'go.mod')) as _file:
+            for _line in _file:
+                if _line.startswith('module '):
+                    _module = _line.split()[1].strip('"')
+                    break
+    except OSError:
+        pass
+    if _module is not None and 'go.mod' not in _read_manifest(_directory):
+        return _module, None
+    _module = _module or _default
+    return _module, 'module ' + _module + '\n\ngo ' + _go_version + '\n'
@@ -19,182 +19,1083 @@ TODO: add multiple end states
 3. Once an outward transition is possible, it goes about executing the transition. Any data/communications occur and the current state is updated for the next iteration. If there are multiple outward transitions, I check if they are all true. I do this incase there is any ambiguity and to avoid any bias to the generation of the transitions. If all are possible, I randomally choose which one to transition to.
 
 4. This all keeps happening until the end state is reached, when it terminates.
+
+Timing:
+The above is the 'poll' timing, each goroutine keeps looping and reads a global x_ that main counts up once a second.
+With the 'event' timing the guards are read as windows on the clock (see Guard_parser) and each state works out the next
+clock value at which one of its windows opens or closes. The goroutine then blocks in a select on the channels of the
+enabled transitions and a timer for that instant, so it only wakes when something can happen. The clock is the time
+since the last reset from Go's monotonic clock, in units of time_unit, so it is not limited to whole seconds.
+Go picks at random between the ready cases of a select, which keeps the random choice between enabled transitions.
+Guards that cannot be read as a window are pasted in as they are and the state is looked at again every poll_interval.
+The timer for a window x == v fires just after v, never at it, so such a window is held until v + _point_width.
+
+Integer states:
+With int states each automaton's states become integer constants (<label>_<n>, n the state's place in the state
+list, with its name in a comment) so the switches and the end state check compare ints rather than strings. Numbers
+keep the constants apart where names would not, q-1 and q_1 both become q_1 in Go. The guards of every state go
+into one function per automaton, enabled_<label>, which writes the indexes of the enabled transitions into a buffer
+the automaton allocates once, sized for its largest number of outgoing transitions (<label>_max_out).
+generate_go_benchmark gives a go test -bench file timing these functions, which is the work done on every step. It
+needs the program to build, which the event timing does.
+
+Channels:
+A send and the receive it is paired with use one channel, named after the sender, the receiver and the content (see
+Channel_topology). Nothing is kept between automata or between runs. automata_channel_uses lists the channels one
+automaton uses and the function of an automaton only depends on the automaton itself, so the functions can be generated
+in any order or in separate processes (go_functions). channel_topology then pairs the uses of every automaton, in the
+order of the automata, and sizes each buffer, and main is made from its channels, so the program is the same however
+the functions were generated.
+
+Split output:
+iter_go_files gives the program as files for a directory instead of one file: f_<label>_cta.go with the function of
+each automaton (and its notation), cta_helpers.go, cta_channels.go and cta_main.go. The file of an automaton only
+depends on the automaton, so File_writer.write_go_files leaves it alone when the automaton did not change. Go builds and
+caches a package as a whole, so with the event timing the functions can also be spread over packages automata_<n>,
+by a hash of the label, with the helpers and channels in a package cta that the others import with a dot. A change to
+an automaton then only rebuilds its package, and the packages are built in parallel. The names the packages share
+(the helpers, the channels and the f_ functions) are exported, with the first letter in upper case.
 """
 
-from log import log
+import json
+import math
+import os
+import re
+import zlib
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from log import log, INFO
+from instrument import phase_start, phase_end, count
 from Automata_Structures import *
+from Guard_parser import parse_guard_windows, windows_to_go, widen_points
+from Guard_compiler import guard_windows, enabled_table, table_boundaries
+from Channel_topology import automata_channel_uses, channel_topology, channel_name, channel_type, is_internal
 
-# keep track of which channels go where and which type
-# dictionary of automata returns list where it is used, some redundant data but is easier
-_channel_dictionary = {}
-_channel_directory = []
+_timings = ('poll', 'event')
 
 # returns a list of lines
-def generate_go_lang(_automata,_automata_text):
-    log('start golang gen', 1)
-    # head of go file
-    _file_head = 'package main\n\nimport (\n\t"time"\n\t"math/rand"\n)\n\n'
-    # log('file head:\n' + _file_head)
-    # head annotation
-    _head_annotation = '/* for the automata:\n\t' + '\n\t'.join(_automata_text) + '\n*/\n\nx_ := 0\n\n'
-    # log('head annotation:\n' + _head_annotation)
+def generate_go_lang(_automata,_automata_text,_timing='poll',_int_states=False,_workers=1,_metrics=False):
+    return list(iter_go_lang(_automata, _automata_text, _timing, _int_states, _workers, _metrics))
+
+# yields the program a piece at a time: file head, annotation, main, then one function per automaton
+# only one automaton's function is held as text at any point
+# each function only depends on its own automaton, with more than one worker they are generated in a process pool
+# and still come out in the order of the automata, so the program is the same for any number of workers
+def iter_go_lang(_automata,_automata_text,_timing='poll',_int_states=False,_workers=1,_metrics=False):
+    check_options(_timing, _metrics)
+    log('start golang gen' + (' (event timing)' if _timing == 'event' else ''), 1, INFO)
+    yield from go_head(_automata_text, _timing, _metrics)
+
+    # main comes before the functions but needs their channels, so collect them first
+    _channels = automata_topology(_automata, _timing)
+    _main_function = go_main(_automata, _timing, _channels, _metrics)
+    log(lambda: 'generated main:\n' + _main_function)
+    yield _main_function
 
-    _functions = []
     # generate each function
+    for a, _current_automata_string in zip(_automata, go_functions(_automata, _timing, _int_states, _workers,
+                                                                   _metrics)):
+        log(lambda: 'finished automata ' + str(a.label) + ':\n' + _current_automata_string)
+        yield _current_automata_string
+
+    log('finished golang gen', -1, INFO)
+
+# raises a ValueError for options that do not go together
+def check_options(_timing='poll', _metrics=False):
+    if _timing not in _timings:
+        raise ValueError('unknown timing: ' + str(_timing) + ' (choose from ' + ', '.join(_timings) + ')')
+    if _metrics and _timing != 'event':
+        raise ValueError('the metrics need the event timing')
+
+# the pieces of the program that come before main
+def go_head(_automata_text, _timing='poll', _metrics=False):
+    _timer = phase_start()
+    _head = list(iter_go_head(['\n\t'.join(_automata_text)], _timing, _metrics))
+    phase_end('head', _timer)
+    return _head
+
+# as go_head, with the notation in the annotation given as pieces that are written one after the other
+def iter_go_head(_notation_pieces, _timing='poll', _metrics=False):
+    if _timing == 'event':
+        yield _event_metrics_file_head if _metrics else _event_file_head
+    else:
+        # head of go file
+        yield 'package main\n\nimport (\n\t"time"\n\t"math/rand"\n)\n\n'
+    # head annotation
+    yield '/* for the automata:\n\t'
+    yield from _notation_pieces
+    if _timing == 'event':
+        yield '\n*/\n\n'
+        yield _event_helpers
+        if _metrics:
+            yield _metrics_helpers
+    else:
+        yield '\n*/\n\nx_ := 0\n\n'
+
+# as iter_go_lang for automata read as a stream, e.g. Cta_Loader.iter_automata_file, without holding them all
+# main comes first but needs every channel, so the automata are read twice: _read_automata() is called once for the
+# annotation, channels and main, and again for the functions, and must give the same automata both times
+# only the labels of the automata and their channels are kept between the two
+def iter_go_lang_stream(_read_automata,_timing='poll',_int_states=False,_metrics=False):
+    check_options(_timing, _metrics)
+    log('start golang gen' + (' (event timing)' if _timing == 'event' else ''), 1, INFO)
+    _uses = []
+    _labels = []
+
+    def _notation_pieces():
+        for a in _read_automata():
+            _uses.append(automata_channel_uses(a, _timing == 'poll'))
+            # main only needs the label
+            _labels.append(Automata(a.label, a.initial_state, a.end_state, [], {}, ''))
+            yield a.text
+
+    yield from iter_go_head(_notation_pieces(), _timing, _metrics)
+    _channels = channel_topology(_uses, [a.label for a in _labels], _timing == 'poll')
+    _main_function = go_main(_labels, _timing, _channels, _metrics)
+    log(lambda: 'generated main:\n' + _main_function)
+    yield _main_function
+
+    for a in _read_automata():
+        _current_automata_string = go_function(a, _timing, _int_states, _metrics)
+        log(lambda: 'finished automata ' + str(a.label) + ':\n' + _current_automata_string)
+        yield _current_automata_string
+
+    log('finished golang gen', -1, INFO)
+
+# the program as files, as (path, text) pairs: one for the function of each automaton, then the helpers, the channels
+# and main, see Split output
+# _pairs gives each automaton with its function, e.g. zip(_automata, go_functions(_automata)), and is gone through once:
+# the file of each function is given as it comes and only the labels and channel uses are kept for the files after
+# with _packages the functions are spread over that many packages of the go module _module
+def iter_go_files(_pairs, _timing='poll', _metrics=False, _packages=0, _module=None):
+    check_split_options(_timing, _metrics, _packages, _module)
+    log('start golang gen (split' + (' into ' + str(_packages) + ' packages' if _packages else '') + ')', 1, INFO)
+    _shared = _module + '/' + _shared_package if _packages else None
+    _labels = []
+    _uses = []
+    _package_of = {}
+    for a, _function in _pairs:
+        _uses.append(automata_channel_uses(a, _timing == 'poll'))
+        # main only needs the label
+        _labels.append(Automata(a.label, a.initial_state, a.end_state, [], {}, ''))
+        _body = '/* for the automaton:\n\t' + a.text.strip() + '\n*/\n\n' + _function
+        if _packages:
+            _package = function_package(a.label, _packages)
+            _package_of[a.label] = _package
+            yield _package + '/' + function_file(a.label), go_file(_package, export_names(_body), [_shared])
+        else:
+            yield function_file(a.label), go_file('main', _body)
+
+    _timer = phase_start()
+    if _timing == 'event':
+        _helpers = _event_helpers + (_metrics_helpers if _metrics else '')
+    else:
+        _helpers = 'x_ := 0\n\n'
+    phase_end('head', _timer)
+    _channels = channel_topology(_uses, [a.label for a in _labels], _timing == 'poll')
+    _timer = phase_start()
+    _declarations = generate_channels(_channels)
+    if _timing == 'event':
+        _main_function = generate_event_main_function(_labels, _metrics)
+    else:
+        _main_function = generate_main(_labels, _channels, False)
+    phase_end('main', _timer)
+    if _packages:
+        yield _shared_package + '/cta_helpers.go', go_file(_shared_package, export_names(_helpers))
+        yield _shared_package + '/cta_channels.go', go_file(_shared_package, export_names(_declarations))
+        # main calls each function in its package
+        _main_function = _go_call_pattern.sub(lambda m: 'go ' + _package_of[m.group(1)] + '.F_' + m.group(1) + '()',
+                                              export_names(_main_function))
+        yield 'cta_main.go', go_file('main', _main_function,
+                                     [_shared] + [_module + '/' + _package for _package in sorted(set(_package_of.values()))])
+    else:
+        yield 'cta_helpers.go', go_file('main', _helpers)
+        yield 'cta_channels.go', go_file('main', _declarations)
+        yield 'cta_main.go', go_file('main', _main_function)
+    log('finished golang gen', -1, INFO)
+
+# raises a ValueError for split options that do not go together
+def check_split_options(_timing='poll', _metrics=False, _packages=0, _module=None):
+    check_options(_timing, _metrics)
+    if _packages < 0:
+        raise ValueError('the number of packages cannot be negative')
+    if _packages and _timing != 'event':
+        raise ValueError('packages need the event timing')
+    if _packages and _metrics:
+        # the metrics table of each automaton is built from fields only its own package can see
+        raise ValueError('packages do not go with the metrics')
+    if _packages and not _module:
+        raise ValueError('packages need the go module path')
+
+# the package an automaton's function goes in, from a hash of its label so it stays put when others come and go
+def function_package(_label, _packages):
+    return 'automata_' + str(zlib.crc32(str(_label).encode()) % _packages)
+
+# the file of an automaton's function, the _cta ending keeps go from reading the end of a label as a build constraint
+# (f_linux.go) or a test (f_test.go)
+def function_file(_label):
+    return 'f_' + go_identifier(str(_label)) + '_cta.go'
+
+# a go source file of the package with the imports its code uses, _imports are imported with . as well
+def go_file(_package, _code, _imports=()):
+    _standard = go_imports(_code)
+    _file = ['package ' + _package + '\n\n']
+    if _standard or _imports:
+        _file.append('import (\n')
+        _file.extend('\t"' + _path + '"\n' for _path in _standard)
+        if _standard and _imports:
+            _file.append('\n')
+        for _import in _imports:
+            # only the shared package is imported with ., the packages of functions are called by name
+            _file.append('\t' + ('. ' if _import.endswith('/' + _shared_package) else '') + '"' + _import + '"\n')
+        _file.append(')\n\n')
+    _file.append(_code)
+    return ''.join(_file)
+
+# the standard packages the code uses, by import path in order
+def go_imports(_code):
+    _code = _go_literal_pattern.sub('', _code)
+    return sorted(_path for _name, _path in _go_packages if re.search(r'(?<![\w.])' + _name + r'\.', _code))
+
+# the shared names of the helpers, channels and functions made exported, so other packages can use them
+# comments and strings are left as they are
+def export_names(_code):
+    return _export_pattern.sub(lambda m: m.group(1) or m.group(2)[0].upper() + m.group(2)[1:], _code)
+
+# main, from the channels of every automaton (see automata_topology)
+def go_main(_automata, _timing='poll', _channels=None, _metrics=False):
+    _timer = phase_start()
+    if _timing == 'event':
+        _main_function = generate_event_main(_automata, _channels, _metrics)
+    else:
+        _main_function = generate_main(_automata, _channels)
+    phase_end('main', _timer)
+    return _main_function
+
+# the function of one automaton
+def go_function(a, _timing='poll', _int_states=False, _metrics=False):
+    _timer = phase_start()
+    if _timing == 'event':
+        _function = generate_event_function(a, _int_states, _metrics)
+    else:
+        _function = generate_function(a, _int_states)
+    phase_end('generate', _timer, a.label)
+    return _function
+
+# the function of each automaton, in order
+# _workers above 1 spreads them over that many processes, 0 or None uses every core
+def go_functions(_automata, _timing='poll', _int_states=False, _workers=1, _metrics=False):
+    _automata = list(_automata)
+    if _workers is None or _workers == 0:
+        _workers = os.cpu_count() or 1
+    _workers = min(_workers, len(_automata))
+    if _workers <= 1:
+        for a in _automata:
+            yield go_function(a, _timing, _int_states, _metrics)
+        return
+    # several automata per task so small automata are not swamped by the cost of sending them
+    _chunk_size = max(1, len(_automata) // (_workers * 4))
+    with ProcessPoolExecutor(_workers) as _pool:
+        _functions = _pool.map(_go_function_task, _automata, repeat(_timing, len(_automata)),
+                               repeat(_int_states, len(_automata)), repeat(_metrics, len(_automata)),
+                               chunksize=_chunk_size)
+        _timer = phase_start()
+        for a, _function in zip(_automata, _functions):
+            # the generating is done in the workers, this is how long each function was waited for
+            phase_end('generate', _timer, a.label)
+            yield _function
+            _timer = phase_start()
+
+# go_function for the process pool, which needs a module level function
+def _go_function_task(a, _timing, _int_states, _metrics):
+    return go_function(a, _timing, _int_states, _metrics)
+
+# returns the go function for one automaton
+# with int states, its state constants and enabled_ function come first
+def generate_function(a, _int_states=False):
+    # set up initial state
+    _initial_state = a.initial_state
+    _end_state = a.end_state
+
+    #_current_automata_string = 'func f_' + str(a.label) + '() {\n\tcurrent_state = ' + _initial_state + '\n\trepeat {\n\t\tswitch current_state {\n'
+    # below has the x lock
+    # the pieces are joined once at the end rather than added onto one growing string
+    _name = go_identifier(str(a.label))
+    _constants = state_constants(a) if _int_states else None
+    if _int_states:
+        _checks = [(state, [poll_check(c.condition) for c in _state_transitions],
+                    _state_table([guard_windows(c.condition, True) for c in _state_transitions]))
+                   for state, _state_transitions in iter_state_transitions(a)]
+        _current_automata_string = [generate_state_constants(a, _constants),
+                                    generate_enabled_function(a, _checks, 'int', _constants),
+                                    'func f_' + _name + '() {\n\tcurrent_state := ' + _constants[_initial_state]
+                                    + '\n\tx := x_\n\tvar enabled [' + _name + '_max_out]int\n\n\trepeat {\n'
+                                    + '\t'*2 + 'x = x_\n' + '\t'*2 + 'enabled_count := enabled_' + _name
+                                    + '(current_state, x, &enabled)\n' + '\t'*2 + 'switch current_state {\n']
+    else:
+        _current_automata_string = ['func f_' + _name + '() {\n\tcurrent_state := "' + _initial_state + '"\n\t'*1 \
+                                    + 'x := x_\n\n\trepeat {\n' + '\t'*2 + 'x = x_\n' + '\t'*2 + 'switch current_state {\n']
+
+    # for each state with transitions, the one without is the end state
+    for state, _state_transitions in iter_state_transitions(a):
+        if _int_states:
+            # the enabled transitions are already in the buffer
+            _current_automata_string.append('\t'*3 + 'case ' + _constants[state] + ':\n'
+                                            + '\t'*4 + '// randomally picks a valid outwards trasition\n'
+                                            + '\t'*4 + 'switch enabled[rand.Intn(enabled_count)] {\n')
+            _current_automata_string.extend(_poll_cases(a, _state_transitions, _constants))
+            _current_automata_string.append('\t'*4 + '}\n')
+            continue
+        _current_automata_string.append('\t'*3 + 'case "' + state + '":\n')
+
+        # loop through all possibilities.
+        # if more than once is possible, choose randomally
+        # switch case the result
+        _current_automata_string.append('\t'*4 + '// outgoing transitions: ' + str(len(_state_transitions)) + '\n'
+                                        + '\t'*4 + 'outward_transition_indexes := []\n\n')
+        _transition_index_counter = 0
+        for c in _state_transitions:
+            _current_automata_string.append('\t'*4 + '// outgoing index: ' + str(_transition_index_counter) + '\n'
+                                            + '\t'*4 + 'if ' + poll_check(c.condition) + ' {\n' + '\t'*5
+                                            + 'append(outward_transition_indexes, ' + str(_transition_index_counter)
+                                            + ')\n' + '\t'*4 + '}\n\n')
+            _transition_index_counter += 1
+
+        # generate random number for however many is in the outwards transition list
+        _current_automata_string.append('\t'*4 + '// randomally picks a valid outwards trasition\n' + '\t'*4
+                                        + 'switch outgoing_transition_indexes[rand.Intn(len(outwrd_transition_indexes))] {\n')
+
+        # loop through and provide a case for each possible transition
+        _current_automata_string.extend(_poll_cases(a, _state_transitions, None))
+
+        _current_automata_string.append('\t'*4 + '}\n')
+
+        # # check if there is a branch
+        # if len(_state_transitions) > 1:
+        #     # create super if
+        #     _large_condition = ''
+        #     for c in _state_transitions:
+        #         log('current transition: ' + str(c))
+        #         _large_condition += c.condition + ' && '
+        #     _large_condition = _large_condition[:-4]
+        #     # super if
+        #     _current_automata_string += '\t'*4 + '// just in case all outward transitions are possible\n' \
+        #                                 + '\t'*4 + 'if ' + _large_condition + ' {\n'
+        #     # for each possible transition, choose randomally
+        #     # int ignores 0
+        #     _random_switch = '\t'*5 + '// randomally decides, if all are possible\n' + '\t'*5 \
+        #                      + 'switch rand.Intn(' + str(len(_state_transitions) - 1) + ') {\n'
+        #     for i in range(0, len(_state_transitions)):
+        #         _current_transition = _state_transitions[i]
+        #         _random_switch += '\t'*6 + 'case ' + str(i) + ':\n' + '\t'*6 \
+        #                           + str(channel_communication(a.label,_current_transition)) + '\n' + '\t'*6 \
+        #                           + 'current_state = "' + _current_transition.end_state + '"\n'
+        #         # check for x  reset
+        #         if _current_transition.reset_x:
+        #             _random_switch += '\t'*6 + 'x = 0\n'
+        #     # finish off
+        #     _current_automata_string += _random_switch + '\t'*5 + '}\n'
+        #     _current_automata_string += '\t'*4 + '}'
+        #     # go through each transition
+        #     for transition in _state_transitions:
+        #         _current_automata_string += ' else if ' + transition.condition + ' {\n' + '\t'*4 \
+        #                                     + str(channel_communication(a.label,transition)) +'\n' + '\t'*6 \
+        #                                     + 'current_state = "' + transition.end_state + '"\n'
+        #         # check if x reset
+        #         if transition.reset_x:
+        #             _current_automata_string += '\t'*5 + 'x = 0\n'
+        #         _current_automata_string += '\t'*4 + '}'
+        #     _current_automata_string += '\n'
+        # else:
+        #     # just one possibility
+        #     _transition = _state_transitions[0]
+        #     _current_automata_string += '\t'*4 + 'if ' + _transition.condition + ' {\n' + '\t'*5 \
+        #                                 + str(channel_communication(a.label,_transition)) +'\n' + '\t'*5 \
+        #                                 + 'current_state = "' + _transition.end_state + '"\n'
+        #     # check if x reset
+        #     if _transition.reset_x:
+        #         _current_automata_string += '\t'*5 + 'x = 0\n'
+        #
+        #     _current_automata_string += '\t'*4 + '}\n'
+
+    # add end of method
+    if _int_states:
+        _current_automata_string.append('\t'*2 + '}\n\t} until current_state = ' + _constants[_end_state] + '\n}\n\n')
+    else:
+        _current_automata_string.append('\t'*2 + '}\n\t} until current_state = "' + _end_state + '"\n}\n\n')
+
+    return ''.join(_current_automata_string)
+
+# the check of a guard on the whole second clock of the poll timing
+# a window with two ends as compile_guards writes it, 3 <= x && x <= 9, becomes the single unsigned comparison
+# uint(x-3) <= 6 (see Guard_parser.window_to_go), other guards are pasted as they are
+def poll_check(_condition):
+    if ' <= x && x <= ' not in _condition:
+        return _condition
+    _windows = guard_windows(_condition, True)
+    if _windows is None or windows_to_go(_windows) != _condition:
+        return _condition
+    return windows_to_go(_windows, _integer=True)
+
+# the cases of the random switch, one for each outgoing transition
+# _constants are those of state_constants with int states, otherwise None
+def _poll_cases(a, _state_transitions, _constants):
+    _transition_index_counter = 0
+    for c in _state_transitions:
+        if _constants is not None:
+            _end_state = _constants[c.end_state]
+        else:
+            _end_state = '"' + c.end_state + '"'
+        yield ('\t'*5 + 'case ' + str(_transition_index_counter) + ':\n' + '\t'*6
+               + str(channel_communication(a.label, c)) + '\n' + '\t'*6
+               + 'current_state = ' + _end_state + '\n')
+        # check for x  reset
+        if c.reset_x:
+            yield '\t'*6 + 'x = 0\n'
+        _transition_index_counter += 1
+
+# a go identifier for any label, a label that is one is kept as it is
+# otherwise the characters go does not allow become _ and a hash of the label is added, so A-1 and A_1 stay apart
+def go_identifier(_label):
+    if not _identifier_pattern.search(_label):
+        return _label
+    return _identifier_pattern.sub('_', _label) + '_' + format(zlib.crc32(_label.encode()), '08x')
+
+# the names of the integer constants of the states, by state, '' for the end state of an automaton without one
+# a name ends in the state's place in the state list after the last _, so no two states of any automata share one
+def state_constants(a):
+    _name = go_identifier(str(a.label))
+    _constants = {state: _name + '_' + str(i) for i, state in enumerate(a.state_list)}
+    if a.end_state == '':
+        _constants[''] = _name + '_no_end'
+    return _constants
+
+# the most outgoing transitions of any one state
+def max_out_degree(a):
+    if isinstance(a, CompactAutomata):
+        return a.max_out_degree()
+    return max([len(_state_transitions) for _state_transitions in a.transition_dictionary.values()] or [0])
+
+# one dense integer constant per state, in state list order, and the size of the enabled buffer
+# _constants are from state_constants
+def generate_state_constants(a, _constants):
+    _declarations = ['// states of ' + str(a.label) + '\nconst (\n']
+    _first = True
+    for state in a.state_list:
+        _declarations.append('\t' + _constants[state] + (' = iota' if _first else '') + '\t// ' + state + '\n')
+        _first = False
+    if a.end_state == '':
+        # without an end state the automaton never stops
+        _declarations.append('\t' + _constants[''] + (' = iota\n' if _first else '\n'))
+    _declarations.append(')\n\n// most outgoing transitions of any state of ' + str(a.label) + '\nconst '
+                         + go_identifier(str(a.label)) + '_max_out = ' + str(max_out_degree(a)) + '\n\n')
+    return ''.join(_declarations)
+
+# the function that writes the indexes of the enabled transitions of the current state into the buffer
+# _checks is a list of (state, list of go conditions for its transitions, enabled table or None)
+# with a table the segment the clock is in is found, and its enabled transitions written straight out
+# _constants are from state_constants
+def generate_enabled_function(a, _checks, _clock_type, _constants):
+    _name = go_identifier(str(a.label))
+    _function = ['// writes the enabled outgoing transitions of the current state of ' + str(a.label)
+                 + ' to enabled, returns how many\nfunc enabled_' + _name + '(current_state int, x ' + _clock_type
+                 + ', enabled *[' + _name + '_max_out]int) int {\n\tenabled_count := 0\n\tswitch current_state {\n']
+    for state, _conditions, _table in _checks:
+        _function.append('\tcase ' + _constants[state] + ':\n')
+        if _table is not None:
+            _function.append(_table_switch(_table))
+            continue
+        _transition_index_counter = 0
+        for _condition in _conditions:
+            _add = '\t'*3 + 'enabled[enabled_count] = ' + str(_transition_index_counter) + '\n' + '\t'*3 + 'enabled_count++\n'
+            if _condition == 'true':
+                _function.append(_add.replace('\t'*3, '\t'*2))
+            elif _condition != 'false':
+                _function.append('\t'*2 + 'if ' + _condition + ' {\n' + _add + '\t'*2 + '}\n')
+            _transition_index_counter += 1
+    _function.append('\t}\n\treturn enabled_count\n}\n\n')
+    return ''.join(_function)
+
+# the enabled table of a state, None if any of its guards cannot be read as windows
+def _state_table(_state_windows):
+    if None in _state_windows:
+        return None
+    return enabled_table(_state_windows)
+
+# a switch over the segments of an enabled table, the last segment is the default
+def _table_switch(_table):
+    _switch = ['\t'*2 + 'switch {\n']
+    for _segment in _table:
+        if _segment.high == math.inf:
+            if not _segment.enabled:
+                break
+            _switch.append('\t'*2 + 'default:\n')
+        else:
+            _switch.append('\t'*2 + 'case x ' + ('<= ' if _segment.high_closed else '< ') + _go_number(_segment.high) + ':\n')
+        for _position, _index in enumerate(_segment.enabled):
+            _switch.append('\t'*3 + 'enabled[' + str(_position) + '] = ' + str(_index) + '\n')
+        if _segment.enabled:
+            _switch.append('\t'*3 + 'return ' + str(len(_segment.enabled)) + '\n')
+    _switch.append('\t'*2 + '}\n')
+    return ''.join(_switch)
+
+# a go test -bench file for the enabled_ functions, to be written next to the program
+# each benchmark steps through every state of an automaton over a spread of clock values
+def generate_go_benchmark(_automata, _timing='poll'):
+    _clock_type = 'float64' if _timing == 'event' else 'int'
+    _benchmark = ['package main\n\nimport "testing"\n\n// keeps the results alive so the calls are not optimised away\nvar benchmark_sink int\n\n']
     for a in _automata:
-        log('current automata: ' + str(a), 1)
-
-        # set up initial state
-        _initial_state = a.initial_state
-        _end_state = a.end_state
-
-        # helpers
-        state_list = a.state_list
-        _transition_dictionary = a.transition_dictionary
-
-        #_current_automata_string = 'func f_' + str(a.label) + '() {\n\tcurrent_state = ' + _initial_state + '\n\trepeat {\n\t\tswitch current_state {\n'
-        # below has the x lock
-        _current_automata_string = 'func f_' + str(a.label) + '() {\n\tcurrent_state := "' + _initial_state + '"\n\t'*1 \
-                                   + 'x := x_\n\n\trepeat {\n' + '\t'*2 + 'x = x_\n' + '\t'*2 + 'switch current_state {\n'
-
-        # for each state
-        for state in state_list:
-            # if state has no transitions, that is end state
-            if state in _transition_dictionary:
-                # current state vars
-                _state_transitions = _transition_dictionary[state]
-                _current_automata_string += '\t'*3 + 'case "' + state + '":\n'
-
-                # loop through all possibilities.
-                # if more than once is possible, choose randomally
-                # switch case the result
-
-                # _outward_transition = '\t'*4 + 'outward_transitions = ' + str(len(_state_transitions)) + '\n' + '\t'*4 \
-                #                       + 'for t := 0; t < ' + str(len(_state_transitions)) + '; t++ {\n'
-                # _outward_transition += '\t'*5 + 'if '
-                #
-                # _outward_transition += '\t'*4 + '}'
-                _outward_transition = '\t'*4 + '// outgoing transitions: ' + str(len(_state_transitions)) + '\n' \
-                                      + '\t'*4 + 'outward_transition_indexes := []\n\n'
-                _transition_index_counter = 0
-                for c in _state_transitions:
-                    _outward_transition += '\t'*4 + '// outgoing index: ' + str(_transition_index_counter) + '\n' \
-                                            + '\t'*4 + 'if ' + c.condition + ' {\n' + '\t'*5 \
-                                            + 'append(outward_transition_indexes, ' + str(_transition_index_counter)\
-                                            + ')\n' + '\t'*4 + '}\n\n'
-                    _transition_index_counter += 1
-
-                # generate random number for however many is in the outwards transition list
-                _outward_transition += '\t'*4 + '// randomally picks a valid outwards trasition\n' + '\t'*4 \
-                                       + 'switch outgoing_transition_indexes[rand.Intn(len(outwrd_transition_indexes))] {\n'
-
-                # loop through and provide a case for each possible transition
-                _transition_index_counter = 0
-                for c in _state_transitions:
-                    _outward_transition += '\t'*5 + 'case ' + str(_transition_index_counter) + ':\n' + '\t'*6 \
-                                           + str(channel_communication(a.label, c)) + '\n' + '\t'*6 \
-                                           + 'current_state = "' + c.end_state + '"\n'
-                    # check for x  reset
-                    if c.reset_x:
-                        _outward_transition += '\t'*6 + 'x = 0\n'
-                    _transition_index_counter += 1
-
-                _current_automata_string += _outward_transition + '\t'*4 + '}\n'
-
-                # # check if there is a branch
-                # if len(_state_transitions) > 1:
-                #     # create super if
-                #     _large_condition = ''
-                #     for c in _state_transitions:
-                #         log('current transition: ' + str(c))
-                #         _large_condition += c.condition + ' && '
-                #     _large_condition = _large_condition[:-4]
-                #     # super if
-                #     _current_automata_string += '\t'*4 + '// just in case all outward transitions are possible\n' \
-                #                                 + '\t'*4 + 'if ' + _large_condition + ' {\n'
-                #     # for each possible transition, choose randomally
-                #     # int ignores 0
-                #     _random_switch = '\t'*5 + '// randomally decides, if all are possible\n' + '\t'*5 \
-                #                      + 'switch rand.Intn(' + str(len(_state_transitions) - 1) + ') {\n'
-                #     for i in range(0, len(_state_transitions)):
-                #         _current_transition = _state_transitions[i]
-                #         _random_switch += '\t'*6 + 'case ' + str(i) + ':\n' + '\t'*6 \
-                #                           + str(channel_communication(a.label,_current_transition)) + '\n' + '\t'*6 \
-                #                           + 'current_state = "' + _current_transition.end_state + '"\n'
-                #         # check for x  reset
-                #         if _current_transition.reset_x:
-                #             _random_switch += '\t'*6 + 'x = 0\n'
-                #     # finish off
-                #     _current_automata_string += _random_switch + '\t'*5 + '}\n'
-                #     _current_automata_string += '\t'*4 + '}'
-                #     # go through each transition
-                #     for transition in _state_transitions:
-                #         _current_automata_string += ' else if ' + transition.condition + ' {\n' + '\t'*4 \
-                #                                     + str(channel_communication(a.label,transition)) +'\n' + '\t'*6 \
-                #                                     + 'current_state = "' + transition.end_state + '"\n'
-                #         # check if x reset
-                #         if transition.reset_x:
-                #             _current_automata_string += '\t'*5 + 'x = 0\n'
-                #         _current_automata_string += '\t'*4 + '}'
-                #     _current_automata_string += '\n'
-                # else:
-                #     # just one possibility
-                #     _transition = _state_transitions[0]
-                #     _current_automata_string += '\t'*4 + 'if ' + _transition.condition + ' {\n' + '\t'*5 \
-                #                                 + str(channel_communication(a.label,_transition)) +'\n' + '\t'*5 \
-                #                                 + 'current_state = "' + _transition.end_state + '"\n'
-                #     # check if x reset
-                #     if _transition.reset_x:
-                #         _current_automata_string += '\t'*5 + 'x = 0\n'
-                #
-                #     _current_automata_string += '\t'*4 + '}\n'
-
-        # add end of method
-        _current_automata_string += '\t'*2 + '}\n\t} until current_state = "' + _end_state + '"\n}\n\n'
-
-        _functions += _current_automata_string
-        log('finished automata', -1)
-        # log('finished automata:\n' + _current_automata_string, -1)
+        _label = str(a.label)
+        _name = go_identifier(_label)
+        _constants = state_constants(a)
+        _states = []
+        # clock values up to just past the last boundary of any guard
+        _span = 2
+        for state, _state_transitions in iter_state_transitions(a):
+            _states.append(_constants[state])
+            for c in _state_transitions:
+                _windows = parse_guard_windows(c.condition)
+                if _windows is not None:
+                    for _point in table_boundaries(enabled_table([_windows])):
+                        _span = max(_span, int(_point) + 2)
+        _benchmark.append('// per step cost of ' + _label + '\nfunc Benchmark_enabled_' + _name
+                          + '(b *testing.B) {\n\tvar enabled [' + _name + '_max_out]int\n\tstates := [...]int{'
+                          + ', '.join(_states) + '}\n\tcount := 0\n')
+        if _states:
+            _benchmark.append('\tfor i := 0; i < b.N; i++ {\n\t\tcount += enabled_' + _name + '(states[i%len(states)], '
+                              + _clock_type + '(i%' + str(_span) + '), &enabled)\n\t}\n')
+        _benchmark.append('\tbenchmark_sink = count\n}\n\n')
+    return ''.join(_benchmark)
+
+# the channels of the automata as a dictionary of channel name to Channel, see Channel_topology
+# the poll timing counts whole seconds
+def automata_topology(_automata, _timing='poll'):
+    return channel_topology((automata_channel_uses(a, _timing == 'poll') for a in _automata),
+                            [a.label for a in _automata], _timing == 'poll')
 
+# returns main, which sets up the channels and goroutines and keeps time
+# _channels is from automata_topology, worked out from the automata when not given
+# without _declare_channels they are left out, for channels declared at package level (see generate_channels)
+def generate_main(_automata, _channels=None, _declare_channels=True):
     log('creating main function', 1)
+    if _channels is None and _declare_channels:
+        _channels = automata_topology(_automata)
     # main declaration
-    _main_function = 'func main() {\n\n\t// initialises random gen with seed\n\trand.Seed(time.now().UnixNano())\n\n\t// channels\n'
+    _main_function = ['func main() {\n\n\t// initialises random gen with seed\n\trand.Seed(time.now().UnixNano())\n']
+    if _declare_channels:
+        count('channels created', len(_channels))
+        _main_function.append('\n\t// channels\n')
+    else:
+        _channels = {}
 
     # create channels
-    for _chan in _channel_directory:
-        _current_channel_details = _channel_dictionary[_chan]
-        _channel_create_line = str(_chan) + ' := make(chan ' + str(_current_channel_details[1]) + ', 2) \t// buffer of 2 by default'
-        _main_function += '\t' + _channel_create_line + '\n'
+    for _chan, _channel in _channels.items():
+        _channel_create_line = (str(_chan) + ' := make(chan ' + _channel.type + ', ' + str(_channel.capacity) + ') \t// '
+                                + _channel.reason)
+        _main_function.append('\t' + _channel_create_line + '\n')
 
-        # log('current chan: ' + str(_chan) + ' : ' + str(_current_channel_details))
-        log('channel line: ' + str(_channel_create_line))
+        # log('current chan: ' + str(_chan) + ' : ' + str(_channel))
+        log(lambda: 'channel line: ' + str(_channel_create_line))
 
-    _main_function += '\n\t// goroutine declaration\n'
+    _main_function.append('\n\t// goroutine declaration\n')
     # declare goroutines
     for a in _automata:
-        _create_goroutine_line = 'go f_' + str(a.label) + '()'
-        _main_function += '\t' + _create_goroutine_line + '\n'
+        _create_goroutine_line = 'go f_' + go_identifier(str(a.label)) + '()'
+        _main_function.append('\t' + _create_goroutine_line + '\n')
 
     # MAY NOT BE APPROPRIATE
     # add x
-    _main_function += '\n\tfor {\n' + '\t'*2 + 'time.Sleep(time.second)\n' + '\t'*2 + 'x_++\n\t}\n'
+    _main_function.append('\n\tfor {\n' + '\t'*2 + 'time.Sleep(time.second)\n' + '\t'*2 + 'x_++\n\t}\n')
 
-    _main_function += '}\n\n'
+    _main_function.append('}\n\n')
 
     log('finished main function', -1)
-    log('appending all lines together to one list of lines')
 
-    _final_list_of_lines = [_file_head, _head_annotation, _main_function]
-    _final_list_of_lines.extend(_functions)
+    return ''.join(_main_function)
+
+_clock_pattern = re.compile(r'\bx\b')
+_identifier_pattern = re.compile(r'\W')
+# how long after v a guard x == v holds on the event clock, in time units, a millisecond as poll_interval
+_point_width = 0.001
+
+# the standard packages the generated code can use, by the name it is called by
+_go_packages = (('bytes', 'bytes'), ('json', 'encoding/json'), ('expvar', 'expvar'), ('math', 'math'),
+                ('rand', 'math/rand'), ('http', 'net/http'), ('os', 'os'), ('sync', 'sync'), ('atomic', 'sync/atomic'),
+                ('testing', 'testing'), ('time', 'time'))
+# comments and string literals, which do not use packages
+_go_literal_pattern = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"|`[^`]*`', re.S)
+# the package the helpers and channels go in when the functions are split over packages
+_shared_package = 'cta'
+_exported_names = ('time_unit', 'poll_interval', 'always_ready', 'running', 'clock_since', 'next_boundary',
+                   'timer_channel', 'stop_timer')
+_export_pattern = re.compile('(' + _go_literal_pattern.pattern + r')|\b(' + '|'.join(_exported_names)
+                             + r'|channel_\w+|f_\w+)\b', re.S)
+_go_call_pattern = re.compile(r'\bgo F_(\w+)\(\)')
+
+_event_file_head = 'package main\n\nimport (\n\t"math/rand"\n\t"sync"\n\t"time"\n)\n\n'
+
+_event_metrics_file_head = ('package main\n\nimport (\n\t"bytes"\n\t"encoding/json"\n\t"expvar"\n\t"math"\n\t"math/rand"\n\t"net/http"\n'
+                            '\t"os"\n\t"sync"\n\t"sync/atomic"\n\t"time"\n)\n\n')
+
+_event_helpers = '''// unit of the clock in the guards
+const time_unit = time.Second
+
+// how often a state is looked at again when its guards cannot be read as windows
+const poll_interval = time.Millisecond
+
+// closed in init, always ready in a select, used by transitions without communication
+var always_ready = make(chan struct{})
+
+// automata still running, main waits for them
+var running sync.WaitGroup
+
+func init() {
+\tclose(always_ready)
+}
+
+// clock value since the reset point, from the monotonic clock
+func clock_since(reset time.Time) float64 {
+\treturn float64(time.Since(reset)) / float64(time_unit)
+}
+
+// a timer for the first boundary after x, nil when there is none
+func next_boundary(x float64, boundaries ...float64) *time.Timer {
+\tfor _, b := range boundaries {
+\t\tif b > x {
+\t\t\treturn time.NewTimer(time.Duration((b - x) * float64(time_unit)))
+\t\t}
+\t}
+\treturn nil
+}
+
+// the channel of the timer, a nil timer gives a nil channel which is never ready
+func timer_channel(t *time.Timer) <-chan time.Time {
+\tif t == nil {
+\t\treturn nil
+\t}
+\treturn t.C
+}
+
+func stop_timer(t *time.Timer) {
+\tif t != nil {
+\t\tt.Stop()
+\t}
+}
+
+'''
+
+_metrics_helpers = '''// metrics of the running automata
+// each transition counts its firings, the clock when it fired against its guard's bounds and, for transitions with a
+// channel, how long it was blocked on the channel: from its guard holding, when its case is armed, to it firing, over
+// any timer wakes. The time before the guard holds is not counted.
+// they are kept in atomics, and a snapshot is written every metrics interval and once more when every automaton ends:
+//   CTA_METRICS_FILE      file the snapshot is written to as JSON, cta_metrics.json by default, empty for none
+//   CTA_METRICS_INTERVAL  how often, as a Go duration, 1s by default
+//   CTA_METRICS_ADDR      address to also serve it on as expvar, at /debug/vars, e.g. localhost:8123
+type transition_metrics struct {
+\tautomaton, from, to, guard, channel string
+\t// lowest and highest clock value of the guard, only known when bounded
+\tlow, high float64
+\tbounded   bool
+
+\tfired      atomic.Int64
+\toutside    atomic.Int64 // fired with the clock outside the bounds, the guard is checked before the select waits
+\tclock      atomic.Int64 // total clock at firing, in nanoseconds
+\tlow_slack  atomic.Int64 // least clock past low at firing, in nanoseconds
+\thigh_slack atomic.Int64 // least clock left before high at firing, in nanoseconds
+\tblocked    atomic.Int64 // total nanoseconds waited for the channel
+}
+
+// the metrics of every automaton, only added to by the init functions so it is read without a lock
+var metrics_registry [][]transition_metrics
+
+var metrics_file = "cta_metrics.json"
+
+// one snapshot is written at a time
+var metrics_writing sync.Mutex
+
+func register_metrics(metrics []transition_metrics) {
+\tfor i := range metrics {
+\t\tmetrics[i].low_slack.Store(math.MaxInt64)
+\t\tmetrics[i].high_slack.Store(math.MaxInt64)
+\t}
+\tmetrics_registry = append(metrics_registry, metrics)
+}
+
+func atomic_min(value *atomic.Int64, candidate int64) {
+\tfor {
+\t\told := value.Load()
+\t\tif candidate >= old || value.CompareAndSwap(old, candidate) {
+\t\t\treturn
+\t\t}
+\t}
+}
+
+// keeps the time a case was armed from while it stays armed, and clears it once it is not
+func arm(armed *time.Time, ready bool) {
+\tif !ready {
+\t\t*armed = time.Time{}
+\t} else if armed.IsZero() {
+\t\t*armed = time.Now()
+\t}
+}
+
+func (m *transition_metrics) fire(x float64, waited time.Duration) {
+\tm.fired.Add(1)
+\tclock := int64(x * float64(time_unit))
+\tm.clock.Add(clock)
+\tif m.channel != "" {
+\t\tm.blocked.Add(int64(waited))
+\t}
+\tif !m.bounded {
+\t\treturn
+\t}
+\tlow_slack := clock - int64(m.low*float64(time_unit))
+\tatomic_min(&m.low_slack, low_slack)
+\toutside := low_slack < 0
+\tif !math.IsInf(m.high, 1) {
+\t\thigh_slack := int64(m.high*float64(time_unit)) - clock
+\t\tatomic_min(&m.high_slack, high_slack)
+\t\toutside = outside || high_slack < 0
+\t}
+\tif outside {
+\t\tm.outside.Add(1)
+\t}
+}
+
+type transition_snapshot struct {
+\tAutomaton string   `json:"automaton"`
+\tFrom      string   `json:"from"`
+\tTo        string   `json:"to"`
+\tGuard     string   `json:"guard"`
+\tChannel   string   `json:"channel,omitempty"`
+\tLow       *float64 `json:"low,omitempty"`
+\tHigh      *float64 `json:"high,omitempty"`
+\tFired     int64    `json:"fired"`
+\tOutside   int64    `json:"outside_guard"`
+\tMeanClock float64  `json:"mean_clock"`
+\tLowSlack  *float64 `json:"least_slack_after_low,omitempty"`
+\tHighSlack *float64 `json:"least_slack_before_high,omitempty"`
+\tBlocked   float64  `json:"blocked_seconds"`
+}
+
+type channel_snapshot struct {
+\tFired   int64   `json:"fired"`
+\tBlocked float64 `json:"blocked_seconds"`
+}
+
+type metrics_snapshot struct {
+\tTime        time.Time                   `json:"time"`
+\tTransitions []transition_snapshot        `json:"transitions"`
+\tChannels    map[string]*channel_snapshot `json:"channels"`
+}
+
+// a clock in nanoseconds in units of time_unit, nil while it is unset
+func clock_units(nanoseconds int64) *float64 {
+\tif nanoseconds == math.MaxInt64 {
+\t\treturn nil
+\t}
+\tunits := float64(nanoseconds) / float64(time_unit)
+\treturn &units
+}
 
-    log('finished golang gen', -1)
+func snapshot_metrics() any {
+\tsnapshot := metrics_snapshot{Time: time.Now(), Channels: map[string]*channel_snapshot{}}
+\tfor _, metrics := range metrics_registry {
+\t\tfor i := range metrics {
+\t\t\tm := &metrics[i]
+\t\t\ttransition := transition_snapshot{Automaton: m.automaton, From: m.from, To: m.to, Guard: m.guard,
+\t\t\t\tChannel: m.channel, Fired: m.fired.Load(), Outside: m.outside.Load(),
+\t\t\t\tBlocked: time.Duration(m.blocked.Load()).Seconds()}
+\t\t\tif transition.Fired > 0 {
+\t\t\t\ttransition.MeanClock = float64(m.clock.Load()) / float64(transition.Fired) / float64(time_unit)
+\t\t\t}
+\t\t\tif m.bounded {
+\t\t\t\tlow := m.low
+\t\t\t\ttransition.Low = &low
+\t\t\t\ttransition.LowSlack = clock_units(m.low_slack.Load())
+\t\t\t\tif !math.IsInf(m.high, 1) {
+\t\t\t\t\thigh := m.high
+\t\t\t\t\ttransition.High = &high
+\t\t\t\t\ttransition.HighSlack = clock_units(m.high_slack.Load())
+\t\t\t\t}
+\t\t\t}
+\t\t\tsnapshot.Transitions = append(snapshot.Transitions, transition)
+\t\t\tif m.channel != "" {
+\t\t\t\tchannel := snapshot.Channels[m.channel]
+\t\t\t\tif channel == nil {
+\t\t\t\t\tchannel = &channel_snapshot{}
+\t\t\t\t\tsnapshot.Channels[m.channel] = channel
+\t\t\t\t}
+\t\t\t\tchannel.Fired += transition.Fired
+\t\t\t\tchannel.Blocked += transition.Blocked
+\t\t\t}
+\t\t}
+\t}
+\treturn snapshot
+}
 
-    log('generated program:\n' + str(''.join(_final_list_of_lines)))
+// writes the snapshot to a temporary file first so a reader never sees half of one
+func write_metrics() {
+\tif metrics_file == "" {
+\t\treturn
+\t}
+\tmetrics_writing.Lock()
+\tdefer metrics_writing.Unlock()
+\tvar data bytes.Buffer
+\tencoder := json.NewEncoder(&data)
+\t// the guards are easier to read without < and & escaped
+\tencoder.SetEscapeHTML(false)
+\tencoder.SetIndent("", " ")
+\tif encoder.Encode(snapshot_metrics()) != nil {
+\t\treturn
+\t}
+\tif os.WriteFile(metrics_file+".tmp", data.Bytes(), 0644) == nil {
+\t\tos.Rename(metrics_file+".tmp", metrics_file)
+\t}
+}
 
-    return _final_list_of_lines
+func start_metrics() {
+\tif file, set := os.LookupEnv("CTA_METRICS_FILE"); set {
+\t\tmetrics_file = file
+\t}
+\tinterval := time.Second
+\tif setting := os.Getenv("CTA_METRICS_INTERVAL"); setting != "" {
+\t\tif parsed, err := time.ParseDuration(setting); err == nil && parsed > 0 {
+\t\t\tinterval = parsed
+\t\t}
+\t}
+\tif address := os.Getenv("CTA_METRICS_ADDR"); address != "" {
+\t\texpvar.Publish("cta_metrics", expvar.Func(snapshot_metrics))
+\t\tgo http.ListenAndServe(address, nil)
+\t}
+\tif metrics_file != "" {
+\t\tgo func() {
+\t\t\tfor range time.Tick(interval) {
+\t\t\t\twrite_metrics()
+\t\t\t}
+\t\t}()
+\t}
+}
+
+'''
+
+# the channels are declared at package level so the goroutines can see them
+def generate_event_main(_automata, _channels=None, _metrics=False):
+    if _channels is None:
+        _channels = automata_topology(_automata, 'event')
+    return generate_channels(_channels) + '\n' + generate_event_main_function(_automata, _metrics)
+
+# the package level declarations of the channels, from automata_topology
+def generate_channels(_channels):
+    count('channels created', len(_channels))
+    _declarations = ['// channels\n']
+    for _chan, _channel in _channels.items():
+        _channel_create_line = ('var ' + str(_chan) + ' = make(chan ' + _channel.type + ', ' + str(_channel.capacity)
+                                + ') \t// ' + _channel.reason)
+        _declarations.append(_channel_create_line + '\n')
+        log(lambda: 'channel line: ' + str(_channel_create_line))
+    return ''.join(_declarations)
+
+# main of the event timing, which starts the goroutines and waits for them
+def generate_event_main_function(_automata, _metrics=False):
+    log('creating main function', 1)
+    _main_function = ['func main() {\n\n\t// initialises random gen with seed\n\trand.Seed(time.Now().UnixNano())\n\n']
+    if _metrics:
+        _main_function.append('\t// flushes the metrics every metrics interval, see start_metrics\n\tstart_metrics()\n\n')
+    _main_function.append('\t// goroutine declaration\n\trunning.Add(' + str(len(_automata)) + ')\n')
+    for a in _automata:
+        _main_function.append('\tgo f_' + go_identifier(str(a.label)) + '()\n')
+
+    # no clock to keep, main only waits
+    _main_function.append('\n\t// wait for every automaton to reach its end state\n\trunning.Wait()\n')
+    if _metrics:
+        _main_function.append('\twrite_metrics()\n')
+    _main_function.append('}\n\n')
+
+    log('finished main function', -1)
+
+    return ''.join(_main_function)
+
+# returns the go function for one automaton, blocking between events instead of polling
+# with int states, its state constants and enabled_ function come first
+# with metrics, every transition records its firing in metrics_<label> (see _metrics_helpers)
+def generate_event_function(a, _int_states=False, _metrics=False):
+    _states = []
+    # the clock at firing is recorded with the metrics
+    _uses_clock = _metrics
+    # read the guards first, the clock is only declared if a state needs it
+    for state, _state_transitions in iter_state_transitions(a):
+        _windows = [event_windows(c.condition) for c in _state_transitions]
+        _checks = [c.condition if w is None else windows_to_go(w) for c, w in zip(_state_transitions, _windows)]
+        _polled = None in _windows
+        _table = enabled_table([w for w in _windows if w is not None])
+        _points = table_boundaries(_table)
+        _state_uses_clock = bool(_points) or any(_clock_pattern.search(_check) for _check in _checks)
+        _uses_clock = _uses_clock or _state_uses_clock
+        _states.append((state, _state_transitions, _checks, _polled, _points, None if _polled else _table))
+
+    _name = go_identifier(str(a.label))
+    if _int_states:
+        # the clock is always passed to enabled_
+        _uses_clock = True
+        _constants = state_constants(a)
+        _current_automata_string = [generate_state_constants(a, _constants),
+                                    generate_enabled_function(a, [(_state[0], _state[2], _state[5]) for _state in _states],
+                                                              'float64', _constants),
+                                    'func f_' + _name + '() {\n\tdefer running.Done()\n\tcurrent_state := '
+                                    + _constants[a.initial_state] + '\n\treset := time.Now()\n'
+                                    + ('\tvar armed [' + _name + '_max_out]time.Time\n' if _metrics else '')
+                                    + '\tvar enabled ['
+                                    + _name + '_max_out]int\n\n\tfor current_state != ' + _constants[a.end_state]
+                                    + ' {\n' + '\t'*2 + 'x := clock_since(reset)\n' + '\t'*2 + 'enabled_count := enabled_'
+                                    + _name + '(current_state, x, &enabled)\n']
+    else:
+        _current_automata_string = ['func f_' + _name + '() {\n\tdefer running.Done()\n\tcurrent_state := "'
+                                    + a.initial_state + '"\n']
+        if _uses_clock:
+            _current_automata_string.append('\treset := time.Now()\n')
+        if _metrics:
+            _current_automata_string.append('\tvar armed [' + str(max_out_degree(a)) + ']time.Time\n')
+        _current_automata_string.append('\n\tfor current_state != "' + a.end_state + '" {\n')
+        if _uses_clock:
+            _current_automata_string.append('\t'*2 + 'x := clock_since(reset)\n')
+    if _metrics:
+        _current_automata_string.insert(0, generate_metrics_table(a, _states))
+        _metrics_name = metrics_table_name(a)
+        _metrics_index = 0
+    _current_automata_string.append('\t'*2 + 'switch current_state {\n')
+
+    for state, _state_transitions, _checks, _polled, _points, _table in _states:
+        if _int_states:
+            _current_automata_string.append('\t'*2 + 'case ' + _constants[state] + ':\n')
+        else:
+            _current_automata_string.append('\t'*2 + 'case "' + state + '":\n')
+        _cases = []
+        _enable = []
+        _arms = []
+        _transition_index_counter = 0
+        for c, _check in zip(_state_transitions, _checks):
+            _case = 'case_' + str(_transition_index_counter)
+            if _metrics:
+                # the wait on the channel runs from arming the case, over any timer wakes, to the transition firing
+                _armed = 'armed[' + str(_transition_index_counter) + ']'
+                _fire = ('\t'*4 + _metrics_name + '[' + str(_metrics_index) + '].fire(clock_since(reset), '
+                         + ('0' if is_internal(c) else 'time.Since(' + _armed + ')') + ')\n'
+                         + '\t'*4 + 'armed = [len(armed)]time.Time{}\n')
+                if not is_internal(c):
+                    _arms.append('\t'*3 + 'arm(&' + _armed + ', ' + _case + ' != nil)\n')
+                _metrics_index += 1
+            else:
+                _fire = ''
+            _type = c.communication_details[0]
+            if is_internal(c):
+                _current_automata_string.append('\t'*3 + 'var ' + _case + ' chan struct{}\n')
+                _ready = 'always_ready'
+                _select_case = 'case <-' + _case + ':\n'
+            else:
+                _current_automata_string.append('\t'*3 + 'var ' + _case + ' chan ' + channel_type(c) + '\n')
+                _ready = channel_name(a.label, c)
+                if 'send' in _type:
+                    _select_case = 'case ' + _case + ' <- *new(' + channel_type(c) + '):\n'
+                else:
+                    _select_case = 'case <-' + _case + ':\n'
+            if _int_states:
+                _enable.append('\t'*4 + 'case ' + str(_transition_index_counter) + ':\n' + '\t'*5 + _case + ' = '
+                               + _ready + '\n')
+                _select_case = ('\t'*3 + _select_case + _fire + '\t'*4 + 'current_state = ' + _constants[c.end_state]
+                                + '\n')
+            else:
+                if _check == 'true':
+                    _current_automata_string.append('\t'*3 + _case + ' = ' + _ready + '\n')
+                elif _check != 'false':
+                    _current_automata_string.append('\t'*3 + 'if ' + _check + ' {\n' + '\t'*4 + _case + ' = ' + _ready
+                                                    + '\n' + '\t'*3 + '}\n')
+                _select_case = '\t'*3 + _select_case + _fire + '\t'*4 + 'current_state = "' + c.end_state + '"\n'
+            # check for x reset
+            if c.reset_x and _uses_clock:
+                _select_case += '\t'*4 + 'reset = time.Now()\n'
+            _cases.append(_select_case)
+            _transition_index_counter += 1
+
+        if _int_states:
+            # the buffer holds the enabled transitions
+            _current_automata_string.append('\t'*3 + 'for _, t := range enabled[:enabled_count] {\n' + '\t'*4
+                                            + 'switch t {\n')
+            _current_automata_string.extend(_enable)
+            _current_automata_string.append('\t'*4 + '}\n' + '\t'*3 + '}\n')
+        _current_automata_string.extend(_arms)
+
+        # wake up when a window opens or closes
+        if _polled:
+            _current_automata_string.append('\t'*3 + 'timer := time.NewTimer(poll_interval)\n')
+        elif _points:
+            _current_automata_string.append('\t'*3 + 'timer := next_boundary(x, '
+                                            + ', '.join(_go_number(_point) for _point in _points) + ')\n')
+        else:
+            _current_automata_string.append('\t'*3 + '// no window opens or closes later, wait for a transition to be ready\n')
+        _current_automata_string.append('\t'*3 + 'select {\n')
+        _current_automata_string.extend(_cases)
+        if _polled or _points:
+            _current_automata_string.append('\t'*3 + 'case <-timer_channel(timer):\n'
+                                            + '\t'*4 + '// a guard window has opened or closed, look again\n')
+        _current_automata_string.append('\t'*3 + '}\n')
+        if _polled or _points:
+            _current_automata_string.append('\t'*3 + 'stop_timer(timer)\n')
+
+    # a state no transition leaves, or whose guards were all pruned, has nothing to wait for
+    _listed = set(_state[0] for _state in _states)
+    if any(state != a.end_state and state not in _listed for state in a.state_list):
+        _current_automata_string.append('\t'*2 + 'default:\n' + '\t'*3
+                                        + '// no transition leaves the state, block for good\n' + '\t'*3 + 'select {}\n')
+
+    _current_automata_string.append('\t'*2 + '}\n\t}\n}\n\n')
+
+    return ''.join(_current_automata_string)
+
+# the windows of a guard as the event timing checks them, see Timing, None when it cannot be read as windows
+def event_windows(_condition):
+    _windows = parse_guard_windows(_condition)
+    return None if _windows is None else widen_points(_windows, _point_width)
+
+def _go_number(_value):
+    return repr(_value) if isinstance(_value, float) else str(_value)
+
+# a go string literal, json escapes are also go escapes
+def _go_string(_text):
+    return json.dumps(_text)
+
+def metrics_table_name(a):
+    return 'metrics_' + go_identifier(str(a.label))
+
+# the metrics of each transition of the automaton, in the order the states are generated, registered in an init
+# the bounds are the lowest and highest clock value in the guard's windows
+def generate_metrics_table(a, _states):
+    _table = ['// metrics of the transitions of ' + str(a.label) + '\nvar ' + metrics_table_name(a)
+              + ' = [...]transition_metrics{\n']
+    for state, _state_transitions, _checks, _polled, _points, _state_table in _states:
+        for c in _state_transitions:
+            _entry = ('\t{automaton: ' + _go_string(str(a.label)) + ', from: ' + _go_string(state) + ', to: '
+                      + _go_string(c.end_state) + ', guard: ' + _go_string(c.condition))
+            if not is_internal(c):
+                _entry += ', channel: ' + _go_string(channel_name(a.label, c))
+            _windows = event_windows(c.condition)
+            if _windows is not None:
+                if _windows:
+                    _low, _high = _windows[0].low, _windows[-1].high
+                else:
+                    # never holds, any firing is outside
+                    _low, _high = 0, -1
+                _entry += (', low: ' + _go_number(_low) + ', high: '
+                           + ('math.Inf(1)' if _high == math.inf else _go_number(_high)) + ', bounded: true')
+            _table.append(_entry + '},\n')
+    _table.append('}\n\nfunc init() {\n\tregister_metrics(' + metrics_table_name(a) + '[:])\n}\n\n')
+    return ''.join(_table)
 
 # helper function for setting up channels
-# returns the code needed to implement the communication
+# returns the code needed to implement the communication, the channel itself is declared from automata_topology
 def channel_communication(_automata, _transition):
     # log('new channel com', 1)
     # transition stuff
@@ -208,26 +1109,22 @@ def channel_communication(_automata, _transition):
     _transition_communication_type = _transition_communication_details[0]
     _transition_communication_content = _transition_communication_details[1]
     _transition_communication_other = _transition_communication_details[2]
-    log('communication details: ' + str(_transition_communication_details))
+    log(lambda: 'communication details: ' + str(_transition_communication_details))
+    if is_internal(_transition):
+        return '// no communication'
 
-    _proposed_channel_name = 'channel_' + _automata + '_' + _transition_communication_content
+    _proposed_channel_name = channel_name(_automata, _transition)
     # log('proposed channel name: ' + _proposed_channel_name)
 
-    if _proposed_channel_name not in _channel_directory:
-        _channel_directory.append(_proposed_channel_name)
-        log('added ' + str(_proposed_channel_name) + ' to channel directory')
-    else:
-        log(str(_proposed_channel_name) + ' already used')
-
     # make assumption of channel
     if 'send' in _transition_communication_type:
-        _channel_string = _proposed_channel_name + ' <- ' + _transition_communication_content
-    else:
+        _channel_string = _proposed_channel_name + ' <- ' + (_transition_communication_content or 'struct{}{}')
+    elif _transition_communication_content:
         _channel_string = _transition_communication_content + ' <- ' + _proposed_channel_name
+    else:
+        _channel_string = '<-' + _proposed_channel_name
 
-    log('channel use code: ' + str(_channel_string))
-
-    _channel_dictionary[_proposed_channel_name] = _transition_communication_details
+    log(lambda: 'channel use code: ' + str(_channel_string))
     # log('finished channel com', -1)
 
     return _channel_string
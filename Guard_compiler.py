@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+"""Guard compiler
+
+Compiles the conditions of transitions into clock windows (see Guard_parser) before the Go is generated.
+
+compile_guards goes over a list of automata and for every transition:
+- reads its condition as normalised windows, conjunctions merged and unions sorted and joined,
+- drops the transition if the windows are empty, as it can never fire, and logs a warning for it,
+- otherwise rewrites the condition to plain comparisons of its windows.
+With an integer clock (the poll timing counts whole seconds) windows are cut down to whole numbers first, so a guard
+such as 2.5 < x < 3 is dead as well. The rewritten conditions are still read as windows by everything after, the enabled
+tables, Channel_topology and the minimiser, the single unsigned comparison for a window with two ends is only used
+when the Go is written (see Golang_generator.poll_check).
+Conditions that cannot be read as windows are kept as they are.
+The state list and end state are kept, a state that loses all its transitions keeps an empty list in the dictionary.
+
+enabled_table splits the clock line into the segments on which the set of enabled transitions of a state does not
+change. The generator uses it to pick the enabled transitions with a few comparisons and to know when to wake up.
+"""
+
+import math
+
+from collections import namedtuple
+
+from log import log, WARNING
+from instrument import phase_start, phase_end, count
+from Automata_Structures import *
+from Guard_parser import parse_guard_windows, windows_to_go, windows_contain, integer_window
+
+GuardReport = namedtuple('GuardReport', ['label', 'transitions', 'pruned', 'rewritten', 'opaque'])
+# transitions: how many there were, pruned: the transitions dropped, rewritten: conditions changed,
+# opaque: conditions that could not be read as windows
+
+Segment = namedtuple('Segment', ['high', 'high_closed', 'enabled'])
+# the segment runs from the end of the one before it (or 0) up to high, high is in it if high_closed
+# enabled: tuple of the indexes of the transitions enabled on it
+
+
+# returns the compiled automata and a GuardReport for each
+def compile_guards(_automata, _integer_clock=False):
+    _reports = []
+    return list(iter_compile_guards(_automata, _integer_clock, _reports)), _reports
+
+# yields each compiled automaton as it comes, for automata read as a stream
+# the GuardReports are added to _reports when it is given, the dropped transitions are logged unless _quiet
+def iter_compile_guards(_automata, _integer_clock=False, _reports=None, _quiet=False):
+    for a in _automata:
+        _compiled_automata, _report = compile_automata_guards(a, _integer_clock)
+        if not _quiet:
+            log_guard_report(_report)
+        if _reports is not None:
+            _reports.append(_report)
+        yield _compiled_automata
+
+# logs the transitions a GuardReport dropped
+def log_guard_report(_report):
+    for c in _report.pruned:
+        log(lambda: 'guard can never hold, dropped ' + str(_report.label) + ': ' + c.start_state + ' (' + c.condition
+            + ') ' + c.end_state, 0, WARNING)
+    log(lambda: str(_report.label) + ': ' + str(len(_report.pruned)) + ' transitions dropped, '
+        + str(_report.rewritten) + ' conditions rewritten')
+
+
+def compile_automata_guards(a, _integer_clock=False):
+    _transition_dictionary = {}
+    _timer = phase_start()
+    _pruned = []
+    _rewritten = 0
+    _opaque = 0
+    _count = 0
+    for state in a.state_list:
+        if state not in a.transition_dictionary:
+            continue
+        _kept = []
+        for c in a.transition_dictionary[state]:
+            _count += 1
+            _windows = guard_windows(c.condition, _integer_clock)
+            if _windows is None:
+                _opaque += 1
+                _kept.append(c)
+            elif not _windows:
+                _pruned.append(c)
+            else:
+                _condition = windows_to_go(_windows)
+                if _condition != c.condition:
+                    _rewritten += 1
+                    c = c._replace(condition=_condition)
+                _kept.append(c)
+        _transition_dictionary[state] = _kept
+
+    count('transitions pruned', len(_pruned))
+    phase_end('guards', _timer, a.label)
+    return (Automata(a.label, a.initial_state, a.end_state, list(a.state_list), _transition_dictionary, a.text),
+            GuardReport(a.label, _count, _pruned, _rewritten, _opaque))
+
+
+# the normalised windows of a condition, None if it cannot be read as windows
+# for an integer clock the windows only hold whole numbers, with closed ends
+def guard_windows(_condition, _integer_clock=False):
+    _windows = parse_guard_windows(_condition)
+    if _windows is None or not _integer_clock:
+        return _windows
+    return tuple(_window for _window in map(integer_window, _windows) if _window is not None)
+
+
+# the segments of the clock line for the windows of each transition of one state
+def enabled_table(_state_windows):
+    # a cut is just before a value (value, 0) or just after it (value, 1)
+    _cuts = set()
+    for _windows in _state_windows:
+        for _window in _windows:
+            if _window.low > 0 or not _window.low_closed:
+                _cuts.add((_window.low, 0 if _window.low_closed else 1))
+            if _window.high != math.inf:
+                _cuts.add((_window.high, 1 if _window.high_closed else 0))
+    _table = []
+    _previous = (0, 0)
+    for _cut in sorted(_cuts) + [(math.inf, 0)]:
+        if _cut == _previous:
+            continue
+        # a value inside the segment tells which transitions are enabled on all of it
+        if _cut[0] == _previous[0]:
+            _inside = _cut[0]
+        elif _cut[0] == math.inf:
+            _inside = _previous[0] + 1
+        else:
+            _inside = (_previous[0] + _cut[0]) / 2
+        _enabled = tuple(i for i, _windows in enumerate(_state_windows) if windows_contain(_windows, _inside))
+        if _table and _table[-1].enabled == _enabled:
+            _table[-1] = Segment(_cut[0], _cut[1] == 1, _enabled)
+        else:
+            _table.append(Segment(_cut[0], _cut[1] == 1, _enabled))
+        _previous = _cut
+    return tuple(_table)
+
+
+# the clock values where the enabled transitions change, in order, each once
+# a window holding a single value v ends two segments at v, one up to v and one at v
+def table_boundaries(_table):
+    _points = []
+    for _segment in _table:
+        if _segment.high != math.inf and (not _points or _points[-1] != _segment.high):
+            _points.append(_segment.high)
+    return _points
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+"""Guard parser
+
+Reads the condition of a transition, e.g. 'x < 10', 'x >= 3 && x < 9' or '9 <= x <= 15', as a window on the clock x.
+A window is an Interval: the clock values from low to high, each end open or closed.
+Comparisons joined with && (or 'and') are merged into one window, 'true' is every clock value from 0.
+Conjunctions joined with || (or 'or') give several windows, parse_guard_windows returns them normalised: empty windows
+dropped, sorted, and overlapping or touching windows merged. No windows at all means the guard can never hold.
+
+Conditions that are not comparisons of x with numbers (other variables, !, ...) cannot be read as windows and
+parse_guard and parse_guard_windows return None for them, the caller should fall back to the condition text.
+"""
+
+import math
+import re
+
+from collections import namedtuple
+
+Interval = namedtuple('Interval', ['low', 'low_closed', 'high', 'high_closed'])
+# low, high: bounds on the clock, high may be math.inf
+# low_closed, high_closed: whether the bound itself is in the window
+
+# every clock value, the clock starts at 0
+ALWAYS = Interval(0, True, math.inf, False)
+
+_clock = 'x'
+
+_guard_token_pattern = re.compile(r'\s*(?:(?P<number>\d+(?:\.\d*)?|\.\d+)'
+                                  r'|(?P<name>[A-Za-z_]\w*)'
+                                  r'|(?P<operator><=|>=|==|&&|\|\||<|>|=))')
+
+# flips a comparison so the clock is on the left, 3 < x is x > 3
+_flipped = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '==': '=='}
+
+
+# returns the Interval for a condition, or None when it is not a window on the clock
+def parse_guard(_condition, _clock_name=_clock):
+    _tokens = _guard_tokens(_condition)
+    if _tokens is None or ('operator', '||') in _tokens:
+        return None
+    return _conjunction_window(_tokens, _clock_name)
+
+# returns the normalised tuple of Intervals for a condition, or None when it is not windows on the clock
+def parse_guard_windows(_condition, _clock_name=_clock):
+    _tokens = _guard_tokens(_condition)
+    if _tokens is None:
+        return None
+    _windows = []
+    for _conjunction in _split(_tokens, ('operator', '||')):
+        _window = _conjunction_window(_conjunction, _clock_name)
+        if _window is None:
+            return None
+        _windows.append(_window)
+    return normalise(_windows)
+
+
+def _conjunction_window(_tokens, _clock_name):
+    _window = ALWAYS
+    for _comparison in _split(_tokens, ('operator', '&&')):
+        _atom = _comparison_window(_comparison, _clock_name)
+        if _atom is None:
+            return None
+        _window = intersect(_window, _atom)
+    return _window
+
+
+def _guard_tokens(_condition):
+    _tokens = []
+    _offset = 0
+    _condition = _condition.strip()
+    while _offset < len(_condition):
+        _found = _guard_token_pattern.match(_condition, _offset)
+        if _found is None:
+            return None
+        _kind = _found.lastgroup
+        _value = _found.group(_kind)
+        if _kind == 'number':
+            _value = float(_value) if '.' in _value else int(_value)
+        elif _kind == 'name' and _value == 'and':
+            _kind, _value = 'operator', '&&'
+        elif _kind == 'name' and _value == 'or':
+            _kind, _value = 'operator', '||'
+        elif _value == '=':
+            _value = '=='
+        _tokens.append((_kind, _value))
+        _offset = _found.end()
+    return _tokens
+
+
+def _split(_tokens, _separator):
+    _part = []
+    for _token in _tokens:
+        if _token == _separator:
+            yield _part
+            _part = []
+        else:
+            _part.append(_token)
+    yield _part
+
+
+# one comparison, or a chain such as 9 <= x <= 15
+def _comparison_window(_comparison, _clock_name):
+    if len(_comparison) == 1 and _comparison[0][0] == 'name' and _comparison[0][1] in ('true', 'false'):
+        return ALWAYS if _comparison[0][1] == 'true' else Interval(0, False, 0, False)
+    # operands and operators must alternate
+    if len(_comparison) < 3 or len(_comparison) % 2 == 0:
+        return None
+    _window = ALWAYS
+    for i in range(0, len(_comparison) - 2, 2):
+        _left, _operator, _right = _comparison[i], _comparison[i + 1], _comparison[i + 2]
+        if _operator[0] != 'operator' or _operator[1] not in _flipped:
+            return None
+        if _left == ('name', _clock_name) and _right[0] == 'number':
+            _atom = _bound(_operator[1], _right[1])
+        elif _right == ('name', _clock_name) and _left[0] == 'number':
+            _atom = _bound(_flipped[_operator[1]], _left[1])
+        else:
+            return None
+        _window = intersect(_window, _atom)
+    return _window
+
+
+# the window of x <operator> _value
+def _bound(_operator, _value):
+    if _operator == '<':
+        return Interval(0, True, _value, False)
+    if _operator == '<=':
+        return Interval(0, True, _value, True)
+    if _operator == '>':
+        return Interval(_value, False, math.inf, False)
+    if _operator == '>=':
+        return Interval(_value, True, math.inf, False)
+    return Interval(_value, True, _value, True)
+
+
+def intersect(_a, _b):
+    if _a.low > _b.low or (_a.low == _b.low and not _a.low_closed):
+        _low, _low_closed = _a.low, _a.low_closed
+    else:
+        _low, _low_closed = _b.low, _b.low_closed
+    if _a.high < _b.high or (_a.high == _b.high and not _a.high_closed):
+        _high, _high_closed = _a.high, _a.high_closed
+    else:
+        _high, _high_closed = _b.high, _b.high_closed
+    return Interval(_low, _low_closed, _high, _high_closed)
+
+
+def is_empty(_window):
+    return _window.low > _window.high or (_window.low == _window.high
+                                          and not (_window.low_closed and _window.high_closed))
+
+
+def contains(_window, _value):
+    if _value < _window.low or (_value == _window.low and not _window.low_closed):
+        return False
+    return _value < _window.high or (_value == _window.high and _window.high_closed)
+
+
+# sorts the windows and merges those that overlap or touch, empty windows are dropped
+def normalise(_windows):
+    _windows = sorted((_window for _window in _windows if not is_empty(_window)),
+                      key=lambda _window: (_window.low, not _window.low_closed))
+    _merged = []
+    for _window in _windows:
+        if _merged and _joins(_merged[-1], _window):
+            _last = _merged[-1]
+            if _window.high > _last.high or (_window.high == _last.high and _window.high_closed):
+                _merged[-1] = Interval(_last.low, _last.low_closed, _window.high, _window.high_closed)
+        else:
+            _merged.append(_window)
+    return tuple(_merged)
+
+
+# the windows with each that holds a single value, x == v, widened to [v, v + _width)
+# for a clock that is read at some instant after v rather than at v itself
+def widen_points(_windows, _width):
+    if not any(_window.low == _window.high for _window in _windows):
+        return _windows
+    return normalise([Interval(_window.low, True, _window.low + _width, False) if _window.low == _window.high
+                      else _window for _window in _windows])
+
+
+# whether _b, which starts no earlier than _a, overlaps or touches it
+def _joins(_a, _b):
+    return _b.low < _a.high or (_b.low == _a.high and (_a.high_closed or _b.low_closed))
+
+
+def windows_contain(_windows, _value):
+    return any(contains(_window, _value) for _window in _windows)
+
+
+# the clock values at which the window opens or closes, in order
+def boundaries(_window):
+    if is_empty(_window):
+        return []
+    _points = []
+    if _window.low > 0:
+        _points.append(_window.low)
+    if _window.high != math.inf:
+        _points.append(_window.high)
+    return _points
+
+
+# the window as a go boolean expression on the variable _name
+# for an integer clock the window is cut down to whole numbers, and a window with two ends is checked with a single
+# unsigned comparison, x in [3, 9] is uint(x-3) <= 6
+def window_to_go(_window, _name=_clock, _integer=False):
+    if _integer:
+        return _integer_window_to_go(_window, _name)
+    if is_empty(_window):
+        return 'false'
+    if _window.low == _window.high:
+        return _name + ' == ' + _number(_window.low)
+    _checks = []
+    if _window.low > 0 or not _window.low_closed:
+        _checks.append(_number(_window.low) + (' <= ' if _window.low_closed else ' < ') + _name)
+    if _window.high != math.inf:
+        _checks.append(_name + (' <= ' if _window.high_closed else ' < ') + _number(_window.high))
+    if not _checks:
+        return 'true'
+    return ' && '.join(_checks)
+
+
+# the window cut down to the whole numbers in it, with closed ends, or None if there are none
+def integer_window(_window):
+    _low = math.ceil(_window.low) if _window.low_closed else math.floor(_window.low) + 1
+    if _window.high == math.inf:
+        _high = math.inf
+    else:
+        _high = math.floor(_window.high) if _window.high_closed else math.ceil(_window.high) - 1
+    if _low > _high:
+        return None
+    return Interval(_low, True, _high, _high != math.inf)
+
+
+def _integer_window_to_go(_window, _name):
+    _window = integer_window(_window)
+    if _window is None:
+        return 'false'
+    _low, _high = _window.low, _window.high
+    if _low > _high:
+        return 'false'
+    if _low <= 0:
+        return 'true' if _high == math.inf else _name + ' <= ' + str(_high)
+    if _high == math.inf:
+        return _name + ' >= ' + str(_low)
+    if _low == _high:
+        return _name + ' == ' + str(_low)
+    return 'uint(' + _name + '-' + str(_low) + ') <= ' + str(_high - _low)
+
+
+# the windows as a go boolean expression, the cheapest check for each window joined with ||
+def windows_to_go(_windows, _name=_clock, _integer=False):
+    if not _windows:
+        return 'false'
+    _checks = [window_to_go(_window, _name, _integer) for _window in _windows]
+    _checks = [_check for _check in _checks if _check != 'false']
+    if not _checks:
+        return 'false'
+    if 'true' in _checks:
+        return 'true'
+    if len(_checks) == 1:
+        return _checks[0]
+    # && binds tighter than || in go, so no brackets are needed
+    return ' || '.join(_checks)
+
+
+def _number(_value):
+    return repr(_value) if isinstance(_value, float) else str(_value)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+
+"""Simulator
+
+Runs a network of loaded automata directly, without generating and running Go.
+
+Time is continuous, each automaton's clock x is the time since its last reset. Like the event timing of the generated
+Go, a transition fires as soon as it is enabled: its guard holds and its communication can happen.
+Channels come from the communication details. A send by automaton A to other B with content m and a receive by B from
+other A with content m use the same channel. Channels are buffered, each with the places the generated Go gives it
+(see Channel_topology) unless one size is given for all of them. A send needs a free place and a receive needs a
+waiting message. Transitions without communication only need their guard.
+
+When several transitions are enabled at once, an automaton that has one is picked at random, then one of its enabled
+transitions at random, as the goroutine does with rand.Intn over its enabled transitions.
+When nothing is enabled, time jumps to the next instant at which a guard changes (see Guard_compiler.enabled_table),
+taken from a heap of wake up times, so the cost follows the number of transitions rather than the time simulated.
+A run ends when every automaton is in its end state (completed), when nothing is enabled and no guard will change
+(deadlock), or when it passes max_time or max_steps (timeout).
+
+simulate_batch runs many seeded executions at once with NumPy, evaluating the clocks and guards of every run as arrays.
+It gives deadlock rates, throughput and how often each automaton reaches its end state.
+NumPy is only needed for simulate_batch.
+"""
+
+import bisect
+import heapq
+import math
+import random
+
+from collections import namedtuple
+
+from log import log, INFO
+from Automata_Structures import *
+from Guard_compiler import guard_windows, enabled_table
+from Channel_topology import automata_channel_uses, channel_topology, channel_name
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_internal, _send, _receive = 0, 1, 2
+
+# open lower bounds such as x > 3 have no first instant, the guard is looked at this much later instead
+_epsilon = 1e-6
+# clock values are rounded to this many places so x - reset lands exactly on the bounds
+_clock_places = 9
+
+SimulationResult = namedtuple('SimulationResult', ['outcome', 'time', 'steps', 'states', 'trace'])
+# outcome: 'completed', 'deadlock' or 'timeout'
+# states: the state label each automaton finished in, by automaton label
+# trace: list of (time, automaton label, Transition) when asked for, otherwise None
+
+BatchResult = namedtuple('BatchResult', ['runs', 'completed', 'deadlocked', 'timed_out', 'mean_time', 'mean_steps',
+                                         'throughput', 'end_state_rates', 'outcomes'])
+# completed, deadlocked, timed_out: number of runs ending that way
+# mean_time: mean time at which completed runs completed (nan if none did)
+# throughput: transitions fired per unit of time over all runs
+# end_state_rates: fraction of runs in which each automaton ended in its end state, by automaton label
+# outcomes: array of the outcome of each run, 0 completed, 1 deadlock, 2 timeout
+
+_outcomes = ('completed', 'deadlock', 'timeout')
+
+
+# the network compiled to ids and tables for the simulators
+# _capacity is the places of each channel: a dictionary of channel name to Channel as channel_topology gives, a number
+# for every channel, or None for the sizes channel_topology gives the automata (continuous clock)
+class SimulationNetwork:
+    __slots__ = ('labels', 'states', 'initial', 'end', 'channels', 'capacities',
+                 'transitions', 'owner', 'source', 'target', 'kind', 'channel', 'reset', 'windows',
+                 'tables', 'channel_users')
+
+    def __init__(self, _automata, _capacity=None):
+        _automata = list(_automata)
+        self.labels = []
+        self.states = []
+        self.initial = []
+        self.end = []
+        # by channel name, as in the generated Go
+        self.channels = InternTable()
+        # the places of each channel, by channel id
+        self.capacities = []
+        self.transitions = []
+        self.owner = []
+        self.source = []
+        self.target = []
+        self.kind = []
+        self.channel = []
+        self.reset = []
+        self.windows = []
+        # (automaton, state id): (segment starts, transition ids enabled on each segment)
+        self.tables = {}
+        self.channel_users = {}
+        for _index, a in enumerate(_automata):
+            self._add_automata(_index, a)
+        if _capacity is None:
+            _capacity = channel_topology((automata_channel_uses(a) for a in _automata), self.labels)
+        if isinstance(_capacity, dict):
+            self.capacities = [_capacity[_name].capacity for _name in self.channels]
+        else:
+            self.capacities = [_capacity] * len(self.channels)
+
+    def _add_automata(self, _index, a):
+        _label = str(a.label)
+        _states = InternTable(a.state_list)
+        self.labels.append(_label)
+        self.states.append(_states)
+        self.initial.append(_states.intern(a.initial_state))
+        self.end.append(_states.id_of(a.end_state) if a.end_state in _states else -1)
+        for state in a.state_list:
+            if state not in a.transition_dictionary:
+                continue
+            _ids = []
+            _state_windows = []
+            for c in a.transition_dictionary[state]:
+                _windows = guard_windows(c.condition)
+                if _windows is None:
+                    raise ValueError('cannot simulate the guard of ' + _label + ': ' + c.start_state + ' ('
+                                     + c.condition + ') ' + c.end_state)
+                _type, _content, _other = c.communication_details
+                if _content == '' and _other == '':
+                    _kind, _channel = _internal, -1
+                else:
+                    _kind = _send if 'send' in _type else _receive
+                    _channel = self.channels.intern(channel_name(a.label, c))
+                if _channel >= 0:
+                    self.channel_users.setdefault(_channel, set()).add(_index)
+                _ids.append(len(self.transitions))
+                _state_windows.append(_windows)
+                self.transitions.append(c)
+                self.owner.append(_index)
+                self.source.append(_states.id_of(state))
+                self.target.append(_states.intern(c.end_state))
+                self.kind.append(_kind)
+                self.channel.append(_channel)
+                self.reset.append(c.reset_x)
+                self.windows.append(_windows)
+            # a segment after a closed bound starts just after it
+            _starts = [0]
+            _enabled = []
+            for _segment in enabled_table(_state_windows):
+                _enabled.append([_ids[i] for i in _segment.enabled])
+                _starts.append(_segment.high + _epsilon if _segment.high_closed else _segment.high)
+            self.tables[(_index, _states.id_of(state))] = (_starts[:-1], _enabled)
+
+
+def compile_network(_automata, _capacity=None):
+    return SimulationNetwork(_automata, _capacity)
+
+
+# runs the network once, the seed makes the run repeatable
+def simulate(_automata, _seed=None, _max_time=1000, _max_steps=100000, _capacity=None, _trace=False):
+    _network = _automata if isinstance(_automata, SimulationNetwork) else compile_network(_automata, _capacity)
+    _random = random.Random(_seed)
+    _count = len(_network.labels)
+    _states = list(_network.initial)
+    _resets = [0.0] * _count
+    _buffers = [0] * len(_network.channels)
+    _time = 0.0
+    _steps = 0
+    _trace_list = [] if _trace else None
+    # wake up heap of (time, automaton, version), entries from before the automaton last changed are skipped
+    _heap = []
+    _versions = [0] * _count
+    _enabled = [[] for _ in range(_count)]
+    _active = set()
+    _dirty = set(range(_count))
+    _ended = sum(1 for i in range(_count) if _states[i] == _network.end[i])
+
+    while True:
+        for i in _dirty:
+            _enabled[i], _wake = _enabled_now(_network, i, _states[i], _resets[i], _time, _buffers)
+            _versions[i] += 1
+            if _enabled[i]:
+                _active.add(i)
+            else:
+                _active.discard(i)
+                if _wake is not None:
+                    heapq.heappush(_heap, (_wake, i, _versions[i]))
+        _dirty.clear()
+
+        if _ended == _count:
+            _outcome = 'completed'
+            break
+        if _active:
+            if _steps >= _max_steps:
+                _outcome = 'timeout'
+                break
+            i = _random.choice(sorted(_active))
+            t = _random.choice(_enabled[i])
+            _was_ended = _states[i] == _network.end[i]
+            _states[i] = _network.target[t]
+            _ended += (_states[i] == _network.end[i]) - _was_ended
+            if _network.reset[t]:
+                _resets[i] = _time
+            _dirty.add(i)
+            if _network.kind[t] != _internal:
+                _buffers[_network.channel[t]] += 1 if _network.kind[t] == _send else -1
+                _dirty.update(_network.channel_users[_network.channel[t]])
+            _steps += 1
+            if _trace:
+                _trace_list.append((_time, _network.labels[i], _network.transitions[t]))
+            continue
+
+        # nothing can happen now, move on to the next guard change
+        while _heap and _heap[0][2] != _versions[_heap[0][1]]:
+            heapq.heappop(_heap)
+        if not _heap:
+            _outcome = 'deadlock'
+            break
+        if _heap[0][0] > _max_time:
+            _time = _max_time
+            _outcome = 'timeout'
+            break
+        _time = _heap[0][0]
+        while _heap and _heap[0][0] == _time:
+            _dirty.add(heapq.heappop(_heap)[1])
+
+    log(lambda: 'simulation ' + _outcome + ' at ' + str(_time) + ' after ' + str(_steps) + ' transitions')
+    return SimulationResult(_outcome, _time, _steps,
+                            {_network.labels[i]: _network.states[i].label(_states[i]) for i in range(_count)},
+                            _trace_list)
+
+
+# the enabled transitions of an automaton now, and when its guards next change if none are
+def _enabled_now(_network, i, _state, _reset, _time, _buffers):
+    _table = _network.tables.get((i, _state))
+    if _table is None:
+        return [], None
+    _starts, _segments = _table
+    _x = round(_time - _reset, _clock_places)
+    _segment = bisect.bisect_right(_starts, _x) - 1
+    _enabled = []
+    for t in _segments[_segment]:
+        _kind = _network.kind[t]
+        if _kind == _internal \
+                or (_kind == _send and _buffers[_network.channel[t]] < _network.capacities[_network.channel[t]]) \
+                or (_kind == _receive and _buffers[_network.channel[t]] > 0):
+            _enabled.append(t)
+    if _segment + 1 < len(_starts):
+        return _enabled, _reset + _starts[_segment + 1]
+    return _enabled, None
+
+
+# runs _runs executions side by side, run r uses the seed _seed + r
+def simulate_batch(_automata, _runs=1000, _seed=0, _max_time=1000, _max_steps=10000, _capacity=None):
+    if np is None:
+        raise ImportError('simulate_batch needs numpy')
+    _network = _automata if isinstance(_automata, SimulationNetwork) else compile_network(_automata, _capacity)
+    log(lambda: 'simulating ' + str(_runs) + ' runs of ' + str(len(_network.labels)) + ' automata', 1, INFO)
+    _random = np.random.default_rng(_seed)
+    _count = len(_network.labels)
+    _transitions = len(_network.transitions)
+
+    owner = np.array(_network.owner, dtype=np.int64)
+    source = np.array(_network.source, dtype=np.int64)
+    target = np.array(_network.target, dtype=np.int64)
+    kind = np.array(_network.kind, dtype=np.int64)
+    channel = np.maximum(np.array(_network.channel, dtype=np.int64), 0)
+    # the places of each transition's channel
+    capacity = np.array(_network.capacities or [0], dtype=np.int64)[channel]
+    reset = np.array(_network.reset, dtype=bool)
+    end = np.array(_network.end, dtype=np.int64)
+    owner_matrix = np.zeros((_transitions, _count), dtype=np.int32)
+    owner_matrix[np.arange(_transitions), owner] = 1
+
+    # the windows of each transition, padded with empty windows
+    _width = max([len(_windows) for _windows in _network.windows] or [1]) or 1
+    low = np.full((_transitions, _width), np.inf)
+    high = np.full((_transitions, _width), -np.inf)
+    low_closed = np.zeros((_transitions, _width), dtype=bool)
+    high_closed = np.zeros((_transitions, _width), dtype=bool)
+    for t, _windows in enumerate(_network.windows):
+        for w, _window in enumerate(_windows):
+            low[t, w], low_closed[t, w] = _window.low, _window.low_closed
+            high[t, w], high_closed[t, w] = _window.high, _window.high_closed
+    # the clock values at which each transition's guard can change, as in SimulationNetwork.tables
+    changes = np.concatenate([np.where(low_closed, low, low + _epsilon), np.where(high_closed, high + _epsilon, high)],
+                             axis=1)
+    changes[~np.isfinite(changes)] = np.inf
+
+    states = np.tile(np.array(_network.initial, dtype=np.int64), (_runs, 1))
+    resets = np.zeros((_runs, _count))
+    buffers = np.zeros((_runs, max(len(_network.channels), 1)), dtype=np.int64)
+    times = np.zeros(_runs)
+    steps = np.zeros(_runs, dtype=np.int64)
+    outcomes = np.full(_runs, -1, dtype=np.int64)
+
+    while True:
+        live = np.flatnonzero(outcomes < 0)
+        if live.size == 0:
+            break
+        _states = states[live]
+        completed = (_states == end).all(axis=1)
+        outcomes[live[completed]] = 0
+        live, _states = live[~completed], _states[~completed]
+        if live.size == 0:
+            break
+
+        x = np.round(times[live, None] - resets[live][:, owner], _clock_places)
+        xw = x[:, :, None]
+        guard = (((xw > low) | (low_closed & (xw == low))) & ((xw < high) | (high_closed & (xw == high)))).any(axis=2)
+        in_state = _states[:, owner] == source
+        _buffers = buffers[live][:, channel]
+        ready = (kind == _internal) | ((kind == _send) & (_buffers < capacity)) | ((kind == _receive) & (_buffers > 0))
+        enabled = guard & in_state & ready
+        moving = enabled.any(axis=1)
+
+        # fire one transition in each run that can: a random automaton, then a random transition of it
+        runs = live[moving]
+        if runs.size:
+            _enabled = enabled[moving]
+            over_limit = steps[runs] >= _max_steps
+            outcomes[runs[over_limit]] = 2
+            runs, _enabled = runs[~over_limit], _enabled[~over_limit]
+            if runs.size:
+                keys = np.where((_enabled.astype(np.int32) @ owner_matrix) > 0, _random.random((runs.size, _count)), -1)
+                chosen = keys.argmax(axis=1)
+                keys = np.where(_enabled & (owner == chosen[:, None]), _random.random((runs.size, _transitions)), -1)
+                t = keys.argmax(axis=1)
+                states[runs, owner[t]] = target[t]
+                resets[runs[reset[t]], owner[t[reset[t]]]] = times[runs[reset[t]]]
+                communicating = kind[t] != _internal
+                buffers[runs[communicating], channel[t[communicating]]] += np.where(kind[t[communicating]] == _send, 1, -1)
+                steps[runs] += 1
+
+        # move the others on to their next guard change
+        runs = live[~moving]
+        if runs.size:
+            _in_state = in_state[~moving]
+            wake = resets[runs][:, owner][:, :, None] + changes
+            wake = np.where(_in_state[:, :, None] & (wake > times[runs, None, None]), wake, np.inf)
+            wake = wake.reshape(runs.size, -1).min(axis=1) if wake.size else np.full(runs.size, np.inf)
+            outcomes[runs[np.isinf(wake)]] = 1
+            late = np.isfinite(wake) & (wake > _max_time)
+            outcomes[runs[late]] = 2
+            times[runs[late]] = _max_time
+            waking = np.isfinite(wake) & ~late
+            times[runs[waking]] = wake[waking]
+
+    _completed = outcomes == 0
+    _total_time = float(times.sum())
+    _result = BatchResult(_runs,
+                          int(_completed.sum()),
+                          int((outcomes == 1).sum()),
+                          int((outcomes == 2).sum()),
+                          float(times[_completed].mean()) if _completed.any() else math.nan,
+                          float(steps.mean()),
+                          float(steps.sum()) / _total_time if _total_time > 0 else math.inf,
+                          {_network.labels[i]: float((states[:, i] == end[i]).mean()) for i in range(_count)},
+                          outcomes)
+    log(lambda: str(_result.completed) + ' completed, ' + str(_result.deadlocked) + ' deadlocked, '
+        + str(_result.timed_out) + ' timed out', -1, INFO)
+    return _result
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+
+"""Zone verifier
+
+Checks a network of loaded automata for deadlocks and for end states that can never be reached, before any Go is
+generated, by exploring every way the network can run instead of sampling runs as the Simulator does.
+
+The network is read as the Simulator reads it (see Simulator.SimulationNetwork): each automaton has its own clock x,
+sends and receives meet on buffered channels, sized as in the generated Go (see Channel_topology), and guards are
+windows on the clock. As in the Simulator and the event timing of the generated Go, a transition fires as soon as it
+is enabled, its guard holds and its communication can happen: time only passes while nothing is enabled, and when
+several transitions are, any one of them can fire first. A guard x > c is taken to hold from c on, the earliest
+instant it fires at. A network that waits somewhere it could go on is not modelled.
+
+The clocks of all the automata are kept together as a zone, a convex set of clock values, in a difference bound matrix
+(DBM): a NumPy array where entry [i][j] bounds clock i minus clock j (clock 0 is always 0), each bound stored as
+2 * constant + 1 when it is <= and 2 * constant when it is <. Guard constants are scaled to whole numbers first.
+A zone is closed to its tightest bounds by squaring the matrix in the (min, +) algebra, all at once in NumPy, which
+takes a logarithmic number of steps in the number of clocks.
+A symbolic state is the state of each automaton, the number of messages in each channel and the zone of clock values
+the state is entered with. To find what fires next the zone is cut by where each clock is against the windows its
+automaton can fire in: where a clock is in one, something fires at once; where clocks are before windows, time passes
+up to the nearest; where every clock is past all its windows, nothing will ever fire. The zones after a transition
+are widened where only bounds past the constants its clocks are compared with differ (the extrapolation Extra_M of
+Behrmann, Bouyer, Larsen and Pelanek, one constant per clock for lower and upper bounds alike, as a deadlock depends
+on both), so there are finitely many. The constants are those of the guards each automaton can still test before
+resetting x from the state it is in, so the clock of an automaton that will not look at it again is dropped from the
+zone altogether.
+
+The search is breadth first from the initial state. The passed list is hashed by the states and channels, and a new
+zone included in one already passed for the same states and channels is dropped (subsumption), while the zones it
+includes are dropped from the passed list and, when still waiting, not explored. Each channel has one sender and
+one receiver and time cannot pass while a transition is enabled, so an automaton whose every outgoing transition can
+fire at once is independent of the rest: when the cut of a zone has such an automaton firing, only its transitions
+are followed (a partial order reduction). When a successor found this way is included in a zone passed no deeper in
+the search, the state may be on a cycle the reduction never leaves, so it is expanded again in full. Each symbolic
+state keeps the transition that led to it, so a deadlock or an end state comes with the trace that reaches it.
+A deadlock is a symbolic state with clock values from which nothing can ever fire, every clock past the windows of
+its automaton, and not every automaton is in its end state. The search stops at the first deadlock unless asked to
+go on, and at _max_states symbolic states.
+
+NumPy is needed.
+"""
+
+import math
+import time
+
+from collections import namedtuple, deque
+from fractions import Fraction
+
+from log import log, INFO, WARNING
+from instrument import phase_start, phase_end, count
+from Simulator import SimulationNetwork, compile_network, _internal, _send, _receive
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+VerificationResult = namedtuple('VerificationResult', ['deadlock', 'deadlock_trace', 'unreachable', 'end_traces',
+                                                       'explored', 'stored', 'complete', 'seconds'])
+# deadlock: None, or the state each automaton is in at the first deadlock found, by automaton label
+# deadlock_trace: the transitions to the deadlock as (automaton label, Transition), None without a deadlock
+# unreachable: labels of the automata whose end state was never reached, only certain when complete
+# end_traces: the transitions to the first state found with each automaton in its end state, by automaton label
+# explored: symbolic states taken off the waiting list, stored: zones kept in the passed list
+# complete: False when the search stopped before it had seen every state, at a deadlock or at _max_states
+
+_default_max_states = 1000000
+# the bound of no constraint, larger than any sum of two real bounds
+_infinity = 1 << 60
+# 0 <=
+_zero = 1
+
+
+def _bound(_constant, _closed):
+    return 2 * _constant + (1 if _closed else 0)
+
+
+# the sum of two bounds, or of arrays of them
+# a sum with _infinity is only cut back to it when larger, _normalise makes it _infinity again
+def _add(_a, _b):
+    return np.minimum(((_a & ~1) + (_b & ~1)) | (_a & _b & 1), _infinity)
+
+
+# _add for two single bounds, without NumPy
+def _add_bounds(_a, _b):
+    return min(((_a & ~1) + (_b & ~1)) | (_a & _b & 1), _infinity)
+
+
+def _normalise(_zone):
+    return np.where(_zone >= _infinity // 2, _infinity, _zone)
+
+
+# the canonical form, every bound as tight as the others allow
+# each step goes through every clock k at once, min over k of [i][k] + [k][j], so after s steps the bounds are those of
+# paths of up to 2^s differences, and it stops when a step changes nothing
+def _close(_zone):
+    for _step in range(max(1, (len(_zone) - 1).bit_length())):
+        _closed = np.minimum(_zone, _add(_zone[:, :, None], _zone[None, :, :]).min(axis=1))
+        if np.array_equal(_closed, _zone):
+            break
+        _zone = _closed
+    return _normalise(_zone)
+
+
+# the canonical zone with clock i - clock j < or <= _bound added, None when that leaves it empty
+def _constrain(_zone, i, j, _new_bound):
+    if _new_bound >= _zone[i, j]:
+        return _zone
+    if _add_bounds(_new_bound, int(_zone[j, i])) < _zero:
+        return None
+    return _normalise(np.minimum(_zone, _add(_add(_zone[:, i, None], _new_bound), _zone[None, j, :])))
+
+
+def _reset(_zone, i):
+    _zone = _zone.copy()
+    _zone[i, :] = _zone[0, :]
+    _zone[:, i] = _zone[:, 0]
+    _zone[i, i] = _zero
+    return _zone
+
+
+# lets time pass, no clock has an upper bound any more
+def _up(_zone):
+    _zone = _zone.copy()
+    _zone[1:, 0] = _infinity
+    return _zone
+
+
+# the bound of the opposite constraint, x_j - x_i, for the values that break x_i - x_j with _new_bound
+def _complement(_new_bound):
+    return 1 - _new_bound
+
+
+# Extra+ LU, _lows and _highs are the bounds of the largest constant each clock is compared with from below (x > c)
+# and from above (x < c), as 2 * c + 1, with -_infinity for a clock never compared that way
+def _extrapolate(_zone, _lows, _highs):
+    # clocks above all their lower bound constants, as rows and as columns
+    _high_rows = (_zone[0, :] < 2 - _lows)[:, None]
+    _high_columns = (_zone[0, :] < 2 - _highs)[None, :]
+    _drop = (_zone > _lows[:, None]) | _high_rows | _high_columns
+    _drop[0, :] = False
+    _extrapolated = np.where(_drop, _infinity, _zone)
+    _extrapolated[0, :] = np.where(_high_columns[0], np.minimum(1 - _highs, _zero), _zone[0, :])
+    np.fill_diagonal(_extrapolated, _zero)
+    if np.array_equal(_extrapolated, _zone):
+        return _zone
+    return _close(_extrapolated)
+
+
+# the network's transitions as what the zones need: the windows as (lower bound on -x, upper bound on x or None), the
+# lower bound always <=, and the constants of the extrapolation for each state of each automaton
+class _ZoneNetwork:
+    __slots__ = ('network', 'outgoing', 'windows', 'state_lows', 'state_highs', 'bounds', 'firing', 'size')
+
+    def __init__(self, _network):
+        self.network = _network
+        _count = len(_network.labels)
+        self.size = _count + 1
+        _values = [_value for _windows in _network.windows for _window in _windows
+                   for _value in (_window.low, _window.high) if _value != math.inf]
+        # the least common multiple of the denominators
+        _scale = 1
+        for _value in _values:
+            _denominator = Fraction(repr(_value)).denominator
+            _scale = _scale * _denominator // math.gcd(_scale, _denominator)
+
+        def _scaled(_value):
+            return int(Fraction(repr(_value)) * _scale)
+
+        self.outgoing = {}
+        self.windows = []
+        # the largest constants of each transition's own guard
+        _transition_lows = []
+        _transition_highs = []
+        for t, _windows in enumerate(_network.windows):
+            self.outgoing.setdefault((_network.owner[t], _network.source[t]), []).append(t)
+            _scaled_windows = []
+            _transition_low = _transition_high = -_infinity
+            for _window in _windows:
+                _low = _bound(-_scaled(_window.low), True)
+                _high = None if _window.high == math.inf else _bound(_scaled(_window.high), _window.high_closed)
+                _scaled_windows.append((_low, _high))
+                if _window.low > 0 or not _window.low_closed:
+                    _transition_low = max(_transition_low, _bound(_scaled(_window.low), True))
+                if _high is not None:
+                    _transition_high = max(_transition_high, _bound(_scaled(_window.high), True))
+            self.windows.append(_scaled_windows)
+            _transition_lows.append(_transition_low)
+            _transition_highs.append(_transition_high)
+
+        # a state's constants are those of its guards and those of the states after it while x is not reset
+        self.state_lows = {}
+        self.state_highs = {}
+        _changed = True
+        while _changed:
+            _changed = False
+            for t in range(len(_network.transitions)):
+                _source = (_network.owner[t], _network.source[t])
+                _target = (_network.owner[t], _network.target[t])
+                _low, _high = _transition_lows[t], _transition_highs[t]
+                if not _network.reset[t]:
+                    _low = max(_low, self.state_lows.get(_target, -_infinity))
+                    _high = max(_high, self.state_highs.get(_target, -_infinity))
+                if _low > self.state_lows.get(_source, -_infinity):
+                    self.state_lows[_source] = _low
+                    _changed = True
+                if _high > self.state_highs.get(_source, -_infinity):
+                    self.state_highs[_source] = _high
+                    _changed = True
+        self.bounds = {}
+        self.firing = {}
+
+    # the constants of the extrapolation for the states the automata are in, the largest of each clock's lower and
+    # upper bound constants, clock 0 is compared with 0
+    def bounds_of(self, _locations):
+        _bounds = self.bounds.get(_locations)
+        if _bounds is None:
+            _bounds = self.bounds[_locations] = np.array(
+                [_zero] + [max(self.state_lows.get((i, _location), -_infinity),
+                               self.state_highs.get((i, _location), -_infinity))
+                           for i, _location in enumerate(_locations)], dtype=np.int64)
+        return _bounds
+
+    # for each automaton, the transitions it can fire in the state, those whose communication can happen, the windows
+    # of the clock they fire in, merged and in order, and whether that is every transition of its state
+    # then the automata in the order _zone_parts looks at them, those that can take every transition first
+    def firing_of(self, _state):
+        _firing = self.firing.get(_state)
+        if _firing is None:
+            _locations, _buffers = _state
+            _windows = []
+            for i, _location in enumerate(_locations):
+                _outgoing = self.outgoing.get((i, _location), ())
+                _ready = [t for t in _outgoing if _communication_ready(self.network, t, _buffers)]
+                _windows.append((_ready, _merge_windows([_window for t in _ready for _window in self.windows[t]]),
+                                 len(_ready) == len(_outgoing)))
+            _order = sorted(range(len(_locations)), key=lambda i: not _windows[i][2])
+            _firing = self.firing[_state] = (_windows, _order)
+        return _firing
+
+
+# windows as (lower bound on -x, upper bound on x or None), the union of those that overlap or meet
+def _merge_windows(_windows):
+    _merged = []
+    for _low, _high in sorted(_windows, key=lambda _window: -_window[0]):
+        if _merged and (_merged[-1][1] is None or _add_bounds(_low, _merged[-1][1]) >= _zero):
+            if _merged[-1][1] is not None and (_high is None or _high > _merged[-1][1]):
+                _merged[-1] = (_merged[-1][0], _high)
+        else:
+            _merged.append((_low, _high))
+    return _merged
+
+
+def verify_network(_automata, _capacity=None, _max_states=_default_max_states, _stop_at_deadlock=True, _reduce=True):
+    if np is None:
+        raise ImportError('verify_network needs numpy')
+    _timer = phase_start()
+    _start = time.perf_counter()
+    _network = _automata if isinstance(_automata, SimulationNetwork) else compile_network(_automata, _capacity)
+    _zones = _ZoneNetwork(_network)
+    _count = len(_network.labels)
+    log(lambda: 'verifying ' + str(_count) + ' automata, ' + str(len(_network.transitions)) + ' transitions', 1, INFO)
+
+    # symbolic states by number, for the traces, and how many steps from the initial state each was found
+    _parents = [-1]
+    _steps = [None]
+    _depths = [0]
+    # the zones passed for each state of the automata and channels, stacked in one array, and their numbers
+    _passed = {}
+    _passed_nodes = {}
+    # waiting symbolic states whose zones were included in later ones
+    _covered = set()
+    _unreached = {i for i in range(_count) if _network.initial[i] != _network.end[i]}
+    _end_nodes = {i: 0 for i in range(_count) if i not in _unreached}
+    _deadlock = None
+    _deadlock_state = None
+    _explored = 0
+
+    _initial = (tuple(_network.initial), (0,) * len(_network.channels))
+    _initial_zone = np.full((_zones.size, _zones.size), _zero, dtype=np.int64)
+    _passed[_initial] = _initial_zone[None]
+    _passed_nodes[_initial] = [0]
+    _waiting = deque()
+    if not _stuck(_zones, _initial, _initial_zone):
+        _waiting.append((0, _initial, _initial_zone))
+    else:
+        _deadlock, _deadlock_state = 0, _initial
+
+    while _waiting and (_deadlock is None or not _stop_at_deadlock):
+        if len(_parents) >= _max_states:
+            break
+        _node, _state, _zone = _waiting.popleft()
+        if _node in _covered:
+            _covered.discard(_node)
+            continue
+        _explored += 1
+        # a reduced expansion that leads back to a state found no later than this one may be part of a cycle that keeps
+        # putting the other automata off, the state is then expanded again in full
+        for _reduced in ((True, False) if _reduce else (False,)):
+            _revisited = False
+            for t, _next_state, _next_zone, _ample in _successors(_zones, _state, _zone, _reduced):
+                _is_stuck = _stuck(_zones, _next_state, _next_zone)
+                _passed_zones = _passed.get(_next_state)
+                if not _is_stuck and _passed_zones is not None:
+                    # dropped if a zone passed for the same states includes it, and it replaces those it includes
+                    _including = np.all(_next_zone <= _passed_zones, axis=(1, 2))
+                    if np.any(_including):
+                        _revisited = _revisited or (_ample and min(
+                            _depths[_passed_node] for _passed_node, _is_including
+                            in zip(_passed_nodes[_next_state], _including) if _is_including) <= _depths[_node])
+                        continue
+                    _included = np.all(_passed_zones <= _next_zone, axis=(1, 2))
+                    if np.any(_included):
+                        _covered.update(_passed_node for _passed_node, _is_included
+                                        in zip(_passed_nodes[_next_state], _included) if _is_included)
+                        _passed_zones = _passed_zones[~_included]
+                        _passed_nodes[_next_state] = [_passed_node for _passed_node, _is_included
+                                                      in zip(_passed_nodes[_next_state], _included) if not _is_included]
+                _parents.append(_node)
+                _steps.append(t)
+                _depths.append(_depths[_node] + 1)
+                _next_node = len(_parents) - 1
+                for i in [i for i in _unreached if _next_state[0][i] == _network.end[i]]:
+                    _unreached.discard(i)
+                    _end_nodes[i] = _next_node
+                if _is_stuck:
+                    if _deadlock is None:
+                        log(lambda: 'deadlock after ' + str(_explored) + ' symbolic states', 0, WARNING)
+                        _deadlock, _deadlock_state = _next_node, _next_state
+                    if _stop_at_deadlock:
+                        break
+                    continue
+                if _passed_zones is None:
+                    _passed[_next_state] = _next_zone[None]
+                    _passed_nodes[_next_state] = [_next_node]
+                else:
+                    _passed[_next_state] = np.concatenate((_passed_zones, _next_zone[None]))
+                    _passed_nodes[_next_state].append(_next_node)
+                _waiting.append((_next_node, _next_state, _next_zone))
+            if not _revisited or (_deadlock is not None and _stop_at_deadlock):
+                break
+
+    _stored = sum(len(_passed_zones) for _passed_zones in _passed.values())
+    _complete = (all(_node in _covered for _node, _state, _zone in _waiting)
+                 and (_deadlock is None or not _stop_at_deadlock))
+    _result = VerificationResult(
+        None if _deadlock is None else {_network.labels[i]: _network.states[i].label(_deadlock_state[0][i])
+                                        for i in range(_count)},
+        None if _deadlock is None else _trace(_network, _parents, _steps, _deadlock),
+        [_network.labels[i] for i in sorted(_unreached)],
+        {_network.labels[i]: _trace(_network, _parents, _steps, _end_node) for i, _end_node in _end_nodes.items()},
+        _explored, _stored, _complete, time.perf_counter() - _start)
+    count('symbolic states explored', _explored)
+    phase_end('verify', _timer)
+    log(lambda: 'explored ' + str(_explored) + ' symbolic states, ' + str(_stored) + ' zones passed'
+        + ('' if _complete else ' (stopped early)'), -1, INFO)
+    return _result
+
+
+def _completed(_network, _state):
+    return all(_location == _end for _location, _end in zip(_state[0], _network.end))
+
+
+# whether the channel lets transition t happen, with the channel's messages given
+def _communication_ready(_network, t, _buffers):
+    _kind = _network.kind[t]
+    if _kind == _send:
+        return _buffers[_network.channel[t]] < _network.capacities[_network.channel[t]]
+    if _kind == _receive:
+        return _buffers[_network.channel[t]] > 0
+    return True
+
+
+# whether some clock values of the zone can never fire anything, every clock past the windows of its automaton, when
+# not every automaton is in its end state
+def _stuck(_zones, _state, _zone):
+    if _completed(_zones.network, _state):
+        return False
+    for i, (_ready, _windows, _all_ready) in enumerate(_zones.firing_of(_state)[0]):
+        if not _windows:
+            continue
+        _high = _windows[-1][1]
+        if _high is None:
+            return False
+        _zone = _constrain(_zone, 0, i + 1, _complement(_high))
+        if _zone is None:
+            return False
+    return True
+
+
+# the parts of the zone by where each clock is against the windows of its automaton, as (part, the automaton whose
+# clock is in a window or None, [(clock, upper bound of the time before its next window)])
+# the automata are looked at in _order, a part with a clock in a window fires at once, so the clocks after it need not
+# cut it
+def _zone_parts(_zone, _windows, _order):
+    _parts = [(_zone, None, ())]
+    for i in _order:
+        _automaton_windows = _windows[i][1]
+        if not _automaton_windows:
+            continue
+        _cut = []
+        for _part, _inside, _waits in _parts:
+            if _inside is not None:
+                _cut.append((_part, _inside, _waits))
+                continue
+            _previous = None
+            for _low, _high in _automaton_windows:
+                # before the window, after the one before it
+                _before = _constrain(_part, i + 1, 0, _complement(_low))
+                if _before is not None and _previous is not None:
+                    _before = _constrain(_before, 0, i + 1, _complement(_previous))
+                if _before is not None:
+                    _cut.append((_before, None, _waits + ((i + 1, _complement(_low) | 1),)))
+                _in = _constrain(_part, 0, i + 1, _low)
+                if _in is not None and _high is not None:
+                    _in = _constrain(_in, i + 1, 0, _high)
+                if _in is not None:
+                    _cut.append((_in, i, _waits))
+                _previous = _high
+            if _previous is not None:
+                _after = _constrain(_part, 0, i + 1, _complement(_previous))
+                if _after is not None:
+                    _cut.append((_after, None, _waits))
+        _parts = _cut
+    return _parts
+
+
+# the symbolic states after each transition and window that can fire first from the zone the state is entered with,
+# as (transition, state, zone, whether the transitions of the other automata were left out)
+# with _reduce, where the clock of an automaton that can take every transition of its state is in a window, only its
+# transitions fire (a partial order reduction). Nothing the others do changes what it can do: a channel has one sender
+# and one receiver, and a send and a receive on it that can both happen can happen in either order. Time cannot pass
+# before it fires, so firing it first leaves every run of the others open.
+def _successors(_zones, _state, _zone, _reduce=True):
+    _windows, _order = _zones.firing_of(_state)
+    for _part, _inside, _waits in _zone_parts(_zone, _windows, _order):
+        if _inside is not None:
+            yield from _fire(_zones, _state, _part, _inside, _reduce)
+        elif _waits:
+            # time passes until the first clock reaches its window, then the zone is cut again by who fires
+            _part = _up(_part)
+            for _clock, _wait in _waits:
+                _part = _constrain(_part, _clock, 0, _wait)
+            for _delayed, _delayed_inside, _delayed_waits in _zone_parts(_part, _windows, _order):
+                if _delayed_inside is not None:
+                    yield from _fire(_zones, _state, _delayed, _delayed_inside, _reduce)
+        # otherwise nothing will fire, the deadlock _stuck found
+
+
+# the successors of a part of the zone where the clock of automaton _inside is in a window
+def _fire(_zones, _state, _part, _inside, _reduce):
+    _network = _zones.network
+    _locations, _buffers = _state
+    _windows = _zones.firing_of(_state)[0]
+    _ample = _reduce and _windows[_inside][2]
+    for i in ([_inside] if _ample else range(len(_locations))):
+        for t in _windows[i][0]:
+            _next_locations = _locations[:i] + (_network.target[t],) + _locations[i + 1:]
+            _next_buffers = _buffers
+            if _network.kind[t] != _internal:
+                _channel = _network.channel[t]
+                _next_buffers = (_buffers[:_channel]
+                                 + (_buffers[_channel] + (1 if _network.kind[t] == _send else -1),)
+                                 + _buffers[_channel + 1:])
+            for _low, _high in _zones.windows[t]:
+                _next_zone = _constrain(_part, 0, i + 1, _low)
+                if _next_zone is not None and _high is not None:
+                    _next_zone = _constrain(_next_zone, i + 1, 0, _high)
+                if _next_zone is None:
+                    continue
+                if _network.reset[t]:
+                    _next_zone = _reset(_next_zone, i + 1)
+                _bounds = _zones.bounds_of(_next_locations)
+                _next_zone = _extrapolate(_next_zone, _bounds, _bounds)
+                yield t, (_next_locations, _next_buffers), _next_zone, _ample
+
+
+def _trace(_network, _parents, _steps, _node):
+    _trace_list = []
+    while _node > 0:
+        t = _steps[_node]
+        _trace_list.append((_network.labels[_network.owner[t]], _network.transitions[t]))
+        _node = _parents[_node]
+    _trace_list.reverse()
+    return _trace_list
+
+
+def verification_passed(_result):
+    return _result.deadlock is None and not _result.unreachable and _result.complete
+
+
+def format_trace(_trace):
+    return '\n'.join('  ' + _label + ': ' + c.start_state + ' ' + _format_communication(c) + '('
+                     + c.condition + (',{x}' if c.reset_x else '') + ') ' + c.end_state for _label, c in _trace)
+
+
+def _format_communication(c):
+    _type, _content, _other = c.communication_details
+    if _content == '' and _other == '':
+        return ''
+    return _other + ('!' if 'send' in _type else '?') + _content
+
+
+def format_verification(_result):
+    _lines = []
+    if _result.deadlock is not None:
+        _lines.append('deadlock with the automata in ' + ', '.join(_label + ': ' + _state for _label, _state
+                                                                    in _result.deadlock.items()) + ', reached by:')
+        _lines.append(format_trace(_result.deadlock_trace) if _result.deadlock_trace else '  (the initial state)')
+    if _result.complete:
+        for _label in _result.unreachable:
+            _lines.append('the end state of ' + _label + ' can never be reached')
+    elif _result.deadlock is None:
+        _lines.append('stopped after ' + str(_result.explored) + ' symbolic states, the search is not complete')
+    elif _result.unreachable:
+        _lines.append('the search stopped at the deadlock, before reaching the end state of '
+                      + ', '.join(_result.unreachable))
+    if not _lines:
+        _lines.append('no deadlock, every end state can be reached')
+    _lines.append('(' + str(_result.explored) + ' symbolic states explored, ' + str(_result.stored)
+                  + ' zones passed, ' + format(_result.seconds, '.3f') + 's)')
+    return '\n'.join(_lines)
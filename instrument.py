@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""Instrument
+
+Keeps track of where the time goes in a compile, like log does for the messages.
+Off by default, and then each call returns straight away.
+
+Phases are timed in wall and CPU time, each is added up over its calls and, when an automaton is given, per automaton:
+    _start = phase_start()
+    ...
+    phase_end('parse', _start, a.label)
+Counters are added to with count('transitions', n).
+With memory on, tracemalloc runs from configure_instrument and the report has its peak, this slows the compile down.
+report() gives it all as a dictionary, write_report() as JSON.
+
+The phases recorded are parse (Cta_Loader), guards (Guard_compiler), minimise (Automata_minimiser),
+verify (Zone_verifier), channels (Channel_topology), head, main and generate (Golang_generator) and write (File_writer).
+Writing a generator of pieces also runs the generation, so write only counts the writing itself.
+With more than one worker the functions are generated in other processes, and generate is the time spent waiting for
+each of them.
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # not on windows, the report leaves out the resident memory
+    resource = None
+
+_enabled = False
+_memory = False
+_started = None
+_phases = {}
+_automata = {}
+_counters = {}
+
+
+# switches the instruments on or off, and clears what was recorded
+def configure_instrument(_enable=True, _trace_memory=False):
+    global _enabled, _memory, _started
+    if _memory:
+        tracemalloc.stop()
+    _enabled = _enable
+    _memory = _enable and _trace_memory
+    _phases.clear()
+    _automata.clear()
+    _counters.clear()
+    _started = (time.perf_counter(), time.process_time()) if _enable else None
+    if _memory:
+        tracemalloc.start()
+
+
+def instrument_enabled():
+    return _enabled
+
+
+# the point a phase starts at, None when the instruments are off
+def phase_start():
+    if not _enabled:
+        return None
+    return time.perf_counter(), time.process_time()
+
+
+# adds the time since _start to the phase, and to the automaton's part of it when one is given
+def phase_end(_phase, _start, _automata_label=None):
+    if _start is None:
+        return
+    _wall = time.perf_counter() - _start[0]
+    _cpu = time.process_time() - _start[1]
+    _add(_phases, _phase, _wall, _cpu)
+    if _automata_label is not None:
+        _add(_automata.setdefault(str(_automata_label), {}), _phase, _wall, _cpu)
+
+
+def _add(_table, _phase, _wall, _cpu):
+    _times = _table.get(_phase)
+    if _times is None:
+        _table[_phase] = [_wall, _cpu, 1]
+    else:
+        _times[0] += _wall
+        _times[1] += _cpu
+        _times[2] += 1
+
+
+def count(_counter, _amount=1):
+    if _enabled:
+        _counters[_counter] = _counters.get(_counter, 0) + _amount
+
+
+def report():
+    _report = {'phases': {_phase: _times_dictionary(_times) for _phase, _times in _phases.items()},
+               'automata': {_label: {_phase: _times_dictionary(_times) for _phase, _times in _times_of.items()}
+                            for _label, _times_of in _automata.items()},
+               'counters': dict(_counters),
+               'memory': {}}
+    if _started is not None:
+        _report['wall'] = time.perf_counter() - _started[0]
+        _report['cpu'] = time.process_time() - _started[1]
+    if resource is not None:
+        _report['memory']['max_rss_bytes'] = _max_rss()
+    if _memory:
+        _report['memory']['tracemalloc_peak_bytes'] = tracemalloc.get_traced_memory()[1]
+    return _report
+
+
+def _times_dictionary(_times):
+    return {'wall': _times[0], 'cpu': _times[1], 'calls': _times[2]}
+
+
+# the most memory the process has held, ru_maxrss is in kilobytes on linux and bytes on macos
+def _max_rss():
+    _rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return _rss if sys.platform == 'darwin' else _rss * 1024
+
+
+def write_report(_file):
+    with open(_file, 'w') as _report_file:
+        json.dump(report(), _report_file, indent=1)
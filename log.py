@@ -3,15 +3,80 @@
 """Log
 
 this is for debugging purposes. helps me keep track of console debug messages.
+
+Messages have a level and are only built and written when that level is enabled.
+The message can be given as a callable returning the string, so the work of building it is skipped when the level is off.
+    log(lambda: 'automata: ' + str(_au))
+Call sites in hot loops can check log_enabled() first to skip even the call.
+With a log file configured, each message is written to it as one JSON object per line instead of printed.
 """
 
+import json
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+_level_names = {DEBUG: 'debug', INFO: 'info', WARNING: 'warning', ERROR: 'error', OFF: 'off'}
+_level_values = {_name: _level for _level, _name in _level_names.items()}
+
+_log_level = INFO
+_log_file = None
+_log_file_owned = False
+
 # -1 out a layer, 0 in a layer and 1 no change
 _log_indent = 1
-def log(_string = '', _indent = 0):
+
+
+# sets the lowest level that is written, and where to write it (None for the console)
+# the file can be a path or anything with a write method
+def configure_log(_level=INFO, _file=None):
+    global _log_level, _log_file, _log_file_owned, _log_indent
+    if _log_file_owned:
+        _log_file.close()
+    if isinstance(_level, str):
+        _level = level_from_name(_level)
+    _log_level = _level
+    _log_file_owned = isinstance(_file, str)
+    _log_file = open(_file, 'a') if _log_file_owned else _file
+    _log_indent = 1
+
+
+def level_from_name(_name):
+    if _name.lower() not in _level_values:
+        raise ValueError('unknown log level: ' + _name + ' (choose from ' + ', '.join(_level_values) + ')')
+    return _level_values[_name.lower()]
+
+
+def log_enabled(_level=DEBUG):
+    return _level >= _log_level
+
+
+def log(_string = '', _indent = 0, _level = DEBUG):
     global _log_indent
+    if _level < _log_level:
+        # nothing is built, only the layer is kept track of
+        _log_indent += _indent
+        return
     if _indent < 0:
         _log_indent += _indent
+    if callable(_string):
+        _string = _string()
     if _string != '':
-        print((' |' * _log_indent) + ': ' + _string)
+        if _log_file is None:
+            print((' |' * _log_indent) + ': ' + _string)
+        else:
+            _log_file.write(json.dumps({'time': time.time(),
+                                        'level': _level_names.get(_level, str(_level)),
+                                        'depth': _log_indent,
+                                        'message': _string}) + '\n')
     if _indent > 0:
-        _log_indent += _indent
\ No newline at end of file
+        _log_indent += _indent
+
+
+# closes the log file if it was opened from a path, messages go back to the console
+def close_log():
+    configure_log(_log_level, None)
@@ -1,15 +1,110 @@
 #!/usr/bin/env python3
 
-from Cta_Loader import load_automata
-from Golang_generator import generate_go_lang
-from File_writer import write_golang
+from Cta_Loader import load_automata, load_compact_automata, iter_automata_file
+from Golang_generator import iter_go_lang, iter_go_lang_stream, generate_go_benchmark, go_function, go_functions, \
+    iter_go_files, go_identifier, automata_topology
+from File_writer import write_golang, write_go_files, go_module
+from Guard_compiler import compile_guards, iter_compile_guards
+from Automata_minimiser import minimise_automata, iter_minimise_automata
+from Compile_cache import CompileCache, compile_notation, compile_functions
+from Zone_verifier import verify_network, verification_passed, format_verification
 import Automata_Structures
+from log import configure_log
+from instrument import configure_instrument, write_report
 # for using console/shell:
+import argparse
+import atexit
+import cProfile
+import os
 import sys
+from itertools import chain
 
+_parser = argparse.ArgumentParser(description='Generates Go from CTA notation.')
+_parser.add_argument('notation', nargs='*', help='CTA notation, defaults to the examples below')
+_parser.add_argument('--file', default=None,
+                     help='read the notation from this spec file an automaton at a time, for specs too large to hold')
+_parser.add_argument('--log-level', default='info', help='debug, info, warning, error or off')
+_parser.add_argument('--log-file', default=None, help='write the log to this file as JSON lines')
+_parser.add_argument('--timing', default='poll', choices=['poll', 'event'],
+                     help='poll: goroutines loop on a global clock, event: goroutines block until a guard or channel is ready')
+_parser.add_argument('--int-states', action='store_true',
+                     help='integer state constants and a preallocated buffer for the enabled transitions')
+_parser.add_argument('--go-benchmark', action='store_true',
+                     help='also write golang_automata_test.go, a go test -bench file for the per step cost (needs --int-states)')
+_parser.add_argument('--metrics', action='store_true',
+                     help='the program keeps per transition metrics and writes them to a file or serves them as expvar '
+                          '(needs --timing event)')
+_parser.add_argument('--compile-guards', action='store_true',
+                     help='normalise the guards, drop transitions that can never fire and emit the cheapest checks')
+_parser.add_argument('--minimise', action='store_true',
+                     help='remove unreachable states and merge equivalent ones before generating')
+_parser.add_argument('--verify', action='store_true',
+                     help='check the network for deadlocks and end states that cannot be reached, no Go is written if it fails')
+_parser.add_argument('--verify-states', type=int, default=1000000,
+                     help='the most symbolic states --verify explores before giving up')
+_parser.add_argument('--split', default=None,
+                     help='write the program into this directory a file per automaton, only the files that changed')
+_parser.add_argument('--split-packages', type=int, default=0,
+                     help='with --split, spread the automata over this many go packages that build and cache apart '
+                          '(needs --timing event)')
+_parser.add_argument('--compact', action='store_true',
+                     help='hold the automata as interned arrays (CompactAutomata), for very large automata '
+                          '(needs --no-cache or --file)')
+_parser.add_argument('--no-cache', action='store_true', help='parse and generate every automaton again')
+_parser.add_argument('--cache-dir', default='.cta_cache', help='where the compile cache is kept')
+_parser.add_argument('--cache-size', type=int, default=64, help='size limit of the compile cache in MB')
+_parser.add_argument('--workers', type=int, default=1,
+                     help='generate the automata functions in this many processes, 0 for one per core')
+_parser.add_argument('--profile', default=None,
+                     help='write the time of each phase and automaton, counters and peak memory to this file as JSON')
+_parser.add_argument('--profile-memory', action='store_true',
+                     help='add the tracemalloc peak to the profile, this slows the compile down')
+_parser.add_argument('--cprofile', default=None,
+                     help='write cProfile stats of the compile to this file, for pstats, snakeviz or flameprof')
+_arguments = _parser.parse_args()
+if _arguments.workers < 0:
+    _parser.error('--workers cannot be negative')
+if _arguments.file is not None and _arguments.notation:
+    _parser.error('give the notation either as arguments or with --file')
+if _arguments.metrics and _arguments.timing != 'event':
+    _parser.error('--metrics needs --timing event')
+if _arguments.go_benchmark and not _arguments.int_states:
+    _parser.error('--go-benchmark needs --int-states')
+if _arguments.verify_states < 1:
+    _parser.error('--verify-states must be at least 1')
+if _arguments.compact and not (_arguments.no_cache or _arguments.file is not None):
+    _parser.error('--compact needs --no-cache or --file')
+if _arguments.split_packages < 0:
+    _parser.error('--split-packages cannot be negative')
+if _arguments.split_packages and _arguments.split is None:
+    _parser.error('--split-packages needs --split')
+if _arguments.split_packages and _arguments.timing != 'event':
+    _parser.error('--split-packages needs --timing event')
+if _arguments.split_packages and (_arguments.metrics or _arguments.go_benchmark):
+    _parser.error('--split-packages does not go with --metrics or --go-benchmark')
+configure_log(_arguments.log_level, _arguments.log_file)
+if _arguments.profile_memory and _arguments.profile is None:
+    _parser.error('--profile-memory needs --profile')
+if _arguments.profile is not None:
+    configure_instrument(True, _arguments.profile_memory)
+if _arguments.cprofile is not None:
+    _cprofile = cProfile.Profile()
+    _cprofile.enable()
+
+# the profiles are written however the run ends, a run stopped by a failed verification is worth profiling too
+def _write_profiles():
+    if _arguments.cprofile is not None:
+        _cprofile.disable()
+        _cprofile.dump_stats(_arguments.cprofile)
+    if _arguments.profile is not None:
+        write_report(_arguments.profile)
+
+atexit.register(_write_profiles)
 
 # check if this has been run from shell
-if len(sys.argv) < 2:
+if _arguments.file is not None:
+    print('will run the program on the spec file ' + _arguments.file + '\n Starting...')
+elif not _arguments.notation:
     print('no arguments given, will use the defaults.')
     # _automata_array = ['Init u0;u0 UW!int(x < 10,{x}) u1;u1 AU?string(x <= 200) u2;']
     # _automata_array = ['Init u0;u0 UW!int(x < 10,{x}) u1;u1 AU?string(x <= 200) u2;',
@@ -23,15 +118,101 @@ if len(sys.argv) < 2:
     # _automata_array = ['Cta A = Init a0;a0 B?string(true) a1;', 'Cta B = Init b0;b0 A!string(true) b1;']
     # _automata_array = ['Cta A = Init a0;a0 (x = 5) a1;']
 else:
-    print('will run the program with the following arguments:' + '\n'.join(sys.argv) + '\n Starting...')
-    _automata_array = sys.argv
-
-# load notation into automata structures
-_automata_list = load_automata(''.join(_automata_array))
-# generate golang code from automata structures
-_golang_line = generate_go_lang(_automata_list,_automata_array)
-# write golang code to file
-write_golang(_golang_line)
+    print('will run the program with the following arguments:' + '\n'.join(_arguments.notation) + '\n Starting...')
+    _automata_array = _arguments.notation
+
+# checks the network before any Go is written, and stops if it can deadlock or an end state cannot be reached
+# the channels have the places the generated Go gives them
+def _verify(_automata):
+    try:
+        _result = verify_network(_automata, automata_topology(_automata, _arguments.timing), _arguments.verify_states)
+    except (ValueError, ImportError) as _exception:
+        print('cannot verify the network: ' + str(_exception))
+        sys.exit(1)
+    print(format_verification(_result))
+    if not verification_passed(_result):
+        print('verification failed, no Go written')
+        sys.exit(1)
+
+# writes the functions and the rest of the program as files into the --split directory
+# _read_benchmark_automata gives the automata for golang_automata_test.go, only called after the functions are written
+def _write_split(_pairs, _read_benchmark_automata):
+    _module = _module_file = None
+    if _arguments.split_packages:
+        _module, _module_file = go_module(_arguments.split,
+                                          go_identifier(os.path.basename(os.path.abspath(_arguments.split))))
+    _files = iter_go_files(_pairs, _arguments.timing, _arguments.metrics, _arguments.split_packages, _module)
+    if _module_file is not None:
+        _files = chain([('go.mod', _module_file)], _files)
+    if _arguments.go_benchmark:
+        _files = chain(_files, _benchmark_file(_read_benchmark_automata))
+    write_go_files(_files, _arguments.split)
+
+def _benchmark_file(_read_automata):
+    yield 'golang_automata_test.go', generate_go_benchmark(_read_automata(), _arguments.timing)
+
+if _arguments.file is not None:
+    _reads = []
+    # the file is read again each time, so the automata are never all held at once
+    def _read_automata():
+        _automata = iter_automata_file(_arguments.file, _compact=_arguments.compact)
+        if _arguments.compile_guards:
+            # dropped transitions are only logged the first time through
+            _automata = iter_compile_guards(_automata, _arguments.timing == 'poll', None, len(_reads) > 0)
+        if _arguments.minimise:
+            _automata = iter_minimise_automata(_automata, _arguments.timing == 'poll', None, len(_reads) > 0)
+        _reads.append(_arguments.file)
+        return _automata
+    if _arguments.verify:
+        _verify(list(_read_automata()))
+    if _arguments.split is not None:
+        # each function is written as it is generated, the file is read once more for the benchmark
+        _write_split(((a, go_function(a, _arguments.timing, _arguments.int_states, _arguments.metrics))
+                      for a in _read_automata()), _read_automata)
+    else:
+        write_golang(iter_go_lang_stream(_read_automata, _arguments.timing, _arguments.int_states, _arguments.metrics))
+    if _arguments.go_benchmark and _arguments.split is None:
+        write_golang([generate_go_benchmark(_read_automata(), _arguments.timing)], 'golang_automata_test.go')
+elif _arguments.no_cache:
+    # load notation into automata structures
+    if _arguments.compact:
+        _automata_list = load_compact_automata(''.join(_automata_array))
+    else:
+        _automata_list = load_automata(''.join(_automata_array))
+    if _arguments.compile_guards:
+        # the poll timing counts whole seconds
+        _automata_list, _guard_reports = compile_guards(_automata_list, _arguments.timing == 'poll')
+    if _arguments.minimise:
+        _automata_list, _minimise_reports = minimise_automata(_automata_list, _arguments.timing == 'poll')
+    if _arguments.verify:
+        _verify(_automata_list)
+    # generate golang code from automata structures, written to the file as it is generated
+    if _arguments.split is not None:
+        _write_split(zip(_automata_list, go_functions(_automata_list, _arguments.timing, _arguments.int_states,
+                                                      _arguments.workers, _arguments.metrics)),
+                     lambda: _automata_list)
+    else:
+        write_golang(iter_go_lang(_automata_list,_automata_array,_arguments.timing,_arguments.int_states,
+                                  _arguments.workers,_arguments.metrics))
+elif _arguments.split is not None:
+    _cache = CompileCache(_arguments.cache_dir, _arguments.cache_size * 1024 * 1024)
+    _automata_list, _functions = compile_functions(_automata_array, _arguments.timing, _arguments.int_states,
+                                                   _arguments.compile_guards, _cache, _arguments.workers,
+                                                   _arguments.metrics, _arguments.minimise)
+    if _arguments.verify:
+        _verify(_automata_list)
+    _write_split(zip(_automata_list, _functions), lambda: _automata_list)
+else:
+    # only the automata that changed since the last run are parsed and generated
+    _cache = CompileCache(_arguments.cache_dir, _arguments.cache_size * 1024 * 1024)
+    _automata_list, _golang_pieces = compile_notation(_automata_array, _arguments.timing, _arguments.int_states,
+                                                      _arguments.compile_guards, _cache, _arguments.workers,
+                                                      _arguments.metrics, _arguments.minimise)
+    if _arguments.verify:
+        _verify(_automata_list)
+    write_golang(_golang_pieces)
+if _arguments.go_benchmark and _arguments.file is None and _arguments.split is None:
+    write_golang([generate_go_benchmark(_automata_list,_arguments.timing)], 'golang_automata_test.go')
 
 
 # other automata examples from the 2018 CTA refinement paper:
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules are at the top of the repository, run.py imports them from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
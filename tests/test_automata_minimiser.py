@@ -0,0 +1,59 @@
+from Cta_Loader import parse_single_automata
+from Automata_minimiser import minimise_single_automata, bisimulation_classes
+
+
+def _minimise(_text, _integer_clock=False):
+    return minimise_single_automata(parse_single_automata(_text), _integer_clock)
+
+
+def test_unreachable_states_are_removed():
+    _minimised, _report = _minimise('Cta A = Init a0;a0 B!int(x<1) a1;a2 B!int(x<1) a1;')
+    assert _minimised.state_list == ['a0', 'a1']
+    assert 'a2' not in _minimised.transition_dictionary
+    assert _report.unreachable == ['a2']
+    assert _report.removed_transitions == 1
+
+
+def test_bisimilar_states_are_merged():
+    # a1 and a2 both send once and end, a0's two transitions to them become one
+    _minimised, _report = _minimise('Cta A = Init a0;a0 B!int(x<1) a1;a0 B!int(x<1) a2;'
+                                    'a1 B!int(x<2) a3;a2 B!int(x<2) a3;')
+    assert _minimised.state_list == ['a0', 'a1', 'a3']
+    assert [c.end_state for c in _minimised.transition_dictionary['a0']] == ['a1']
+    assert 'a2' not in _minimised.transition_dictionary
+    assert _report.merged == ['a2']
+    assert _report.removed_transitions == 2
+
+
+def test_states_without_transitions_are_merged_but_not_with_the_end():
+    _minimised, _report = _minimise('Cta A = Init a0;a0 B!int(x<1) a1;a0 B!int(x<2) a2;a0 B!int(x<3) a3;')
+    assert _minimised.end_state == 'a3'
+    assert _minimised.state_list == ['a0', 'a1', 'a3']
+    assert _report.merged == ['a2']
+
+
+def test_guards_are_compared_as_windows():
+    _text = 'Cta A = Init a0;a0 B!int(x<1) a1;a0 B!int(x<1) a2;a1 B!int(x>=1 && x<2) a3;a2 B!int({}) a3;'
+    assert _minimise(_text.format('1<=x<2'))[1].merged == ['a2']
+    assert _minimise(_text.format('1<x<2'))[1].merged == []
+
+
+def test_integer_clock_merges_whole_number_equal_guards():
+    _text = 'Cta A = Init a0;a0 B!int(x<1) a1;a0 B!int(x<1) a2;a1 B!int(x<2) a3;a2 B!int(x<=1) a3;'
+    assert _minimise(_text)[1].merged == []
+    assert _minimise(_text, True)[1].merged == ['a2']
+
+
+def test_different_successors_split_the_class():
+    # a1 and a2 look alike but lead to states that do not
+    _minimised, _report = _minimise('Cta A = Init a0;a0 B!int(x<1) a1;a0 B!int(x<1) a2;'
+                                    'a1 B!int(x<2) a3;a2 B!int(x<2) a4;a3 B!int(x<3) a5;a4 B?int(x<3) a5;')
+    assert _report.merged == []
+    assert _minimised.state_list == ['a0', 'a1', 'a2', 'a3', 'a4', 'a5']
+
+
+def test_bisimulation_classes_of_a_chain():
+    # 0 -> 1 -> 2 -> 3 and 4 -> 3, 2 and 4 are alike, 3 is the end
+    _classes = bisimulation_classes(5, [0, 1, 2, 4], [0, 0, 0, 0], [1, 2, 3, 3], [0, 0, 0, 1, 0])
+    assert _classes[2] == _classes[4]
+    assert len(set(_classes)) == 4
@@ -0,0 +1,24 @@
+from Cta_Loader import load_automata
+from Channel_topology import channel_name
+from Golang_generator import automata_topology
+
+
+def _first_transition(a):
+    return a.transition_dictionary[a.initial_state][0]
+
+
+def test_plain_labels_keep_the_plain_name():
+    a = load_automata('Cta A = Init a0;a0 B!int(x>1) a1;')[0]
+    assert channel_name(a.label, _first_transition(a)) == 'channel_A_B_int'
+
+
+def test_labels_with_underscores_get_their_own_channels():
+    _automata = load_automata('Cta A_B = Init a0;a0 C!int(x>=0) a1;'
+                              'Cta A = Init a0;a0 B_C!int(x>=0) a1;'
+                              'Cta C = Init c0;c0 A_B?int(x>=0) c1;'
+                              'Cta B_C = Init c0;c0 A?int(x>=0) c1;')
+    _names = [channel_name(a.label, _first_transition(a)) for a in _automata]
+    assert _names[0] == _names[2] and _names[1] == _names[3] and _names[0] != _names[1]
+    _channels = automata_topology(_automata, 'event')
+    assert sorted(_channels) == sorted(set(_names))
+    assert all(_channel.capacity == 1 for _channel in _channels.values())
@@ -0,0 +1,55 @@
+import os
+
+from Cta_Loader import load_automata
+from Golang_generator import generate_go_lang
+from Compile_cache import CompileCache, MemoryCache, compile_notation
+
+_notation = ('Cta A = Init a0;a0 B!int(x<1) a1;a1 B?int(x>=2,{x}) a2;'
+             'Cta B = Init b0;b0 A?int(x>=0) b1;b1 A!int(x<3) b2;')
+
+
+def test_cached_program_is_the_generated_one(tmp_path):
+    _cache = CompileCache(str(tmp_path))
+    _first = ''.join(compile_notation(_notation, _cache=_cache)[1])
+    assert (_cache.hits, _cache.misses) == (0, 2)
+    _second = ''.join(compile_notation(_notation, _cache=_cache)[1])
+    assert (_cache.hits, _cache.misses) == (2, 2)
+    assert _first == _second == ''.join(generate_go_lang(load_automata(_notation), _notation))
+
+
+def test_only_changed_automata_are_compiled(tmp_path):
+    _cache = CompileCache(str(tmp_path))
+    compile_notation(_notation, _cache=_cache)
+    compile_notation(_notation.replace('x<3', 'x<4'), _cache=_cache)
+    assert (_cache.hits, _cache.misses) == (1, 3)
+    # other options are other entries
+    compile_notation(_notation, 'event', _cache=_cache)
+    assert (_cache.hits, _cache.misses) == (1, 5)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    _cache = CompileCache(str(tmp_path), _max_bytes=None)
+    for i, _key in enumerate(('a', 'b', 'c')):
+        _cache.put(_key, {'entry': _key * 100})
+        os.utime(os.path.join(str(tmp_path), _key + '.entry'), (i, i))
+    assert _cache.evict() == 0
+    _size = os.path.getsize(os.path.join(str(tmp_path), 'a.entry'))
+    # a hit makes 'a' the most recent
+    assert _cache.get('a') == {'entry': 'a' * 100}
+    _cache.max_bytes = 2 * _size
+    assert _cache.evict() == 1
+    assert _cache.get('b') is None
+    assert _cache.get('c') == {'entry': 'c' * 100}
+    assert sorted(os.listdir(str(tmp_path))) == ['a.entry', 'c.entry']
+
+
+def test_memory_cache_evicts_least_recently_used():
+    _cache = MemoryCache(2)
+    _cache.put('a', 1)
+    _cache.put('b', 2)
+    _cache.put('c', 3)
+    assert _cache.get('a') == 1
+    assert _cache.evict() == 1
+    assert _cache.get('b') is None
+    assert (_cache.get('a'), _cache.get('c')) == (1, 3)
+    assert (_cache.hits, _cache.misses) == (3, 1)
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+from Automata_Structures import Transition
+from Cta_Loader import CtaSyntaxError, load_automata, load_compact_automata, iter_automata_file, split_automata
+
+_notation = ('Cta A = Init a0;\na0 B!int(x<1) a1;\na1 B?(x>=2,{x}) a2;\n'
+             'Cta B = Init b0;\nb0 A?int(x>=0) b1;\nb1 (x<3) b2;\n')
+
+
+def test_transitions_are_read():
+    a, b = load_automata(_notation)
+    assert (a.label, a.initial_state, a.end_state, a.state_list) == ('A', 'a0', 'a2', ['a0', 'a1', 'a2'])
+    assert a.transition_dictionary['a0'] == [Transition('a0', 'sendintB', ('send', 'int', 'B'), 'x<1', False, 'a1')]
+    assert a.transition_dictionary['a1'] == [Transition('a1', 'receiveB', ('receive', '', 'B'), 'x>=2', True, 'a2')]
+    assert b.transition_dictionary['b1'] == [Transition('b1', 'send', ('send', '', ''), 'x<3', False, 'b2')]
+    assert a.text == 'Cta A = Init a0;\na0 B!int(x<1) a1;\na1 B?(x>=2,{x}) a2;\n'
+
+
+def test_compact_automata_read_the_same():
+    for a, _compact in zip(load_automata(_notation), load_compact_automata(_notation)):
+        assert _compact.state_list == a.state_list
+        assert dict(_compact.transition_dictionary) == a.transition_dictionary
+
+
+@pytest.mark.parametrize('_text, _message', [
+    ('Cta A = Init a0;\na0 B!int(x<1) a1\n', "expected ';', found end of input (line 3, column 1)"),
+    ('Cta A = Init a0;\na0 B int(x<1) a1;', "expected '!' or '?', found 'int' (line 2, column 6)"),
+    ('Cta A = Init a0;\na0 B!int(x<1 a1;', 'unterminated condition (line 2, column 9)'),
+    ('Cta A Init a0;', "expected '=', found 'Init' (line 1, column 7)"),
+])
+def test_syntax_errors_give_line_and_column(_text, _message):
+    with pytest.raises(CtaSyntaxError) as _error:
+        load_automata(_text)
+    assert str(_error.value) == _message
+
+
+def test_split_automata_gives_positions():
+    assert [_position for _text, _position in split_automata(_notation)] == [(1, 1), (4, 1)]
+
+
+@pytest.mark.parametrize('_chunk_size', [1, 3, 7, 1 << 20])
+def test_streamed_file_is_read_as_a_whole(_chunk_size):
+    assert list(iter_automata_file(io.StringIO(_notation), _chunk_size)) == load_automata(_notation)
+
+
+def test_streamed_error_gives_position_in_the_file():
+    with pytest.raises(CtaSyntaxError, match=r"found 'int' \(line 5, column 6\)"):
+        list(iter_automata_file(io.StringIO(_notation.replace('b0 A?', 'b0 A '))))
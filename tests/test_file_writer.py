@@ -0,0 +1,50 @@
+import os
+
+from Cta_Loader import load_automata
+from Golang_generator import iter_go_files, go_functions
+from File_writer import write_go_files
+
+_notation = ('Cta A = Init a0;a0 B!int(x<1) a1;a1 B?int(x>=2,{x}) a2;'
+             'Cta B = Init b0;b0 A?int(x>=0) b1;b1 A!int(x<3) b2;')
+
+
+def _files(_notation, _packages=0):
+    _automata = load_automata(_notation)
+    return list(iter_go_files(zip(_automata, go_functions(_automata, 'event')), 'event', False, _packages,
+                              'example.com/cta' if _packages else None))
+
+
+def test_files_of_the_program():
+    assert [_path for _path, _text in _files(_notation)] == ['f_A_cta.go', 'f_B_cta.go', 'cta_helpers.go',
+                                                            'cta_channels.go', 'cta_main.go']
+    _paths = [_path for _path, _text in _files(_notation, 2)]
+    assert _paths[-3:] == ['cta/cta_helpers.go', 'cta/cta_channels.go', 'cta_main.go']
+    assert all(_path.startswith('automata_') for _path in _paths[:2])
+
+
+def test_only_changed_files_are_written(tmp_path):
+    _directory = str(tmp_path)
+    assert write_go_files(_files(_notation), _directory) == (5, 0, 0)
+    _times = [os.stat(os.path.join(_directory, _path)).st_mtime_ns for _path, _text in _files(_notation)]
+    assert write_go_files(_files(_notation), _directory) == (0, 5, 0)
+    assert _times == [os.stat(os.path.join(_directory, _path)).st_mtime_ns for _path, _text in _files(_notation)]
+    # only B's function changes
+    assert write_go_files(_files(_notation.replace('x<3', 'x<4')), _directory) == (1, 4, 0)
+
+
+def test_files_no_longer_in_the_program_are_removed(tmp_path):
+    _directory = str(tmp_path)
+    write_go_files(_files(_notation, 2), _directory)
+    (tmp_path / 'notes.txt').write_text('kept')
+    _written, _unchanged, _removed = write_go_files(_files(_notation), _directory)
+    # main is in both
+    assert _removed == 4
+    assert sorted(os.listdir(_directory)) == ['.cta_files.json', 'cta_channels.go', 'cta_helpers.go', 'cta_main.go',
+                                              'f_A_cta.go', 'f_B_cta.go', 'notes.txt']
+
+
+def test_file_changed_outside_is_written_again(tmp_path):
+    _directory = str(tmp_path)
+    write_go_files(_files(_notation), _directory)
+    (tmp_path / 'cta_main.go').write_text('package main\n')
+    assert write_go_files(_files(_notation), _directory) == (1, 4, 0)
@@ -0,0 +1,38 @@
+from Cta_Loader import load_automata, load_compact_automata
+from Golang_generator import generate_event_function, go_identifier, state_constants
+
+
+def test_event_function_blocks_in_a_state_nothing_leaves():
+    _automata = load_automata('Cta A = Init a0;a0 (x>=0.2 && x<1) a1;a0 (x>=2) a2;')
+    _function = generate_event_function(_automata[0])
+    assert 'default:\n\t\t\t// no transition leaves the state, block for good\n\t\t\tselect {}\n' in _function
+
+
+def test_event_function_without_stuck_states_does_not_block():
+    for _automata in (load_automata('Cta A = Init a0;a0 (x>=1) a1;'),
+                      load_compact_automata('Cta A = Init a0;a0 (x>=1) a1;')):
+        assert 'select {}' not in generate_event_function(_automata[0], _int_states=True)
+
+
+def test_state_constants_are_distinct_where_names_collide():
+    _automata = load_automata('Cta A = Init q-1;q-1 (x>=1) q_1;q_1 (x>=2) q2;'
+                              'Cta A_q = Init c;c (x>=1) 1;')
+    _constants = [_constant for a in _automata for _constant in state_constants(a).values()]
+    assert len(set(_constants)) == len(_constants)
+
+
+def test_labels_go_does_not_allow_are_kept_apart():
+    assert go_identifier('A_b') == 'A_b'
+    assert go_identifier('A-b') not in ('A_b', 'A-b')
+    _function = generate_event_function(load_automata('Cta A-b = Init c;c (x>=1) d;')[0], _int_states=True)
+    assert 'func f_' + go_identifier('A-b') + '() {' in _function
+    assert 'enabled_A-b' not in _function and 'A-b_max_out' not in _function
+
+
+def test_metrics_count_the_channel_wait_from_arming():
+    _automata = load_automata('Cta A = Init a0;a0 B?int(x>=1) a1;a1 (x>=2) a2;')
+    _function = generate_event_function(_automata[0], _metrics=True)
+    assert 'arm(&armed[0], case_0 != nil)' in _function
+    assert '.fire(clock_since(reset), time.Since(armed[0]))' in _function
+    # the internal transition waits on no channel
+    assert '.fire(clock_since(reset), 0)' in _function
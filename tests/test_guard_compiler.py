@@ -0,0 +1,50 @@
+from Cta_Loader import load_automata
+from Guard_compiler import compile_guards, guard_windows, enabled_table
+from Guard_parser import Interval, parse_guard_windows
+from Golang_generator import poll_check, automata_topology
+
+_notation = 'Cta A = Init a0;a0 (x >= 3 && x < 9) a1;a0 (2.5 < x < 3) a2;a0 (x < 2 || x == 1 || x > 20) a1;'
+
+
+def test_windows_are_normalised():
+    assert parse_guard_windows('x < 2 || x == 1 || x > 20') == (Interval(0, True, 2, False),
+                                                              Interval(20, False, float('inf'), False))
+    assert parse_guard_windows('9 <= x <= 15 && x < 12') == (Interval(9, True, 12, False),)
+    assert parse_guard_windows('x > 3 && x < 2') == ()
+    assert parse_guard_windows('y < 2') is None
+
+
+def test_integer_clock_prunes_and_rewrites():
+    (_compiled,), (_report,) = compile_guards(load_automata(_notation), True)
+    _conditions = [c.condition for c in _compiled.transition_dictionary['a0']]
+    assert _conditions == ['3 <= x && x <= 8', 'x <= 1 || 21 <= x']
+    assert [c.condition for c in _report.pruned] == ['2.5 < x < 3']
+    assert _report.transitions == 3 and _report.rewritten == 2
+
+
+def test_compiled_guards_read_back_as_the_same_windows():
+    (_a,) = load_automata(_notation)
+    (_compiled,), _reports = compile_guards([_a], True)
+    _windows = [guard_windows(c.condition, True) for c in _a.transition_dictionary['a0']]
+    _windows = [_transition_windows for _transition_windows in _windows if _transition_windows]
+    assert [parse_guard_windows(c.condition) for c in _compiled.transition_dictionary['a0']] == _windows
+    assert enabled_table([guard_windows(c.condition, True) for c in _compiled.transition_dictionary['a0']]) \
+        == enabled_table(_windows)
+
+
+def test_compiled_guards_keep_the_channel_sizes():
+    _automata = load_automata('Cta A = Init a0;a0 B!int(x >= 3 && x < 9,{x}) a0;a0 (x > 20) a1;'
+                              'Cta B = Init b0;b0 A?int(x >= 30 && x <= 40) b0;b0 (x > 50) b1;')
+    _compiled, _reports = compile_guards(_automata, True)
+    assert automata_topology(_compiled) == automata_topology(_automata)
+
+
+def test_a_state_that_loses_every_transition_is_kept():
+    (_compiled,), _reports = compile_guards(load_automata('Cta A = Init a0;a0 (x > 3 && x < 2) a1;'))
+    assert _compiled.state_list == ['a0', 'a1'] and _compiled.transition_dictionary['a0'] == []
+
+
+def test_poll_check_uses_one_comparison_for_two_ends():
+    assert poll_check('3 <= x && x <= 8') == 'uint(x-3) <= 5'
+    assert poll_check('x >= 3 && x <= 8') == 'x >= 3 && x <= 8'
+    assert poll_check('x <= 1 || 21 <= x') == 'x <= 1 || 21 <= x'
@@ -0,0 +1,97 @@
+import pytest
+
+from Cta_Loader import parse_single_automata
+from Zone_verifier import verify_network, verification_passed
+
+pytest.importorskip('numpy')
+
+
+def _verify(*_texts, **_options):
+    return verify_network([parse_single_automata(_text) for _text in _texts], **_options)
+
+
+def test_reset_then_later_guard_completes():
+    _result = _verify('Cta A = Init a0;a0 (x<=1,{x}) a1;a1 (x>=2) a2;')
+    assert verification_passed(_result)
+
+
+def test_guard_after_earlier_window_is_reached():
+    _result = _verify('Cta A = Init a0;a0 (x<=1) a1;a1 (x>=2 && x<=3) a2;')
+    assert verification_passed(_result)
+
+
+def test_window_already_passed_is_a_deadlock():
+    _result = _verify('Cta A = Init a0;a0 (x>=2) a1;a1 (x<=1) a2;')
+    assert _result.deadlock == {'A': 'a1'}
+    assert [c.end_state for _label, c in _result.deadlock_trace] == ['a1']
+
+
+def test_deadlock_search_goes_on_and_finds_the_unreachable_end():
+    _result = _verify('Cta A = Init a0;a0 (x>=2) a1;a1 (x<=1) a2;', _stop_at_deadlock=False)
+    assert _result.complete
+    assert _result.unreachable == ['A']
+
+
+def test_send_fires_as_soon_as_the_receive_can():
+    # B sends at once, so A receives before x < 2 stops holding
+    _result = _verify('Cta A = Init a0;a0 B?int(x < 2) a1;', 'Cta B = Init b0;b0 A!int(x < 5) b1;')
+    assert verification_passed(_result)
+
+
+def test_late_receive_is_a_deadlock():
+    _result = _verify('Cta A = Init a0;a0 B?int(x < 2) a1;', 'Cta B = Init b0;b0 A!int(x >= 3) b1;')
+    assert _result.deadlock == {'A': 'a0', 'B': 'b1'}
+
+
+_sender = 'Cta A = Init a0;a0 B!int(x<1) a1;a1 B!int(x<1) a2;a2 B!int(x<1) a3;'
+_receiver = 'Cta B = Init b0;b0 A?int(x>2) b1;b1 A?int(x>2) b2;b2 A?int(x>2) b3;'
+
+
+def test_channel_sized_as_in_the_go():
+    # the three sends go into the channel before the first receive
+    assert verification_passed(_verify(_sender, _receiver))
+
+
+def test_smaller_channel_blocks_the_sender():
+    _result = _verify(_sender, _receiver, _capacity=2)
+    assert _result.deadlock == {'A': 'a2', 'B': 'b2'}
+
+
+def test_reset_loop_is_explored_to_the_end():
+    _result = _verify('Cta A = Init a0;a0 (x>=1 && x<=2,{x}) a0;a0 (x>=3) a1;')
+    assert _result.complete
+    assert _result.deadlock is None
+
+
+def _pair(_i):
+    # A<i> sends twice to B<i> and then waits for its answer
+    return ('Cta A%d = Init a0;a0 B%d!int(x>=1 && x<=2,{x}) a1;a1 B%d!int(x>=%d && x<=3,{x}) a2;a2 B%d?int(x>=0) a3;'
+            % (_i, _i, _i, 1 + _i % 3, _i),
+            'Cta B%d = Init b0;b0 A%d?int(x>=0,{x}) b1;b1 A%d?int(x>=1) b2;b2 A%d!int(x<=4) b3;' % (_i, _i, _i, _i))
+
+
+def test_independent_automata_scale():
+    _texts = ['Cta A%d = Init a0;a0 (x>=1 && x<=2) a1;a1 (x>=%d,{x}) a2;a2 (x<=3) a3;' % (i, 1 + i % 3)
+              for i in range(30)]
+    _result = _verify(*_texts)
+    assert verification_passed(_result)
+    assert _result.seconds < 5
+
+
+def test_communicating_pairs_scale():
+    _result = _verify(*[_text for i in range(15) for _text in _pair(i)])
+    assert verification_passed(_result)
+    assert _result.seconds < 5
+
+
+@pytest.mark.parametrize('_texts', [
+    _pair(0) + _pair(1),
+    ('Cta A = Init a0;a0 (x>=1 && x<=2,{x}) a1;a1 (x>=1 && x<=2,{x}) a0;a1 (x>=3) a2;',
+     'Cta B = Init b0;b0 (x>=2 && x<=3,{x}) b1;b1 (x>=1 && x<=3,{x}) b0;b1 (x>=4) b2;'),
+    (_sender, 'Cta B = Init b0;b0 A?int(x>2) b1;b1 A?int(x>2) b2;b2 (x<=1) b3;'),
+])
+def test_reduction_finds_what_the_full_search_finds(_texts):
+    _reduced = _verify(*_texts, _stop_at_deadlock=False)
+    _full = _verify(*_texts, _stop_at_deadlock=False, _reduce=False)
+    assert (_reduced.deadlock, _reduced.unreachable) == (_full.deadlock, _full.unreachable)
+    assert _reduced.explored <= _full.explored